@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+import anyio
+from fastapi import HTTPException
+
+from app.config import ADMISSION_ENABLED, QUEUE_BUDGET
+
+# Per-API-key admission control, applied in auth.require_company:
+#   1. a token bucket caps the request rate (429 when empty),
+#   2. a per-tier semaphore caps requests in flight,
+#   3. a request that would queue longer than QUEUE_BUDGET seconds for a
+#      slot is shed at once (503) instead of waiting.
+# Both rejections carry Retry-After, and a 503 gives its rate token back.
+# Queued requests wait on the event loop, not in a worker thread, so one
+# tenant's queue cannot starve the thread pool that serves the others. Gates
+# are only touched from the event loop. State is per process.
+
+
+@dataclass(frozen=True)
+class TierLimits:
+    rate: float  # sustained requests per second
+    burst: float  # bucket size
+    concurrency: int  # requests in flight
+
+
+TIER_LIMITS: Dict[str, TierLimits] = {
+    "basic": TierLimits(rate=20.0, burst=40.0, concurrency=4),
+    "premium": TierLimits(rate=100.0, burst=200.0, concurrency=12),
+    "enterprise": TierLimits(rate=400.0, burst=800.0, concurrency=24),
+}
+
+
+def limits_for(tier: Optional[str]) -> TierLimits:
+    return TIER_LIMITS.get((tier or "basic").lower(), TIER_LIMITS["basic"])
+
+
+def _retry_after(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def take(self) -> float:
+        """0 when a token was taken, else seconds until one is available. Caller holds the lock."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def refund(self) -> None:
+        self.tokens = min(self.burst, self.tokens + 1.0)
+
+
+class TenantGate:
+    def __init__(self, tier: Optional[str]) -> None:
+        self.tier = tier
+        self.limits = limits_for(tier)
+        self.bucket = TokenBucket(self.limits.rate, self.limits.burst)
+        self.in_flight = 0
+        self.waiters: Deque[anyio.Event] = deque()  # set by release() when it hands its slot over
+        self.service_time = 0.05  # EWMA of seconds a request holds its slot
+
+    def _shed(self, retry_after: float) -> HTTPException:
+        self.bucket.refund()
+        return HTTPException(503, "Too many concurrent requests for this API key", headers=_retry_after(retry_after))
+
+    async def admit(self) -> float:
+        """Take a rate token and a concurrency slot or raise 429/503; returns the admission time."""
+        wait = self.bucket.take()
+        if wait:
+            raise HTTPException(429, "Rate limit exceeded for this API key", headers=_retry_after(wait))
+        if self.in_flight < self.limits.concurrency:
+            self.in_flight += 1
+            return time.monotonic()
+        # expected queueing: everyone ahead of us, drained `concurrency` at a time
+        expected = (len(self.waiters) + 1) * self.service_time / self.limits.concurrency
+        if expected > QUEUE_BUDGET:
+            raise self._shed(expected)
+        ready = anyio.Event()
+        self.waiters.append(ready)
+        try:
+            with anyio.move_on_after(QUEUE_BUDGET):
+                await ready.wait()
+        except BaseException:
+            # cancelled while queued (the client went away): give back whatever we hold
+            if ready.is_set():
+                self._free_slot()
+            else:
+                self.waiters.remove(ready)
+            raise
+        if not ready.is_set():
+            self.waiters.remove(ready)
+            raise self._shed(self.service_time)
+        return time.monotonic()  # release() handed its slot over; in_flight already counts it
+
+    def _free_slot(self) -> None:
+        if self.waiters:
+            self.waiters.popleft().set()
+        else:
+            self.in_flight -= 1
+
+    def release(self, admitted_at: float) -> None:
+        self.service_time = 0.8 * self.service_time + 0.2 * (time.monotonic() - admitted_at)
+        self._free_slot()
+
+
+class AdmissionController:
+    def __init__(self) -> None:
+        self._gates: Dict[str, TenantGate] = {}
+        self._lock = threading.Lock()
+
+    def gate(self, api_key: str, tier: Optional[str]) -> TenantGate:
+        with self._lock:
+            gate = self._gates.get(api_key)
+            if gate is None or (gate.tier != tier and gate.in_flight == 0 and not gate.waiters):
+                # new key, or an idle key whose tier changed
+                gate = self._gates[api_key] = TenantGate(tier)
+            return gate
+
+    def reset(self) -> None:
+        with self._lock:
+            self._gates.clear()
+
+
+ADMISSION: Optional[AdmissionController] = AdmissionController() if ADMISSION_ENABLED else None
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+from typing import AsyncIterator
+
 from fastapi import Depends, Header, HTTPException
 from pydantic import BaseModel
 from sqlmodel import Session, select
 
+from app.admission import ADMISSION
 from app.db import get_session
 from app.models import Company
 
@@ -14,11 +17,26 @@ class AuthedCompany(BaseModel):
     api_key: str
 
 
-def require_company(
+def company_for_key(
     x_api_key: str = Header(..., alias="X-API-Key"),
     session: Session = Depends(get_session),
-) -> AuthedCompany:
+) -> Company:
     company = session.exec(select(Company).where(Company.api_key == x_api_key)).first()
     if not company:
         raise HTTPException(status_code=401, detail="Invalid API key")
-    return AuthedCompany(id=company.id, name=company.name, api_key=company.api_key)
+    return company
+
+
+async def require_company(company: Company = Depends(company_for_key)) -> AsyncIterator[AuthedCompany]:
+    # the lookup runs in the thread pool; admission waits on the event loop
+    auth = AuthedCompany(id=company.id, name=company.name, api_key=company.api_key)
+    if ADMISSION is None:
+        yield auth
+        return
+    # the slot is held until the endpoint has finished
+    gate = ADMISSION.gate(company.api_key, company.tier)
+    admitted_at = await gate.admit()
+    try:
+        yield auth
+    finally:
+        gate.release(admitted_at)
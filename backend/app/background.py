@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Callable, Optional
+
+from sqlmodel import Session
+
+log = logging.getLogger(__name__)
+
+
+def every(interval: float, name: str, job: Callable[[Session], object]) -> Optional[threading.Thread]:
+    """Run ``job`` every ``interval`` seconds in a daemon thread, once per database; 0 disables it.
+
+    Each database (the main one and every company shard) gets a fresh
+    session. A failing run is logged and retried on the next tick.
+    """
+    if interval <= 0:
+        return None
+    from app.db import all_engines
+
+    def run() -> None:
+        stop = threading.Event()
+        while not stop.wait(interval):
+            for target in all_engines():
+                try:
+                    with Session(target) as session:
+                        job(session)
+                except Exception:
+                    log.exception("%s failed on %s; retrying in %ss", name, target.url, interval)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
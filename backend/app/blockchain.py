@@ -1,38 +1,179 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import secrets
-from typing import Dict
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+from sqlalchemy import create_engine, event, text
+
+from app.config import CHAIN_BACKEND, CHAIN_DB_URL
+
+
+def tx_hash(kind: str, from_addr: Optional[str], to_addr: str, amount: float) -> str:
+    """Hash committing to the transaction's content; the nonce keeps identical transfers distinct."""
+    payload = json.dumps([kind, from_addr, to_addr, amount, time.time_ns(), secrets.token_hex(8)])
+    return hashlib.sha256(payload.encode()).hexdigest()
 
 
 class MockChain:
     def __init__(self) -> None:
         self.balances: Dict[str, float] = {}
+        # (-balance, address): richest first, ties by address; O(log n) update, index and slice
+        self._ranked = SortedList()
+        self._lock = threading.RLock()
+
+    def _set(self, addr: str, balance: float) -> None:
+        old = self.balances.get(addr)
+        if old is not None:
+            self._ranked.remove((-old, addr))
+        self.balances[addr] = balance
+        self._ranked.add((-balance, addr))
 
     def ensure(self, addr: str) -> None:
-        if addr not in self.balances:
-            self.balances[addr] = 0.0
+        with self._lock:
+            if addr not in self.balances:
+                self._set(addr, 0.0)
 
     def mint(self, to_addr: str, amount: float) -> str:
-        self.ensure(to_addr)
-        self.balances[to_addr] += amount
-        return secrets.token_hex(16)
+        with self._lock:
+            self.ensure(to_addr)
+            self._set(to_addr, self.balances[to_addr] + amount)
+        return tx_hash("mint", None, to_addr, amount)
 
     def transfer(self, from_addr: str, to_addr: str, amount: float) -> str:
-        self.ensure(from_addr)
-        self.ensure(to_addr)
-        if self.balances[from_addr] < amount:
-            raise ValueError("insufficient balance")
-        self.balances[from_addr] -= amount
-        self.balances[to_addr] += amount
-        return secrets.token_hex(16)
+        with self._lock:
+            self.ensure(from_addr)
+            self.ensure(to_addr)
+            if self.balances[from_addr] < amount:
+                raise ValueError("insufficient balance")
+            self._set(from_addr, self.balances[from_addr] - amount)
+            self._set(to_addr, self.balances[to_addr] + amount)
+        return tx_hash("transfer", from_addr, to_addr, amount)
 
     def balance_of(self, addr: str) -> float:
-        self.ensure(addr)
-        return self.balances[addr]
+        # a read: unknown addresses hold nothing and stay out of the ranking
+        return self.balances.get(addr, 0.0)
+
+    def top(self, limit: int, offset: int = 0) -> List[Tuple[str, float]]:
+        """(address, balance) pairs by descending balance."""
+        with self._lock:
+            return [(addr, -neg) for neg, addr in self._ranked[offset:offset + limit]]
+
+    def rank_of(self, addr: str) -> Optional[int]:
+        """1-based position in the balance ordering, None for unknown addresses."""
+        with self._lock:
+            if addr not in self.balances:
+                return None
+            return self._ranked.index((-self.balances[addr], addr)) + 1
+
+    def holder_count(self) -> int:
+        return len(self._ranked)
 
     def reset(self) -> None:
         """Reset all balances to empty state"""
-        self.balances.clear()
+        with self._lock:
+            self.balances.clear()
+            self._ranked.clear()
+
+
+class SQLiteChain:
+    """MockChain with balances in a SQLite ledger, shared by all worker processes.
+
+    Debits are a single conditional ``UPDATE ... WHERE balance >= ?`` so two
+    workers can never overdraw the same wallet.
+    """
+
+    def __init__(self, url: str) -> None:
+        self.engine = create_engine(url, connect_args={"timeout": 30, "check_same_thread": False})
+
+        @event.listens_for(self.engine, "connect")
+        def _pragmas(dbapi_conn, _record) -> None:
+            cur = dbapi_conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=NORMAL")
+            cur.close()
+
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE IF NOT EXISTS ledger (address TEXT PRIMARY KEY, balance REAL NOT NULL)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ledger_by_balance ON ledger (balance DESC, address)"))
+
+    def _credit(self, conn, addr: str, amount: float) -> None:
+        conn.execute(
+            text(
+                "INSERT INTO ledger (address, balance) VALUES (:a, :amt) "
+                "ON CONFLICT(address) DO UPDATE SET balance = balance + :amt"
+            ),
+            {"a": addr, "amt": amount},
+        )
+
+    def ensure(self, addr: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(text("INSERT OR IGNORE INTO ledger (address, balance) VALUES (:a, 0.0)"), {"a": addr})
+
+    def mint(self, to_addr: str, amount: float) -> str:
+        with self.engine.begin() as conn:
+            self._credit(conn, to_addr, amount)
+        return tx_hash("mint", None, to_addr, amount)
+
+    def transfer(self, from_addr: str, to_addr: str, amount: float) -> str:
+        with self.engine.begin() as conn:
+            debited = conn.execute(
+                text("UPDATE ledger SET balance = balance - :amt WHERE address = :a AND balance >= :amt"),
+                {"a": from_addr, "amt": amount},
+            ).rowcount
+            if not debited:
+                # a missing wallet has balance 0, which only covers non-positive amounts
+                if amount > 0:
+                    raise ValueError("insufficient balance")
+                self._credit(conn, from_addr, -amount)
+            self._credit(conn, to_addr, amount)
+        return tx_hash("transfer", from_addr, to_addr, amount)
+
+    def balance_of(self, addr: str) -> float:
+        with self.engine.connect() as conn:
+            row = conn.execute(text("SELECT balance FROM ledger WHERE address = :a"), {"a": addr}).first()
+        return row[0] if row else 0.0
+
+    def top(self, limit: int, offset: int = 0) -> List[Tuple[str, float]]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text("SELECT address, balance FROM ledger ORDER BY balance DESC, address LIMIT :l OFFSET :o"),
+                {"l": limit, "o": offset},
+            ).all()
+        return [(a, b) for a, b in rows]
+
+    def rank_of(self, addr: str) -> Optional[int]:
+        # counts over the balance index: linear in the rank, unlike MockChain's O(log n)
+        with self.engine.connect() as conn:
+            row = conn.execute(text("SELECT balance FROM ledger WHERE address = :a"), {"a": addr}).first()
+            if not row:
+                return None
+            ahead = conn.execute(
+                text("SELECT COUNT(*) FROM ledger WHERE balance > :b OR (balance = :b AND address < :a)"),
+                {"a": addr, "b": row[0]},
+            ).scalar()
+        return ahead + 1
+
+    def holder_count(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(text("SELECT COUNT(*) FROM ledger")).scalar()
+
+    def reset(self) -> None:
+        """Reset all balances to empty state"""
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM ledger"))
+
+
+def make_chain(backend: str = CHAIN_BACKEND):
+    if backend == "memory":
+        return MockChain()
+    if backend == "sqlite":
+        return SQLiteChain(CHAIN_DB_URL)
+    raise ValueError(f"unknown chain backend: {backend!r}")
 
 
-CHAIN = MockChain()
+CHAIN = make_chain()
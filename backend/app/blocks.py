@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.background import every
+from app.config import BLOCK_INTERVAL, BLOCK_SIZE
+from app.models import Block, TokenTransfer
+
+# Recorded transfers are sealed, in id order, into blocks whose header holds the
+# Merkle root of their leaves and the hash of the previous header. Leaves and
+# inner nodes are domain-separated (0x00 / 0x01 prefix) and an odd node is
+# promoted unpaired to the next level, so a proof is at most log2(n) hashes.
+
+GENESIS_PREV = "0" * 64
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+def leaf_hash(tx: TokenTransfer) -> bytes:
+    record = [tx.id, tx.tx_hash, tx.from_wallet, tx.to_wallet, tx.amount, tx.memo, tx.created_at.isoformat()]
+    return hashlib.sha256(LEAF_PREFIX + json.dumps(record, ensure_ascii=False).encode()).digest()
+
+
+def _node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def _levels(leaves: Sequence[bytes]) -> List[List[bytes]]:
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        nxt = [_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            nxt.append(level[-1])
+        levels.append(nxt)
+    return levels
+
+
+def merkle_root(leaves: Sequence[bytes]) -> bytes:
+    return _levels(leaves)[-1][0] if leaves else hashlib.sha256(b"").digest()
+
+
+def merkle_proof(leaves: Sequence[bytes], index: int) -> List[Dict[str, str]]:
+    """Sibling hashes from leaf to root; ``side`` says where the sibling goes when hashing."""
+    proof = []
+    for level in _levels(leaves)[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({"side": "left" if sibling < index else "right", "hash": level[sibling].hex()})
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf: bytes, proof: Sequence[Dict[str, str]], root: bytes) -> bool:
+    acc = leaf
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        acc = _node(sibling, acc) if step["side"] == "left" else _node(acc, sibling)
+    return acc == root
+
+
+def header_hash(height: int, prev_hash: str, root: str, first_id: int, last_id: int, tx_count: int) -> str:
+    header = json.dumps([height, prev_hash, root, first_id, last_id, tx_count])
+    return hashlib.sha256(header.encode()).hexdigest()
+
+
+def _split(blob: bytes) -> List[bytes]:
+    return [blob[i:i + 32] for i in range(0, len(blob), 32)]
+
+
+def seal_blocks(session: Session, now: Optional[datetime] = None, force: bool = False) -> List[Block]:
+    """Seal pending transfers into blocks: every full block, plus a partial one once it is old enough.
+
+    ``force`` seals a partial block right away. Heights are primary keys, so
+    when two workers race for the same block one insert fails and that worker
+    simply stops; the other one's block stands.
+    """
+    now = now or datetime.utcnow()
+    sealed: List[Block] = []
+    while True:
+        tip = session.exec(select(Block).order_by(Block.id.desc()).limit(1)).first()
+        after = tip.last_transfer_id if tip else 0
+        pending = session.exec(
+            select(TokenTransfer).where(TokenTransfer.id > after).order_by(TokenTransfer.id).limit(BLOCK_SIZE)
+        ).all()
+        if not pending:
+            break
+        if len(pending) < BLOCK_SIZE and not force and pending[0].created_at > now - timedelta(seconds=BLOCK_INTERVAL):
+            break
+
+        leaves = [leaf_hash(tx) for tx in pending]
+        height = (tip.id if tip else 0) + 1
+        prev = tip.block_hash if tip else GENESIS_PREV
+        root = merkle_root(leaves).hex()
+        block = Block(
+            id=height,
+            prev_hash=prev,
+            merkle_root=root,
+            block_hash=header_hash(height, prev, root, pending[0].id, pending[-1].id, len(pending)),
+            first_transfer_id=pending[0].id,
+            last_transfer_id=pending[-1].id,
+            tx_count=len(pending),
+            leaves=b"".join(leaves),
+            sealed_at=now,
+        )
+        session.add(block)
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            break
+        sealed.append(block)
+        if len(pending) < BLOCK_SIZE:
+            break
+    return sealed
+
+
+def block_out(block: Block) -> Dict[str, Any]:
+    return {
+        "height": block.id,
+        "block_hash": block.block_hash,
+        "prev_hash": block.prev_hash,
+        "merkle_root": block.merkle_root,
+        "first_transfer_id": block.first_transfer_id,
+        "last_transfer_id": block.last_transfer_id,
+        "tx_count": block.tx_count,
+        "sealed_at": block.sealed_at,
+    }
+
+
+def inclusion_proof(session: Session, tx: TokenTransfer) -> Optional[Dict[str, Any]]:
+    """Proof that ``tx`` is in a sealed block; read-only.
+
+    None while the transfer is still waiting for the block producer.
+    """
+    block = _block_of(session, tx.id)
+    if block is None:
+        return None
+
+    leaves = _split(block.leaves)
+    leaf = leaf_hash(tx)
+    if leaf not in leaves:
+        # the row changed after sealing; report it rather than a proof that cannot verify
+        return {"transfer_id": tx.id, "tx_hash": tx.tx_hash, "block": block_out(block), "included": False}
+    index = leaves.index(leaf)
+    return {
+        "transfer_id": tx.id,
+        "tx_hash": tx.tx_hash,
+        "included": True,
+        "leaf": leaf.hex(),
+        "index": index,
+        "proof": merkle_proof(leaves, index),
+        "block": block_out(block),
+    }
+
+
+def _block_of(session: Session, transfer_id: int) -> Optional[Block]:
+    block = session.exec(
+        select(Block).where(Block.last_transfer_id >= transfer_id).order_by(Block.last_transfer_id).limit(1)
+    ).first()
+    return block if block and block.first_transfer_id <= transfer_id else None
+
+
+def start_block_producer() -> Optional[threading.Thread]:
+    """Seal blocks every BLOCK_INTERVAL seconds in a daemon thread."""
+    return every(BLOCK_INTERVAL, "block-producer", seal_blocks)
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import os
+
+# Chain backend: "memory" keeps balances in the process (single worker only),
+# "sqlite" keeps them in a ledger database shared by every worker process.
+CHAIN_BACKEND = os.getenv("ATHENA_CHAIN_BACKEND", "memory")
+CHAIN_DB_URL = os.getenv("ATHENA_CHAIN_DB_URL", "sqlite:///athena_chain.db")
+
+# Events buffered per streaming client before the oldest are dropped
+STREAM_BUFFER = int(os.getenv("ATHENA_STREAM_BUFFER", "256"))
+
+# "production" leaves out the dev router; mock catalogs are only imported on first use.
+PROFILE = os.getenv("ATHENA_PROFILE", "dev")
+
+# Interaction partitions: with ARCHIVE_ON_STARTUP=1 (or POST /dev/partitions/archive)
+# the hot table keeps the last HOT_MONTHS months (current month included) and older
+# months become read-only files in <database>_archive/ next to each database file,
+# or under ARCHIVE_DIR when set.
+ARCHIVE_DIR = os.getenv("ATHENA_ARCHIVE_DIR", "")
+HOT_MONTHS = int(os.getenv("ATHENA_HOT_MONTHS", "1"))
+ARCHIVE_ON_STARTUP = os.getenv("ATHENA_ARCHIVE_ON_STARTUP", "0") == "1"
+
+# Transfers are sealed into Merkle blocks of up to BLOCK_SIZE, or whatever is
+# pending once the oldest waits BLOCK_INTERVAL seconds (0 disables the producer thread).
+BLOCK_SIZE = int(os.getenv("ATHENA_BLOCK_SIZE", "256"))
+BLOCK_INTERVAL = float(os.getenv("ATHENA_BLOCK_INTERVAL", "5"))
+
+# Per-company database files (ATHENA_SHARDING=1): tenant rows go to
+# SHARD_DIR/company_<id>.db, the company directory stays in athena.db.
+SHARDING = os.getenv("ATHENA_SHARDING", "0") == "1"
+SHARD_DIR = os.getenv("ATHENA_SHARD_DIR", "shards")
+
+# Connections in the read-only analytics pool (per database)
+READ_POOL_SIZE = int(os.getenv("ATHENA_READ_POOL_SIZE", "5"))
+
+# Asynchronous rewards (POST /interactions?async=true): default mode, worker
+# threads, poll interval and batch size, claim lease and attempts before "failed"
+ASYNC_REWARDS = os.getenv("ATHENA_ASYNC_REWARDS", "0") == "1"
+REWARD_WORKERS = int(os.getenv("ATHENA_REWARD_WORKERS", "2"))
+REWARD_POLL_INTERVAL = float(os.getenv("ATHENA_REWARD_POLL_INTERVAL", "0.2"))
+REWARD_BATCH = int(os.getenv("ATHENA_REWARD_BATCH", "100"))
+REWARD_LEASE = float(os.getenv("ATHENA_REWARD_LEASE", "30"))
+REWARD_MAX_ATTEMPTS = int(os.getenv("ATHENA_REWARD_MAX_ATTEMPTS", "5"))
+
+# Live risk scoring: score at which fraud_detected is set, users/devices kept in
+# memory, and whether flagged interactions have their reward held for release
+RISK_THRESHOLD = float(os.getenv("ATHENA_RISK_THRESHOLD", "0.8"))
+RISK_MAX_KEYS = int(os.getenv("ATHENA_RISK_MAX_KEYS", "100000"))
+RISK_HOLD = os.getenv("ATHENA_RISK_HOLD", "0") == "1"
+
+# Seconds between folding new interactions and transfers into the sketches (0 disables)
+SKETCH_INTERVAL = float(os.getenv("ATHENA_SKETCH_INTERVAL", "10"))
+
+# Seconds between saving the company-user network graph snapshot (0 disables)
+NETWORK_INTERVAL = float(os.getenv("ATHENA_NETWORK_INTERVAL", "30"))
+
+# Per-request profiling (see app/profiler.py): requests signed with PROFILER_SECRET
+# or a PROFILER_SAMPLE_RATE fraction of all requests are sampled every
+# PROFILER_INTERVAL_MS for at most PROFILER_MAX_SECONDS; the newest PROFILER_KEEP
+# speedscope files are kept in PROFILER_DIR. Off unless a secret or rate is set.
+PROFILER_SECRET = os.getenv("ATHENA_PROFILER_SECRET", "")
+PROFILER_SAMPLE_RATE = float(os.getenv("ATHENA_PROFILER_SAMPLE_RATE", "0"))
+PROFILER_INTERVAL_MS = float(os.getenv("ATHENA_PROFILER_INTERVAL_MS", "2"))
+PROFILER_MAX_SECONDS = float(os.getenv("ATHENA_PROFILER_MAX_SECONDS", "30"))
+PROFILER_DIR = os.getenv("ATHENA_PROFILER_DIR", "profiles")
+PROFILER_KEEP = int(os.getenv("ATHENA_PROFILER_KEEP", "100"))
+
+# Per-API-key rate and concurrency limits by Company.tier (see app/admission.py),
+# off unless ATHENA_ADMISSION=1; requests that would wait longer than
+# QUEUE_BUDGET seconds for a slot get 503.
+ADMISSION_ENABLED = os.getenv("ATHENA_ADMISSION", "0") == "1"
+QUEUE_BUDGET = float(os.getenv("ATHENA_QUEUE_BUDGET_MS", "250")) / 1000
+
+# Seconds between incremental TokenTransfer/chain reconciliation runs (0 disables)
+RECONCILE_INTERVAL = float(os.getenv("ATHENA_RECONCILE_INTERVAL", "60"))
+
+# Interaction.meta fields exposed as indexed generated columns, "name=$.json.path,..."
+META_FIELDS = os.getenv(
+    "ATHENA_META_FIELDS", "direction=$.direction,sector=$.company.sector,rule_action=$.rule.action"
+)
@@ -1,17 +1,132 @@
 from __future__ import annotations
 
-from typing import Iterator
+import glob
+import os
+import re
+import threading
+from typing import Dict, Iterator, List, Optional
 
-from sqlmodel import SQLModel, Session, create_engine
+from fastapi import Header
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from app.config import ARCHIVE_ON_STARTUP, READ_POOL_SIZE, SHARD_DIR, SHARDING
+from app.meta_fields import sync_meta_columns
+from app.migrations import migrate
+from app.models import Company
 
 DB_URL = "sqlite:///athena.db"
-engine = create_engine(DB_URL, echo=False)
+
+
+def _wal(target: Engine) -> Engine:
+    # WAL lets readers run alongside the writer instead of blocking its commits
+    @event.listens_for(target, "connect")
+    def _pragmas(dbapi_conn, _record) -> None:
+        dbapi_conn.execute("PRAGMA journal_mode=WAL")
+
+    return target
+
+
+engine = _wal(create_engine(DB_URL, echo=False))
+
+# With ATHENA_SHARDING=1 every company's tenant rows (users, wallets,
+# interactions, transfers, rules, ...) live in SHARD_DIR/company_<id>.db, so
+# tenants no longer queue on one SQLite write lock. Company stays in the main
+# database; shard sessions bind it there.
+_SHARD_TABLES = [t for name, t in SQLModel.metadata.tables.items() if name != Company.__tablename__]
+_SHARD_RE = re.compile(r"company_(\d+)\.db$")
+_SHARDS: Dict[int, Engine] = {}
+_SHARDS_LOCK = threading.Lock()
+# api key -> company id; keys never change, a deleted company just fails auth
+_KEY_TO_COMPANY: Dict[str, int] = {}
+
+
+def _prepare(target: Engine, tables=None) -> None:
+    SQLModel.metadata.create_all(target, tables=tables)
+    migrate(target)
+    sync_meta_columns(target)
+    if ARCHIVE_ON_STARTUP:
+        from app.partitions import archive_closed_months
+
+        archive_closed_months(target)
+
+
+def shard_engine(company_id: int) -> Engine:
+    with _SHARDS_LOCK:
+        shard = _SHARDS.get(company_id)
+        if shard is None:
+            os.makedirs(SHARD_DIR, exist_ok=True)
+            shard = _wal(create_engine(f"sqlite:///{os.path.join(SHARD_DIR, f'company_{company_id}.db')}", echo=False))
+            _prepare(shard, _SHARD_TABLES)
+            _SHARDS[company_id] = shard
+        return shard
+
+
+def all_engines() -> List[Engine]:
+    """The main database plus every shard on disk."""
+    if not SHARDING:
+        return [engine]
+    ids = sorted(int(m.group(1)) for m in map(_SHARD_RE.search, glob.glob(os.path.join(SHARD_DIR, "company_*.db"))) if m)
+    return [engine] + [shard_engine(cid) for cid in ids]
 
 
 def create_db_and_tables() -> None:
-    SQLModel.metadata.create_all(engine)
+    _prepare(engine)
+    all_engines()  # opens, migrates and archives the existing shards
+
+
+def session_for_company(company_id: int) -> Session:
+    if not SHARDING:
+        return Session(engine)
+    return Session(bind=shard_engine(company_id), binds={Company: engine})
+
+
+def _company_for_key(api_key: str) -> Optional[int]:
+    company_id = _KEY_TO_COMPANY.get(api_key)
+    if company_id is None:
+        with Session(engine) as session:
+            company_id = session.exec(select(Company.id).where(Company.api_key == api_key)).first()
+        if company_id is not None:
+            _KEY_TO_COMPANY[api_key] = company_id
+    return company_id
+
+
+def get_session(x_api_key: Optional[str] = Header(None, alias="X-API-Key")) -> Iterator[Session]:
+    """Session for the request: the caller's shard when sharding is on and the key is known, else the main database."""
+    company_id = _company_for_key(x_api_key) if SHARDING and x_api_key else None
+    session = session_for_company(company_id) if company_id is not None else Session(engine)
+    with session:
+        yield session
+
+
+# Analytics reads get their own pool per database whose connections run with
+# PRAGMA query_only, so a heavy dashboard query neither takes a writer
+# connection nor can write by mistake; under WAL it never blocks a commit.
+_READERS: Dict[str, Engine] = {}
+
+
+def reader_for(target: Engine) -> Engine:
+    key = str(target.url)
+    with _SHARDS_LOCK:
+        reader = _READERS.get(key)
+        if reader is None:
+            reader = create_engine(target.url, echo=False, pool_size=READ_POOL_SIZE)
+
+            @event.listens_for(reader, "connect")
+            def _query_only(dbapi_conn, _record) -> None:
+                dbapi_conn.execute("PRAGMA query_only = ON")
+
+            _READERS[key] = reader
+        return reader
 
 
-def get_session() -> Iterator[Session]:
-    with Session(engine) as session:
+def get_read_session(x_api_key: Optional[str] = Header(None, alias="X-API-Key")) -> Iterator[Session]:
+    """Like get_session, on the read-only analytics pool."""
+    company_id = _company_for_key(x_api_key) if SHARDING and x_api_key else None
+    if company_id is not None:
+        session = Session(bind=reader_for(shard_engine(company_id)), binds={Company: reader_for(engine)})
+    else:
+        session = Session(reader_for(engine))
+    with session:
         yield session
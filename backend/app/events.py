@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event as sa_event
+from sqlmodel import Session
+
+from app.blockchain import CHAIN
+from app.config import STREAM_BUFFER
+from app.models import TokenTransfer
+
+Event = Dict[str, Any]
+
+
+class Subscriber:
+    """Bounded per-client buffer; the oldest events are dropped when a client lags."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxlen: int) -> None:
+        self._loop = loop
+        self._buffer: Deque[Event] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event()
+        self._wakeup_pending = False
+        self.dropped = 0
+
+    def push(self, event: Event) -> None:
+        """Called from any thread (sync handlers run in the threadpool)."""
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(event)
+            if self._wakeup_pending:
+                return
+            self._wakeup_pending = True
+        self._loop.call_soon_threadsafe(self._ready.set)
+
+    async def drain(self, timeout: float) -> Tuple[List[Event], int]:
+        """Wait up to ``timeout`` seconds; returns the buffered events and how many were dropped."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return [], 0
+        with self._lock:
+            self._ready.clear()
+            self._wakeup_pending = False
+            events = list(self._buffer)
+            self._buffer.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+
+class EventBus:
+    """In-process fan-out of ledger events to streaming clients."""
+
+    def __init__(self, buffer_size: int = STREAM_BUFFER) -> None:
+        self.buffer_size = buffer_size
+        self._subscribers: Set[Subscriber] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> Subscriber:
+        sub = Subscriber(asyncio.get_running_loop(), self.buffer_size)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event: Optional[Event]) -> None:
+        """Fan ``event`` out; None (built while nobody was listening) is ignored."""
+        if event is None:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.push(event)
+            except RuntimeError:  # the client's event loop is gone
+                self.unsubscribe(sub)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+BUS = EventBus()
+
+
+def transfer_event(tx: TokenTransfer) -> Optional[Event]:
+    """Snapshot of a flushed transfer plus the resulting balances of both wallets.
+
+    None when no client is streaming, so the hot write paths skip the two
+    balance lookups; BUS.publish ignores it.
+    """
+    if not BUS.subscriber_count:
+        return None
+    balances = {addr: CHAIN.balance_of(addr) for addr in (tx.from_wallet, tx.to_wallet) if addr}
+    return {
+        "type": "transfer",
+        "id": tx.id,
+        "tx_hash": tx.tx_hash,
+        "from_wallet": tx.from_wallet,
+        "to_wallet": tx.to_wallet,
+        "amount": tx.amount,
+        "memo": tx.memo,
+        "interaction_id": tx.interaction_id,
+        "created_at": tx.created_at,
+        "balances": balances,
+    }
+
+
+def publish_on_commit(session: Session, event: Optional[Event]) -> None:
+    """Publish ``event`` once ``session`` commits, for helpers whose caller owns the commit; dropped on rollback."""
+    if event is not None:
+        session.info.setdefault("pending_events", []).append(event)
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    for pending in session.info.pop("pending_events", []):
+        BUS.publish(pending)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session) -> None:
+    session.info.pop("pending_events", None)
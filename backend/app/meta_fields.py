@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Mapping
+
+from sqlalchemy import literal_column
+from sqlalchemy.engine import Engine
+
+from app.config import META_FIELDS as META_FIELDS_SPEC
+
+# Fields pulled out of the Interaction.meta JSON into SQLite generated columns
+# (meta_<name>) with an index each, so filtering on them never parses JSON in
+# Python. Configured as "name=$.json.path,..." in ATHENA_META_FIELDS.
+
+_NAME_RE = re.compile(r"^[a-z][a-z0-9_]*$")
+_PATH_RE = re.compile(r"^\$(\.[A-Za-z_][A-Za-z0-9_]*)+$")
+
+
+def parse_fields(spec: str) -> Dict[str, str]:
+    fields: Dict[str, str] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, path = item.partition("=")
+        name, path = name.strip(), path.strip()
+        if not _NAME_RE.match(name) or not _PATH_RE.match(path):
+            raise ValueError(f"invalid meta field {item!r}, expected name=$.json.path")
+        fields[name] = path
+    return fields
+
+
+META_FIELDS = parse_fields(META_FIELDS_SPEC)
+
+
+def column_name(name: str) -> str:
+    return f"meta_{name}"
+
+
+def extract_sql(path: str, source: str = "meta") -> str:
+    # non-JSON meta ("demo", free text) reads as NULL instead of failing the insert
+    return f"CASE WHEN json_valid({source}) THEN json_extract({source}, '{path}') END"
+
+
+def sync_meta_columns(engine: Engine) -> List[str]:
+    """Add generated columns and indexes for configured fields and drop ones no longer configured.
+
+    Columns are VIRTUAL, so adding one does not rewrite the table; the index
+    stores the extracted values. Returns the names of columns added or dropped.
+    """
+    conn = engine.raw_connection()
+    dbapi_conn = conn.driver_connection
+    previous = dbapi_conn.isolation_level
+    dbapi_conn.isolation_level = None
+    changed: List[str] = []
+    try:
+        cur = dbapi_conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            # table_xinfo also lists generated columns (hidden 2 = virtual)
+            existing = {row[1] for row in cur.execute("PRAGMA table_xinfo('interaction')").fetchall() if row[6] == 2}
+            wanted = {column_name(n): p for n, p in META_FIELDS.items()}
+            for col in sorted(existing - set(wanted)):
+                if not col.startswith("meta_"):
+                    continue
+                cur.execute(f"DROP INDEX IF EXISTS ix_interaction_{col}")
+                cur.execute(f"ALTER TABLE interaction DROP COLUMN {col}")
+                changed.append(col)
+            for col, path in wanted.items():
+                if col not in existing:
+                    cur.execute(f"ALTER TABLE interaction ADD COLUMN {col} TEXT GENERATED ALWAYS AS ({extract_sql(path)}) VIRTUAL")
+                    changed.append(col)
+                cur.execute(f"CREATE INDEX IF NOT EXISTS ix_interaction_{col} ON interaction ({col}, created_at)")
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+    finally:
+        dbapi_conn.isolation_level = previous
+        conn.close()
+    return changed
+
+
+def meta_filters(params: Mapping[str, str]) -> list:
+    """WHERE conditions for every configured field present in ``params``."""
+    return [literal_column(f"interaction.{column_name(name)}") == params[name] for name in META_FIELDS if name in params]
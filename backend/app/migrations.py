@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy.engine import Engine
+
+# Schema version lives in SQLite's PRAGMA user_version. Steps run once, in
+# order, inside one BEGIN IMMEDIATE transaction, so concurrent workers booting
+# against the same file apply them exactly once.
+Step = Callable[[object], None]
+
+
+def _columns(cur, table: str) -> set:
+    return {row[1] for row in cur.execute(f"PRAGMA table_info('{table}')").fetchall()}
+
+
+def _add_columns(cur, table: str, required: Dict[str, str]) -> None:
+    existing = _columns(cur, table)
+    if not existing:
+        return  # table not in this database (company shards have no company table)
+    for col, type_clause in required.items():
+        if col not in existing:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {col} {type_clause}")
+
+
+def _company_interaction_details(cur) -> None:
+    _add_columns(cur, "company", {
+        "description": "TEXT",
+        "sector": "TEXT",
+        "website": "TEXT",
+        "phone": "TEXT",
+        "email": "TEXT",
+        "address": "TEXT",
+        "business_license": "TEXT",
+        "tax_code": "TEXT",
+        "supported_actions": "TEXT",
+        "service_categories": "TEXT",
+        "is_active": "INTEGER DEFAULT 1",
+        "tier": "TEXT",
+        "updated_at": "DATETIME",
+    })
+    _add_columns(cur, "interaction", {
+        "transaction_type": "TEXT",
+        "status": "TEXT",
+        "location": "TEXT",
+        "device_type": "TEXT",
+        "payment_method": "TEXT",
+        "currency": "TEXT",
+        "exchange_rate": "REAL",
+        "discount_applied": "REAL",
+        "tax_amount": "REAL",
+        "commission_rate": "REAL",
+        "risk_score": "REAL",
+        "fraud_detected": "INTEGER",
+        "updated_at": "DATETIME",
+    })
+
+
+def _transfer_interaction_link(cur) -> None:
+    _add_columns(cur, "tokentransfer", {"interaction_id": "INTEGER"})
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_tokentransfer_interaction_id ON tokentransfer (interaction_id)")
+
+
+def _rule_thresholds_and_tiers(cur) -> None:
+    _add_columns(cur, "rewardrule", {"min_amount": "REAL", "max_reward": "REAL", "tiers": "TEXT"})
+
+
+def _wallet_address_index(cur) -> None:
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_wallet_address ON wallet (address)")
+
+
+def _timeline_indexes(cur) -> None:
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_interaction_user_created ON interaction (user_id, created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_tokentransfer_from_created ON tokentransfer (from_wallet, created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_tokentransfer_to_created ON tokentransfer (to_wallet, created_at)")
+
+
+def _rebuild_with_autoincrement(cur, table: str) -> None:
+    """Recreate ``table`` with an AUTOINCREMENT id (SQLite cannot ALTER it in), keeping rows and indexes."""
+    ddl = cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    if ddl is None or "AUTOINCREMENT" in ddl[0].upper():
+        return
+    indexes = [
+        row[0] for row in cur.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+        ).fetchall()
+    ]
+    columns = cur.execute(f"PRAGMA table_info('{table}')").fetchall()
+    names = [row[1] for row in columns]
+    defs = ", ".join(
+        "id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT" if name == "id"
+        else f"{name} {type_}{' NOT NULL' if notnull else ''}"
+        for _, name, type_, notnull, _, _ in columns
+    )
+    cur.execute(f"CREATE TABLE {table}_new ({defs})")
+    cur.execute(f"INSERT INTO {table}_new ({', '.join(names)}) SELECT {', '.join(names)} FROM {table}")
+    cur.execute(f"DROP TABLE {table}")
+    cur.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    for sql in indexes:
+        cur.execute(sql)
+
+
+def _interaction_autoincrement(cur) -> None:
+    # ids are never reused once rows move to archives
+    _rebuild_with_autoincrement(cur, "interaction")
+
+
+def _transfer_blocks(cur) -> None:
+    # sealed blocks cover transfer id ranges, so ids must never be reused after deletes
+    _rebuild_with_autoincrement(cur, "tokentransfer")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_tokentransfer_tx_hash ON tokentransfer (tx_hash)")
+
+
+def _sketch_transfer_mark(cur) -> None:
+    _add_columns(cur, "sketchstate", {"last_transfer_id": "INTEGER NOT NULL DEFAULT 0"})
+
+
+MIGRATIONS: List[Tuple[int, str, Step]] = [
+    (1, "company profile and interaction analysis columns", _company_interaction_details),
+    (2, "tokentransfer.interaction_id", _transfer_interaction_link),
+    (3, "rewardrule min_amount, max_reward, tiers", _rule_thresholds_and_tiers),
+    (4, "wallet.address index", _wallet_address_index),
+    (5, "per-user timeline indexes on interaction and tokentransfer", _timeline_indexes),
+    (6, "interaction ids use AUTOINCREMENT for partition archiving", _interaction_autoincrement),
+    (7, "tokentransfer AUTOINCREMENT ids and tx_hash index for blocks", _transfer_blocks),
+    (8, "sketchstate.last_transfer_id for reward quantile sketches", _sketch_transfer_mark),
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def schema_version(engine: Engine) -> int:
+    conn = engine.raw_connection()
+    try:
+        return conn.cursor().execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def migrate(engine: Engine) -> List[str]:
+    """Bring the database up to LATEST; returns the descriptions of applied steps."""
+    if schema_version(engine) >= LATEST:
+        return []
+    conn = engine.raw_connection()
+    dbapi_conn = conn.driver_connection
+    previous = dbapi_conn.isolation_level
+    dbapi_conn.isolation_level = None  # manage the transaction ourselves
+    applied: List[str] = []
+    try:
+        cur = dbapi_conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            current = cur.execute("PRAGMA user_version").fetchone()[0]
+            for version, description, step in MIGRATIONS:
+                if version <= current:
+                    continue
+                step(cur)
+                cur.execute(f"PRAGMA user_version = {version}")
+                applied.append(description)
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+    finally:
+        dbapi_conn.isolation_level = previous
+        conn.close()
+    return applied
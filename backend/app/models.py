@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
 from pydantic import EmailStr
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
@@ -35,7 +36,7 @@ class Wallet(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     owner_type: str  # 'company' | 'user'
     owner_id: int
-    address: str
+    address: str = Field(index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
@@ -50,6 +51,9 @@ class User(SQLModel, table=True):
 
 
 class Interaction(SQLModel, table=True):
+    # AUTOINCREMENT: ids stay unique after old months are archived out of this table
+    __table_args__ = (Index("ix_interaction_user_created", "user_id", "created_at"), {"sqlite_autoincrement": True})
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int
     company_id: int
@@ -75,12 +79,19 @@ class Interaction(SQLModel, table=True):
 
 
 class TokenTransfer(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_tokentransfer_from_created", "from_wallet", "created_at"),
+        Index("ix_tokentransfer_to_created", "to_wallet", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    tx_hash: str
+    tx_hash: str = Field(index=True)
     from_wallet: Optional[str] = None
     to_wallet: Optional[str] = None
     amount: float
     memo: Optional[str] = None
+    interaction_id: Optional[int] = Field(default=None, index=True)  # reward transfers only
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
@@ -90,6 +101,9 @@ class RewardRule(SQLModel, table=True):
     action: str
     rate: float
     mode: str = "per_amount"  # "per_amount" | "flat"
+    min_amount: Optional[float] = None  # events below this amount earn nothing
+    max_reward: Optional[float] = None  # per-event cap
+    tiers: Optional[str] = None  # JSON list of {"min_amount", "rate"} bands, sorted
     is_active: bool = True
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -104,3 +118,106 @@ class SmartContract(SQLModel, table=True):
     is_active: bool = True
     secret: str = ""
     created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ReplayCheckpoint(SQLModel, table=True):
+    __table_args__ = (Index("ux_replaycheckpoint_company_job", "company_id", "job_id", "dry_run", unique=True),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: str  # chosen by the company; unique per company only
+    company_id: Optional[int] = None  # None: a job over every company
+    dry_run: bool = False  # a dry run of a job is tracked apart from the job itself
+    last_interaction_id: int = 0
+    scanned: int = 0
+    corrections: int = 0
+    delta_total: float = 0.0
+    skipped: int = 0
+    unlinked: int = 0  # interactions whose reward predates transfer linking, left uncorrected
+    finished: bool = False
+    lease_until: Optional[datetime] = None  # a worker is running the job until then (renewed per chunk)
+    error: Optional[str] = None  # why the last run stopped, if it failed
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class Block(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)  # height, genesis block is 1
+    prev_hash: str
+    merkle_root: str
+    block_hash: str = Field(index=True, unique=True)
+    first_transfer_id: int
+    last_transfer_id: int = Field(index=True)
+    tx_count: int
+    leaves: bytes  # tx_count concatenated 32-byte leaf hashes, in transfer id order
+    sealed_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class LedgerBalance(SQLModel, table=True):
+    """Running sum of recorded transfers per wallet, kept by the reconciliation job."""
+
+    address: str = Field(primary_key=True)
+    balance: float = 0.0
+    divergent: bool = Field(default=False, index=True)  # differed from the chain at the last check
+    chain_balance: Optional[float] = None  # chain balance seen at the last check
+
+
+class ReconcileState(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)  # single row, id 1
+    last_transfer_id: int = 0  # high-water mark: transfers up to here are in LedgerBalance
+    runs: int = 0
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class RewardOutbox(SQLModel, table=True):
+    __table_args__ = (Index("ix_rewardoutbox_status_available", "status", "available_at"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    interaction_id: int = Field(unique=True)  # committed with the interaction
+    company_id: int
+    user_id: int
+    action: str
+    amount: Optional[float] = None
+    status: str = "pending"  # "pending" | "paid" | "failed" | "held" (flagged, awaiting release)
+    attempts: int = 0
+    available_at: datetime = Field(default_factory=datetime.utcnow)  # claim lease / retry backoff
+    reward_tokens: Optional[float] = None
+    transfer_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    processed_at: Optional[datetime] = None
+
+
+class UserSketch(SQLModel, table=True):
+    __table_args__ = (Index("ux_usersketch_key", "company_id", "day", "action", unique=True),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    company_id: int
+    action: str
+    day: date
+    registers: bytes  # zlib-compressed HyperLogLog registers, see app/sketches.py
+
+
+class QuantileSketch(SQLModel, table=True):
+    __table_args__ = (Index("ux_quantilesketch_key", "company_id", "metric", "day", "action", unique=True),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    company_id: int
+    metric: str  # "amount" (Interaction.amount) | "reward" (reward transfer amount)
+    action: str
+    day: date
+    data: bytes  # zlib-compressed KLL sketch, see app/sketches.py
+
+
+class SketchState(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)  # single row, id 1
+    last_interaction_id: int = 0  # interactions up to here are in the sketches
+    last_transfer_id: int = 0  # reward transfers up to here are in the reward sketches
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class NetworkSnapshot(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)  # single row, id 1
+    last_interaction_id: int = 0  # the graph in `data` covers rows up to these ids
+    last_transfer_id: int = 0
+    edges: int = 0
+    data: bytes  # zlib-compressed JSON edge list, see app/network.py
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import heapq
+import json
+import threading
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from app.background import every
+from app.config import NETWORK_INTERVAL
+from app.models import Interaction, NetworkSnapshot, TokenTransfer, Wallet
+from app.services import company_name_map
+
+# Weighted company-user graph for the network view. Each edge holds the
+# interaction count and the tokens moved each way between a company and one of
+# its users. The graph lives in memory, one per database, and is brought up to
+# date by folding rows past its two high-water marks, so a request only reads
+# what was written since the last one. A background job saves it as a single
+# compressed snapshot row together with its marks; a restarted process loads
+# the snapshot and folds from there.
+
+# edge fields
+INTERACTIONS, TO_USER, TO_COMPANY = 0, 1, 2
+
+Owner = Tuple[str, int]  # ("company" | "user", id)
+
+
+class NetworkGraph:
+    def __init__(self) -> None:
+        self.edges: Dict[Tuple[int, int], List[float]] = {}
+        self.last_interaction_id = 0
+        self.last_transfer_id = 0
+        self.saved_at: Optional[Tuple[int, int]] = None  # marks of the last saved snapshot
+        self.owners: Dict[str, Optional[Owner]] = {}  # wallet address -> owner, None when not a wallet
+        self.lock = threading.Lock()
+
+    def _edge(self, company_id: int, user_id: int) -> List[float]:
+        edge = self.edges.get((company_id, user_id))
+        if edge is None:
+            edge = self.edges[(company_id, user_id)] = [0, 0.0, 0.0]
+        return edge
+
+    def load(self, snapshot: NetworkSnapshot) -> None:
+        self.edges = {(c, u): [i, tu, tc] for c, u, i, tu, tc in json.loads(zlib.decompress(snapshot.data))}
+        self.last_interaction_id = snapshot.last_interaction_id
+        self.last_transfer_id = snapshot.last_transfer_id
+        self.saved_at = (snapshot.last_interaction_id, snapshot.last_transfer_id)
+
+    def dump(self) -> bytes:
+        rows = [[c, u, e[INTERACTIONS], e[TO_USER], e[TO_COMPANY]] for (c, u), e in self.edges.items()]
+        return zlib.compress(json.dumps(rows, separators=(",", ":")).encode(), 6)
+
+    def _owners(self, session: Session, addresses: set) -> None:
+        missing = [a for a in addresses if a not in self.owners]
+        if not missing:
+            return
+        found = {
+            address: (owner_type, owner_id)
+            for address, owner_type, owner_id in session.exec(
+                select(Wallet.address, Wallet.owner_type, Wallet.owner_id).where(Wallet.address.in_(missing))
+            ).all()
+        }
+        for address in missing:
+            self.owners[address] = found.get(address)
+
+    def _fold_interactions(self, session: Session, chunk_size: int) -> int:
+        from app.partitions import scan
+
+        stmt = (
+            select(Interaction.id, Interaction.company_id, Interaction.user_id)
+            .where(Interaction.id > self.last_interaction_id)
+            .order_by(Interaction.id)
+            .limit(chunk_size)
+        )
+        rows = list(scan(session, stmt, key=lambda r: r[0], limit=chunk_size))
+        for _, company_id, user_id in rows:
+            self._edge(company_id, user_id)[INTERACTIONS] += 1
+        if rows:
+            self.last_interaction_id = rows[-1][0]
+        return len(rows)
+
+    def _fold_transfers(self, session: Session, chunk_size: int) -> int:
+        rows = session.exec(
+            select(TokenTransfer.id, TokenTransfer.from_wallet, TokenTransfer.to_wallet, TokenTransfer.amount)
+            .where(TokenTransfer.id > self.last_transfer_id, TokenTransfer.from_wallet.is_not(None))
+            .order_by(TokenTransfer.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return 0
+        self._owners(session, {a for r in rows for a in r[1:3] if a})
+        for _, from_w, to_w, amount in rows:
+            src, dst = self.owners.get(from_w), self.owners.get(to_w)
+            if not src or not dst or src[0] == dst[0]:
+                continue  # only company <-> user transfers are edges
+            if src[0] == "company":
+                self._edge(src[1], dst[1])[TO_USER] += amount
+            else:
+                self._edge(dst[1], src[1])[TO_COMPANY] += amount
+        self.last_transfer_id = rows[-1][0]
+        return len(rows)
+
+    def fold(self, session: Session, chunk_size: int = 10_000) -> int:
+        """Apply every interaction and transfer written since the last fold; returns the rows read."""
+        with self.lock:
+            n = 0
+            while True:
+                step = self._fold_interactions(session, chunk_size) + self._fold_transfers(session, chunk_size)
+                if not step:
+                    return n
+                n += step
+
+    def view(self, session: Session, top_k: Optional[int] = None, weight: str = "interactions") -> Dict[str, Any]:
+        """Compact payload: nodes as id lists, edges as [company_id, user_id, interactions, tokens_to_user, tokens_to_company].
+
+        With ``top_k`` each company keeps only its ``top_k`` heaviest edges by
+        ``weight`` ("interactions" or "tokens", both directions summed).
+        """
+        def key(item: Tuple[Tuple[int, int], List[float]]) -> float:
+            e = item[1]
+            return e[INTERACTIONS] if weight == "interactions" else e[TO_USER] + e[TO_COMPANY]
+
+        with self.lock:
+            total = len(self.edges)
+            if top_k is None:
+                kept = list(self.edges.items())
+            else:
+                by_company: Dict[int, List[Tuple[Tuple[int, int], List[float]]]] = defaultdict(list)
+                for item in self.edges.items():
+                    by_company[item[0][0]].append(item)
+                kept = [item for items in by_company.values() for item in heapq.nlargest(top_k, items, key=key)]
+            edges = [[c, u, int(e[INTERACTIONS]), round(e[TO_USER], 6), round(e[TO_COMPANY], 6)] for (c, u), e in kept]
+            marks = {"last_interaction_id": self.last_interaction_id, "last_transfer_id": self.last_transfer_id}
+
+        companies = sorted({e[0] for e in edges})
+        names = company_name_map(session, companies)
+        return {
+            "companies": [[cid, names.get(cid)] for cid in companies],
+            "users": sorted({e[1] for e in edges}),
+            "edge_fields": ["company_id", "user_id", "interactions", "tokens_to_user", "tokens_to_company"],
+            "edges": edges,
+            "total_edges": total,
+            "pruned_edges": total - len(edges),
+            **marks,
+        }
+
+    def reset(self) -> None:
+        with self.lock:
+            self.edges.clear()
+            self.owners.clear()
+            self.last_interaction_id = self.last_transfer_id = 0
+            self.saved_at = None
+
+
+_GRAPHS: Dict[str, NetworkGraph] = {}
+_GRAPHS_LOCK = threading.Lock()
+
+
+def _graph(session: Session) -> NetworkGraph:
+    bind: Engine = session.get_bind(Interaction)
+    url = str(bind.url)
+    with _GRAPHS_LOCK:
+        graph = _GRAPHS.get(url)
+        if graph is None:
+            graph = _GRAPHS[url] = NetworkGraph()
+            snapshot = session.get(NetworkSnapshot, 1)
+            if snapshot is not None:
+                graph.load(snapshot)
+        return graph
+
+
+def graph_for(session: Session) -> NetworkGraph:
+    """The graph of the session's database, loaded from its snapshot on first use and brought up to date."""
+    graph = _graph(session)
+    graph.fold(session)
+    return graph
+
+
+def save_snapshot(session: Session) -> Optional[Dict[str, Any]]:
+    """Persist the graph with its marks when it moved since the last save."""
+    graph = graph_for(session)
+    with graph.lock:
+        marks = (graph.last_interaction_id, graph.last_transfer_id)
+        if marks == graph.saved_at:
+            return None
+        data, edges = graph.dump(), len(graph.edges)
+    snapshot = session.get(NetworkSnapshot, 1) or NetworkSnapshot(id=1, data=b"")
+    snapshot.last_interaction_id, snapshot.last_transfer_id = marks
+    snapshot.edges = edges
+    snapshot.data = data
+    snapshot.updated_at = datetime.utcnow()
+    session.add(snapshot)
+    session.commit()
+    graph.saved_at = marks
+    return {"last_interaction_id": marks[0], "last_transfer_id": marks[1], "edges": edges, "bytes": len(data)}
+
+
+def reset_network(session: Session) -> None:
+    _graph(session).reset()
+    snapshot = session.get(NetworkSnapshot, 1)
+    if snapshot:
+        session.delete(snapshot)
+
+
+def start_network_snapshots() -> Optional[threading.Thread]:
+    """Fold and save the network graph every NETWORK_INTERVAL seconds in a daemon thread."""
+    return every(NETWORK_INTERVAL, "network-snapshot", save_snapshot)
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from app.background import every
+from app.config import (
+    ASYNC_REWARDS,
+    REWARD_BATCH,
+    REWARD_LEASE,
+    REWARD_MAX_ATTEMPTS,
+    REWARD_POLL_INTERVAL,
+    REWARD_WORKERS,
+    RISK_HOLD,
+)
+from app.events import BUS, transfer_event
+from app.models import Interaction, RewardOutbox, TokenTransfer
+from app.services import pay_reward, reward_for
+
+# Asynchronous rewards: POST /interactions?async=true commits the interaction
+# and a RewardOutbox row in one transaction and returns. Workers claim pending
+# rows in batches and pay each one in its own transaction, which also marks the
+# row paid, so on the database side a reward is recorded exactly once. A worker
+# that dies mid-batch leaves its rows to be claimed again when the lease runs
+# out; a row whose interaction already has a reward transfer is settled from it
+# instead of paying twice. A crash between the chain call and the commit can
+# still leave an unrecorded chain transfer, which the reconciler reports.
+#
+# Only ATHENA_ASYNC_REWARDS and ATHENA_RISK_HOLD put rows in the outbox, so the
+# workers run only when one of them is set; otherwise ?async=true is ignored and
+# the reward is paid inline.
+WORKERS_ENABLED = ASYNC_REWARDS or RISK_HOLD
+
+
+def enqueue(session: Session, it: Interaction, status: str = "pending") -> RewardOutbox:
+    """Add the outbox row for the flushed interaction ``it``; the caller commits both together.
+
+    A "held" row is skipped by the workers until ``release`` makes it pending.
+    """
+    row = RewardOutbox(
+        interaction_id=it.id,
+        company_id=it.company_id,
+        user_id=it.user_id,
+        action=it.action,
+        amount=it.amount,
+        status=status,
+    )
+    session.add(row)
+    return row
+
+
+def release(session: Session, company_id: int, interaction_id: int) -> Optional[RewardOutbox]:
+    """Queue a held reward for payment; None when the company has no such row."""
+    row = session.exec(select(RewardOutbox).where(RewardOutbox.interaction_id == interaction_id)).first()
+    if row is None or row.company_id != company_id:
+        return None
+    if row.status == "held":
+        row.status = "pending"
+        row.available_at = datetime.utcnow()
+        session.add(row)
+        session.commit()
+        session.refresh(row)
+    return row
+
+
+def claim(session: Session, limit: int, now: Optional[datetime] = None) -> List[RewardOutbox]:
+    """Lease up to ``limit`` due rows to this worker; one UPDATE, so two workers never get the same row.
+
+    An idle outbox is detected with a read first, so polling takes the write lock only when there is work.
+    """
+    now = now or datetime.utcnow()
+    due = select(RewardOutbox.id).where(RewardOutbox.status == "pending", RewardOutbox.available_at <= now)
+    found = session.exec(due.limit(1)).first()
+    session.commit()  # end the read transaction; upgrading it to a writer could hit SQLITE_BUSY
+    if found is None:
+        return []
+    ids = session.execute(
+        update(RewardOutbox)
+        .where(RewardOutbox.id.in_(due.order_by(RewardOutbox.id).limit(limit).scalar_subquery()))
+        .values(available_at=now + timedelta(seconds=REWARD_LEASE), attempts=RewardOutbox.attempts + 1)
+        .returning(RewardOutbox.id)
+    ).scalars().all()
+    session.commit()
+    if not ids:
+        return []
+    return list(session.exec(select(RewardOutbox).where(RewardOutbox.id.in_(ids)).order_by(RewardOutbox.id)))
+
+
+def _settle(session: Session, row: RewardOutbox) -> Optional[Dict[str, Any]]:
+    """Pay ``row`` and mark it paid in one commit; returns the transfer event to publish, if any."""
+    event = None
+    paid = session.exec(select(TokenTransfer).where(TokenTransfer.interaction_id == row.interaction_id)).first()
+    if paid is None:
+        reward = reward_for(session, row.company_id, row.action, row.amount)
+        if reward > 0:
+            paid = pay_reward(session, row.company_id, row.user_id, row.action, reward, row.interaction_id)
+            event = transfer_event(paid)
+    row.status = "paid"
+    row.reward_tokens = paid.amount if paid else 0.0
+    row.transfer_id = paid.id if paid else None
+    row.error = None
+    row.processed_at = datetime.utcnow()
+    session.add(row)
+    session.commit()
+    return event
+
+
+def _fail(session: Session, row_id: int, exc: Exception) -> None:
+    row = session.get(RewardOutbox, row_id)
+    if row is None:
+        return
+    row.error = str(exc) or type(exc).__name__
+    if row.attempts >= REWARD_MAX_ATTEMPTS:
+        row.status = "failed"
+        row.processed_at = datetime.utcnow()
+    else:
+        # exponential backoff, capped at a minute
+        row.available_at = datetime.utcnow() + timedelta(seconds=min(2 ** row.attempts, 60))
+    session.add(row)
+    session.commit()
+
+
+def drain_outbox(session: Session, batch_size: int = REWARD_BATCH) -> Dict[str, int]:
+    """Claim and settle batches until nothing is due; a failing row is retried later, then marked failed."""
+    counts = {"paid": 0, "retried": 0}
+    while True:
+        rows = claim(session, batch_size)
+        if not rows:
+            return counts
+        for row in rows:
+            row_id = row.id
+            try:
+                event = _settle(session, row)
+            except Exception as exc:
+                session.rollback()
+                _fail(session, row_id, exc)
+                counts["retried"] += 1
+                continue
+            if event:
+                BUS.publish(event)
+            counts["paid"] += 1
+
+
+def reward_status(session: Session, company_id: int, interaction_id: int) -> Optional[Dict[str, Any]]:
+    """Reward state of one of the company's interactions; None when it is not theirs or does not exist."""
+    row = session.exec(select(RewardOutbox).where(RewardOutbox.interaction_id == interaction_id)).first()
+    if row is not None:
+        if row.company_id != company_id:
+            return None
+        return outbox_status(row)
+
+    # paid synchronously: the interaction has no outbox row
+    from app.partitions import scan
+
+    it = next(scan(session, select(Interaction).where(Interaction.id == interaction_id), limit=1), None)
+    if it is None or it.company_id != company_id:
+        return None
+    tx = session.exec(select(TokenTransfer).where(TokenTransfer.interaction_id == interaction_id)).first()
+    return {
+        "interaction_id": interaction_id,
+        "status": "paid",
+        "reward_tokens": tx.amount if tx else 0.0,
+        "transfer_id": tx.id if tx else None,
+        "attempts": 1,
+        "error": None,
+        "processed_at": tx.created_at if tx else it.created_at,
+    }
+
+
+def outbox_status(row: RewardOutbox) -> Dict[str, Any]:
+    return {
+        "interaction_id": row.interaction_id,
+        "status": row.status,
+        "reward_tokens": row.reward_tokens,
+        "transfer_id": row.transfer_id,
+        "attempts": row.attempts,
+        "error": row.error,
+        "processed_at": row.processed_at,
+    }
+
+
+def start_reward_workers() -> List[threading.Thread]:
+    """REWARD_WORKERS daemon threads polling the outbox every REWARD_POLL_INTERVAL seconds, when it is in use."""
+    if not WORKERS_ENABLED:
+        return []
+    threads = [every(REWARD_POLL_INTERVAL, f"reward-worker-{i}", drain_outbox) for i in range(REWARD_WORKERS)]
+    return [t for t in threads if t is not None]
@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import heapq
+import os
+import re
+import sqlite3
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, create_engine
+
+from app.config import ARCHIVE_DIR, HOT_MONTHS
+from app.meta_fields import META_FIELDS, column_name, extract_sql
+from app.models import Interaction
+
+# Interactions live in monthly partitions. The `interaction` table is the hot
+# partition: it takes every insert and, once archiving is used, holds the last
+# HOT_MONTHS months. Older months are moved to <root>/interaction_YYYY_MM.db,
+# one read-only SQLite file per month whose `meta` column is zlib-compressed.
+# The root is `<database>_archive` next to each database file (athena.db ->
+# athena_archive/, shards/company_3.db -> shards/company_3_archive/), or a
+# subdirectory per database of ARCHIVE_DIR when that is set. Readers go through
+# `scan`, which adds the archives overlapping the requested time range.
+
+Month = Tuple[int, int]
+
+_ARCHIVE_RE = re.compile(r"^interaction_(\d{4})_(\d{2})\.db$")
+_PACKED = "interaction_packed"
+
+# path -> (mtime, engine); an archive rebuilt in place gets a fresh engine
+_ENGINES: Dict[str, Tuple[float, Engine]] = {}
+
+
+def month_of(ts: datetime) -> Month:
+    return ts.year, ts.month
+
+
+def month_start(month: Month) -> datetime:
+    return datetime(month[0], month[1], 1)
+
+
+def next_month(month: Month) -> Month:
+    year, m = month
+    return (year + 1, 1) if m == 12 else (year, m + 1)
+
+
+def archive_root(engine: Engine) -> str:
+    stem = os.path.splitext(os.path.abspath(engine.url.database or "memory"))[0]
+    if ARCHIVE_DIR:
+        return os.path.join(ARCHIVE_DIR, os.path.basename(stem))
+    return f"{stem}_archive"
+
+
+def archive_path(month: Month, root: str) -> str:
+    return os.path.join(root, f"interaction_{month[0]:04d}_{month[1]:02d}.db")
+
+
+def archived_months(root: str) -> List[Month]:
+    if not os.path.isdir(root):
+        return []
+    months = []
+    for name in os.listdir(root):
+        m = _ARCHIVE_RE.match(name)
+        if m:
+            months.append((int(m.group(1)), int(m.group(2))))
+    return sorted(months)
+
+
+def archives_between(start: Optional[datetime], end: Optional[datetime], root: str) -> List[Month]:
+    """Archived months overlapping [start, end); the rest are pruned without being opened."""
+    return [
+        month for month in archived_months(root)
+        if (start is None or month_start(next_month(month)) > start) and (end is None or month_start(month) < end)
+    ]
+
+
+def _pack(meta: Optional[str]) -> Optional[bytes]:
+    return None if meta is None else zlib.compress(meta.encode(), 6)
+
+
+def _unpack(blob: Optional[bytes]) -> Optional[str]:
+    return None if blob is None else zlib.decompress(blob).decode()
+
+
+def _archive_engine(month: Month, root: str) -> Engine:
+    path = os.path.abspath(archive_path(month, root))
+    mtime = os.stat(path).st_mtime
+    cached = _ENGINES.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    engine = create_engine(f"sqlite:///file:{path}?mode=ro&immutable=1&uri=true", echo=False)
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_conn, _record) -> None:
+        dbapi_conn.create_function("athena_unpack", 1, _unpack, deterministic=True)
+        packed = {row[1] for row in dbapi_conn.execute(f"PRAGMA table_info('{_PACKED}')")}
+        # Expose the model's current columns; ones added after the month was archived read as NULL.
+        cols = ", ".join(
+            "athena_unpack(meta) AS meta" if c == "meta" else c if c in packed else f"NULL AS {c}"
+            for c in Interaction.__table__.columns.keys()
+        )
+        # meta fields are computed on read here; archives are cold and not indexed for them
+        for name, path in META_FIELDS.items():
+            cols += f", {extract_sql(path, 'athena_unpack(meta)')} AS {column_name(name)}"
+        dbapi_conn.execute(f"CREATE TEMP VIEW interaction AS SELECT {cols} FROM {_PACKED}")
+
+    if cached:
+        cached[1].dispose()
+    _ENGINES[path] = (mtime, engine)
+    return engine
+
+
+def _run(session: Session, stmt) -> List[Any]:
+    return list(session.exec(stmt))
+
+
+def scan(
+    session: Session,
+    stmt,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    key: Optional[Callable[[Any], Any]] = None,
+    reverse: bool = False,
+    limit: Optional[int] = None,
+) -> Iterator[Any]:
+    """Run a select over `Interaction` on every partition overlapping [start, end).
+
+    The range is also added to the statement. With ``key`` the per-partition
+    results, each already ordered by the statement's ORDER BY, are merged into
+    one ordered stream; without it partitions are concatenated, hot first.
+    """
+    if start is not None:
+        stmt = stmt.where(Interaction.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(Interaction.created_at < end)
+
+    results: List[Iterable[Any]] = [_run(session, stmt)]
+    root = archive_root(session.get_bind(Interaction))
+    for month in archives_between(start, end, root):
+        with Session(_archive_engine(month, root)) as archive:
+            results.append(_run(archive, stmt))
+
+    rows = heapq.merge(*results, key=key, reverse=reverse) if key else chain(*results)
+    return islice(rows, limit) if limit is not None else iter(rows)
+
+
+def _db_path(engine: Engine) -> str:
+    return os.path.abspath(engine.url.database)
+
+
+def _closed_months(cur, cutoff: datetime) -> List[Month]:
+    rows = cur.execute(
+        "SELECT DISTINCT strftime('%Y', created_at), strftime('%m', created_at) FROM interaction WHERE created_at < ?",
+        (str(cutoff),),
+    ).fetchall()
+    return sorted((int(y), int(m)) for y, m in rows)
+
+
+def _build_archive(hot_path: str, month: Month, root: str) -> int:
+    """Write hot rows of ``month`` (plus any existing archive) to a new read-only file; returns rows written."""
+    final = archive_path(month, root)
+    tmp = final + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    lo, hi = str(month_start(month)), str(month_start(next_month(month)))
+
+    conn = sqlite3.connect(f"file:{tmp}?mode=rwc", uri=True)
+    try:
+        conn.create_function("athena_pack", 1, _pack, deterministic=True)
+        conn.execute("ATTACH DATABASE ? AS hot", (f"file:{hot_path}?mode=ro",))
+        columns = [(row[1], row[2]) for row in conn.execute("PRAGMA hot.table_info('interaction')")]
+        names = [name for name, _ in columns]
+        defs = ", ".join(
+            "id INTEGER PRIMARY KEY" if name == "id" else f"{name} BLOB" if name == "meta" else f"{name} {type_}"
+            for name, type_ in columns
+        )
+        conn.execute(f"CREATE TABLE {_PACKED} ({defs})")
+        if os.path.exists(final):
+            conn.execute("ATTACH DATABASE ? AS old", (f"file:{os.path.abspath(final)}?mode=ro&immutable=1",))
+            old_cols = [row[1] for row in conn.execute(f"PRAGMA old.table_info('{_PACKED}')")]
+            shared = ", ".join(c for c in names if c in old_cols)
+            conn.execute(f"INSERT OR IGNORE INTO {_PACKED} ({shared}) SELECT {shared} FROM old.{_PACKED}")
+            conn.commit()
+            conn.execute("DETACH DATABASE old")
+        select_cols = ", ".join("athena_pack(meta)" if c == "meta" else c for c in names)
+        conn.execute(
+            f"INSERT OR IGNORE INTO {_PACKED} ({', '.join(names)}) "
+            f"SELECT {select_cols} FROM hot.interaction WHERE created_at >= ? AND created_at < ?",
+            (lo, hi),
+        )
+        conn.execute(f"CREATE INDEX ix_packed_user_created ON {_PACKED} (user_id, created_at)")
+        conn.execute(f"CREATE INDEX ix_packed_company_created ON {_PACKED} (company_id, created_at)")
+        conn.commit()
+        conn.execute("DETACH DATABASE hot")
+        written = conn.execute(f"SELECT COUNT(*) FROM {_PACKED}").fetchone()[0]
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    _seal(tmp, final)
+    return written
+
+
+def _seal(tmp: str, final: str) -> None:
+    """Make the finished ``tmp`` durable and read-only, then swap it in for ``final``."""
+    fd = os.open(tmp, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.chmod(tmp, 0o444)
+    os.replace(tmp, final)
+
+
+@contextmanager
+def _write_locked(engine: Engine) -> Iterator[Any]:
+    """A cursor on ``engine``'s database inside BEGIN IMMEDIATE, committed on success."""
+    conn = engine.raw_connection()
+    dbapi_conn = conn.driver_connection
+    previous = dbapi_conn.isolation_level
+    dbapi_conn.isolation_level = None
+    try:
+        cur = dbapi_conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            yield cur
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+    finally:
+        dbapi_conn.isolation_level = previous
+        conn.close()
+
+
+def archive_closed_months(engine: Engine, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Move every month older than the last HOT_MONTHS out of the hot table.
+
+    Runs under BEGIN IMMEDIATE on the main database, so concurrent workers
+    archive a month once and no insert lands in between copy and delete. A
+    month that already has an archive is rebuilt with the late rows merged in.
+    If the process dies after an archive is written but before the hot rows are
+    deleted, the next run rewrites the same rows by id, so nothing is doubled.
+    """
+    if engine.url.database in (None, "", ":memory:"):
+        return []
+    now = now or datetime.utcnow()
+    cutoff_month = month_of(now)
+    for _ in range(max(HOT_MONTHS, 1) - 1):
+        y, m = cutoff_month
+        cutoff_month = (y - 1, 12) if m == 1 else (y, m - 1)
+    cutoff = month_start(cutoff_month)
+
+    root = archive_root(engine)
+    os.makedirs(root, exist_ok=True)
+    hot_path = _db_path(engine)
+    archived: List[Dict[str, Any]] = []
+    with _write_locked(engine) as cur:
+        for month in _closed_months(cur, cutoff):
+            rows = _build_archive(hot_path, month, root)
+            moved = cur.execute(
+                "DELETE FROM interaction WHERE created_at >= ? AND created_at < ?",
+                (str(month_start(month)), str(month_start(next_month(month)))),
+            ).rowcount
+            archived.append({"month": f"{month[0]:04d}-{month[1]:02d}", "moved": moved, "archived_rows": rows})
+    return archived
+
+
+def _remove_archive(path: str) -> None:
+    path = os.path.abspath(path)
+    cached = _ENGINES.pop(path, None)
+    if cached:
+        cached[1].dispose()
+    os.chmod(path, 0o644)
+    os.remove(path)
+
+
+def _rebuild_without_company(month: Month, root: str, company_id: int) -> Optional[int]:
+    """Rewrite one archive without ``company_id``'s rows; None when it had none, 0 when it was removed."""
+    final = os.path.abspath(archive_path(month, root))
+    old = sqlite3.connect(f"file:{final}?mode=ro&immutable=1", uri=True)
+    try:
+        if old.execute(f"SELECT 1 FROM {_PACKED} WHERE company_id = ? LIMIT 1", (company_id,)).fetchone() is None:
+            return None
+        ddl = old.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND type IN ('table', 'index') ORDER BY type = 'index'"
+        ).fetchall()
+    finally:
+        old.close()
+
+    tmp = final + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(f"file:{tmp}?mode=rwc", uri=True)
+    try:
+        conn.execute("ATTACH DATABASE ? AS old", (f"file:{final}?mode=ro&immutable=1",))
+        conn.execute(ddl[0][0])
+        conn.execute(f"INSERT INTO {_PACKED} SELECT * FROM old.{_PACKED} WHERE company_id != ?", (company_id,))
+        for (sql,) in ddl[1:]:
+            conn.execute(sql)
+        conn.commit()
+        conn.execute("DETACH DATABASE old")
+        kept = conn.execute(f"SELECT COUNT(*) FROM {_PACKED}").fetchone()[0]
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    if not kept:
+        os.remove(tmp)
+        _remove_archive(final)
+        return 0
+    _seal(tmp, final)
+    return kept
+
+
+def purge_company_archives(engine: Engine, company_id: int) -> int:
+    """Rewrite the archives of ``engine``'s database without the company's interactions; returns files changed.
+
+    Holds the database's write lock like archiving does, so no month is
+    archived concurrently. Run it before deleting the company's hot rows: if it
+    fails, nothing is deleted yet and the deletion can simply be retried.
+    """
+    root = archive_root(engine)
+    changed = 0
+    with _write_locked(engine):
+        for month in archived_months(root):
+            if _rebuild_without_company(month, root, company_id) is not None:
+                changed += 1
+    return changed
+
+
+def drop_archives(root: str) -> int:
+    """Delete every archive file under ``root`` (dev reset only)."""
+    months = archived_months(root)
+    for month in months:
+        _remove_archive(archive_path(month, root))
+    return len(months)
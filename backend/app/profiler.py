@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import (
+    PROFILER_DIR,
+    PROFILER_INTERVAL_MS,
+    PROFILER_KEEP,
+    PROFILER_MAX_SECONDS,
+    PROFILER_SAMPLE_RATE,
+    PROFILER_SECRET,
+)
+
+# Opt-in profiling of single requests in a running server. A request is
+# captured when it carries a valid X-Athena-Profile header (see `sign`) or
+# falls in the PROFILER_SAMPLE_RATE fraction. A sampling thread then records
+# the stacks of the event loop and the AnyIO worker threads that run sync
+# handlers and dependencies, keeping only stacks inside the backend, and the
+# result is written as a speedscope file named after the id returned in
+# X-Athena-Profile-Id. One capture runs at a time per process; other requests
+# in flight during it show up in the same profile, so its name records how
+# many there were. Unprofiled requests pay one random() and a header lookup.
+
+HEADER = b"x-athena-profile"
+ID_HEADER = b"x-athena-profile-id"
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_WORKER = "AnyIO worker thread"
+
+
+def _signature(method: str, path: str, expires: int) -> str:
+    message = f"{expires}:{method.upper()}:{path}".encode()
+    return hmac.new(PROFILER_SECRET.encode(), message, hashlib.sha256).hexdigest()
+
+
+def sign(method: str, path: str, ttl: int = 300) -> str:
+    """X-Athena-Profile value for ``method path``, valid for ``ttl`` seconds."""
+    expires = int(time.time()) + ttl
+    return f"{expires}.{_signature(method, path, expires)}"
+
+
+def verify(value: str, method: str, path: str) -> bool:
+    if not PROFILER_SECRET:
+        return False
+    expires, _, signature = value.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(method, path, int(expires)))
+
+
+class Capture(threading.Thread):
+    """Samples request-serving threads into speedscope frames until stopped or PROFILER_MAX_SECONDS."""
+
+    def __init__(self, loop_thread: int) -> None:
+        super().__init__(name="request-profiler", daemon=True)
+        self.loop_thread = loop_thread
+        self.frames: List[Dict[str, Any]] = []
+        self._frame_ids: Dict[Tuple[str, str, int], int] = {}
+        self.samples: Dict[int, List[Tuple[List[int], float]]] = {}  # thread ident -> (stack, ms)
+        self.names: Dict[int, str] = {}
+        self.stopped = threading.Event()
+        self.started_at = time.perf_counter()
+
+    def _frame_id(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        fid = self._frame_ids.get(key)
+        if fid is None:
+            fid = self._frame_ids[key] = len(self.frames)
+            self.frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return fid
+
+    def _sample(self, elapsed_ms: float) -> None:
+        threads = {t.ident: t.name for t in threading.enumerate() if t.name == _WORKER}
+        threads[self.loop_thread] = "event loop"
+        for ident, frame in sys._current_frames().items():
+            if ident not in threads:
+                continue
+            stack, ours = [], False
+            while frame is not None:
+                stack.append(frame.f_code)
+                ours = ours or frame.f_code.co_filename.startswith(BACKEND_ROOT)
+                frame = frame.f_back
+            if not ours:
+                continue  # idle, or running someone else's request outside our code
+            self.names[ident] = threads[ident]
+            self.samples.setdefault(ident, []).append(([self._frame_id(c) for c in reversed(stack)], elapsed_ms))
+
+    def run(self) -> None:
+        interval = PROFILER_INTERVAL_MS / 1000
+        last = time.perf_counter()
+        while not self.stopped.wait(interval):
+            now = time.perf_counter()
+            self._sample((now - last) * 1000)
+            last = now
+            if now - self.started_at > PROFILER_MAX_SECONDS:
+                return
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        profiles = []
+        for ident, samples in self.samples.items():
+            total = sum(ms for _, ms in samples)
+            profiles.append({
+                "type": "sampled",
+                "name": f"{self.names[ident]} ({ident})",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": total,
+                "samples": [stack for stack, _ in samples],
+                "weights": [ms for _, ms in samples],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "athena",
+            "shared": {"frames": self.frames},
+            "profiles": profiles,
+        }
+
+
+def _rotate(directory: str, keep: int) -> None:
+    files = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(".speedscope.json")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in files[:max(len(files) - keep, 0)]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def save(profile_id: str, payload: Dict[str, Any], directory: str = PROFILER_DIR, keep: int = PROFILER_KEEP) -> str:
+    """Write one profile and drop the oldest beyond ``keep``; returns its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{profile_id}.speedscope.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f, separators=(",", ":"))
+    os.replace(tmp, path)
+    _rotate(directory, keep)
+    return path
+
+
+def _finish(capture: Capture, profile_id: str, name: str) -> None:
+    capture.join()
+    save(profile_id, capture.speedscope(name))
+
+
+class ProfilerMiddleware:
+    """ASGI middleware; streaming responses pass through untouched and are sampled up to PROFILER_MAX_SECONDS."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self.capture: Optional[Capture] = None
+        self.in_flight = 0
+
+    def _wanted(self, scope) -> bool:
+        if PROFILER_SAMPLE_RATE and random.random() < PROFILER_SAMPLE_RATE:
+            return True
+        for key, value in scope["headers"]:
+            if key == HEADER:
+                return verify(value.decode("latin-1"), scope["method"], scope["path"])
+        return False
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.in_flight += 1
+        try:
+            # checked and set without an await in between, so on the one event loop this is race-free;
+            # a capture past PROFILER_MAX_SECONDS (e.g. of an event stream) no longer blocks the next one
+            if self._wanted(scope) and (self.capture is None or not self.capture.is_alive()):
+                self.capture = Capture(threading.get_ident())
+                await self._profiled(self.capture, scope, receive, send)
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+    async def _profiled(self, capture: Capture, scope, receive, send) -> None:
+        profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{secrets.token_hex(4)}"
+        status: Optional[int] = None
+        most = self.in_flight
+
+        async def send_with_id(message) -> None:
+            nonlocal status, most
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (ID_HEADER, profile_id.encode())]}
+            most = max(most, self.in_flight)
+            await send(message)
+
+        capture.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            capture.stopped.set()
+            elapsed = (time.perf_counter() - capture.started_at) * 1000
+            name = f"{scope['method']} {scope['path']} -> {status} in {elapsed:.1f} ms ({most} requests in flight)"
+            # joining the sampler, building the profile and writing it all block: keep them off the event loop
+            await run_in_threadpool(_finish, capture, profile_id, name)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print an X-Athena-Profile header value signed with ATHENA_PROFILER_SECRET.")
+    parser.add_argument("method")
+    parser.add_argument("path")
+    parser.add_argument("--ttl", type=int, default=300, help="seconds the signature stays valid")
+    args = parser.parse_args()
+    if not PROFILER_SECRET:
+        sys.exit("ATHENA_PROFILER_SECRET is not set")
+    print(sign(args.method, args.path, args.ttl))
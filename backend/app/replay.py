@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, func, select
+
+from app.blockchain import CHAIN
+from app.events import BUS, transfer_event
+from app.models import Interaction, ReplayCheckpoint, RewardRule, TokenTransfer, Wallet
+from app.partitions import scan
+from app.services import mint_recorded
+from app.rule_engine import RuleTable, compile_rules, evaluate
+
+# Differences below this are float noise, not misconfiguration
+EPSILON = 1e-9
+# A running job renews its lease after every chunk; a job whose lease ran out
+# (its process died) is picked up again by the next POST with the same job_id.
+LEASE = timedelta(minutes=5)
+
+log = logging.getLogger(__name__)
+
+# (interaction_id, company_id, user_id, action, delta)
+Correction = Tuple[int, int, int, str, float]
+Chunk = Tuple[List[int], List[int], List[int], List[str], List[Optional[float]], Dict[int, float]]
+
+
+def _diff_chunk(table: RuleTable, chunk: Chunk) -> List[Correction]:
+    """Expected minus already-paid reward for one chunk; runs in a worker process."""
+    ids, company_ids, user_ids, actions, amounts, paid = chunk
+    expected = evaluate(table, company_ids, actions, amounts)
+    already = np.fromiter((paid.get(i, 0.0) for i in ids), dtype=np.float64, count=len(ids))
+    delta = expected - already
+    return [
+        (ids[k], company_ids[k], user_ids[k], actions[k], float(delta[k]))
+        for k in np.flatnonzero(np.abs(delta) > EPSILON)
+    ]
+
+
+def _user_wallets(session: Session, user_ids: List[int]) -> Dict[int, str]:
+    rows = session.exec(
+        select(Wallet.owner_id, Wallet.address).where(Wallet.owner_type == "user", Wallet.owner_id.in_(user_ids))
+    ).all()
+    return {owner_id: address for owner_id, address in rows}
+
+
+def unlinked_before(session: Session, company_id: Optional[int]) -> Optional[datetime]:
+    """Time of the latest reward paid out of the scope's master wallets without an interaction link.
+
+    Rewards recorded before tokentransfer.interaction_id existed (migration 2)
+    cannot be matched to their interaction, so interactions created up to then
+    that have no linked transfer are left alone instead of being paid again.
+    """
+    masters = select(Wallet.address).where(Wallet.owner_type == "company")
+    if company_id is not None:
+        masters = masters.where(Wallet.owner_id == company_id)
+    return session.exec(
+        select(func.max(TokenTransfer.created_at)).where(
+            TokenTransfer.interaction_id.is_(None),
+            TokenTransfer.from_wallet.in_(masters),
+            TokenTransfer.memo != "manual transfer",
+        )
+    ).one()
+
+
+def _read_chunks(
+    session: Session,
+    company_id: Optional[int],
+    after_id: int,
+    chunk_size: int,
+    unlinked_until: Optional[datetime] = None,
+) -> Iterator[Tuple[int, int, Chunk]]:
+    """(last interaction id, interactions scanned, chunk); the chunk leaves out unlinked legacy interactions."""
+    while True:
+        query = select(
+            Interaction.id,
+            Interaction.company_id,
+            Interaction.user_id,
+            Interaction.action,
+            Interaction.amount,
+            Interaction.created_at,
+        ).where(Interaction.id > after_id)
+        if company_id is not None:
+            query = query.where(Interaction.company_id == company_id)
+        scanned = list(scan(session, query.order_by(Interaction.id).limit(chunk_size), key=lambda r: r[0], limit=chunk_size))
+        if not scanned:
+            return
+        last_id = scanned[0][0], scanned[-1][0]
+        linked = set(
+            session.exec(
+                select(TokenTransfer.interaction_id).where(
+                    TokenTransfer.interaction_id >= last_id[0], TokenTransfer.interaction_id <= last_id[1]
+                )
+            ).all()
+        )
+        rows = [
+            r for r in scanned
+            if unlinked_until is None or r[5] > unlinked_until or r[0] in linked
+        ]
+        after_id = last_id[1]
+        ids = [r[0] for r in rows]
+        user_ids = [r[2] for r in rows]
+        wallets = _user_wallets(session, sorted(set(user_ids)))
+        owner = dict(zip(ids, user_ids))
+
+        # Net reward already paid per interaction: into the user's wallet counts
+        # positive, clawbacks out of it negative.
+        paid: Dict[int, float] = {}
+        transfers = session.exec(
+            select(TokenTransfer.interaction_id, TokenTransfer.from_wallet, TokenTransfer.to_wallet, TokenTransfer.amount)
+            .where(TokenTransfer.interaction_id >= last_id[0], TokenTransfer.interaction_id <= last_id[1])
+        ).all()
+        for iid, from_w, to_w, amount in transfers:
+            if iid not in owner:
+                continue
+            user_addr = wallets.get(owner[iid])
+            sign = 1.0 if to_w == user_addr else -1.0 if from_w == user_addr else 0.0
+            paid[iid] = paid.get(iid, 0.0) + sign * amount
+
+        chunk = (ids, [r[1] for r in rows], user_ids, [r[3] for r in rows], [r[4] for r in rows], paid)
+        yield last_id[1], len(scanned), chunk
+
+
+def _emit(session: Session, job_id: str, corrections: List[Correction]) -> Tuple[int, float, int]:
+    """Move tokens for one batch of corrections and record them; returns (applied, total, skipped)."""
+    masters = dict(
+        session.exec(
+            select(Wallet.owner_id, Wallet.address).where(
+                Wallet.owner_type == "company", Wallet.owner_id.in_({c[1] for c in corrections})
+            )
+        ).all()
+    )
+    users = _user_wallets(session, sorted({c[2] for c in corrections}))
+
+    applied, total, skipped = 0, 0.0, 0
+    emitted: List[TokenTransfer] = []
+    for interaction_id, company_id, user_id, action, delta in corrections:
+        master, user = masters.get(company_id), users.get(user_id)
+        if not master or not user:
+            skipped += 1
+            continue
+        if delta > 0:
+            src, dst, amount = master, user, delta
+            try:
+                txh = CHAIN.transfer(src, dst, amount)
+            except ValueError:
+                mint_recorded(session, src, amount, "mint:replay_topup")
+                txh = CHAIN.transfer(src, dst, amount)
+        else:
+            src, dst, amount = user, master, -delta
+            try:
+                txh = CHAIN.transfer(src, dst, amount)
+            except ValueError:
+                # the user already spent the over-paid reward
+                skipped += 1
+                continue
+        tx = TokenTransfer(
+            tx_hash=txh,
+            from_wallet=src,
+            to_wallet=dst,
+            amount=amount,
+            memo=f"replay:{job_id}:{action}",
+            interaction_id=interaction_id,
+        )
+        session.add(tx)
+        emitted.append(tx)
+        applied += 1
+        total += delta
+    session.flush()
+    events = [transfer_event(tx) for tx in emitted]
+    session.commit()
+    for event in events:
+        BUS.publish(event)
+    return applied, total, skipped
+
+
+def checkpoint(session: Session, company_id: Optional[int], job_id: str, dry_run: bool = False) -> Optional[ReplayCheckpoint]:
+    return session.exec(
+        select(ReplayCheckpoint).where(
+            ReplayCheckpoint.company_id == company_id,
+            ReplayCheckpoint.job_id == job_id,
+            ReplayCheckpoint.dry_run == dry_run,
+        )
+    ).first()
+
+
+def _new_checkpoint(session: Session, company_id: Optional[int], job_id: str, dry_run: bool) -> ReplayCheckpoint:
+    # a dry run previews what the job would still do, from where the job stands
+    real = checkpoint(session, company_id, job_id) if dry_run else None
+    return ReplayCheckpoint(
+        job_id=job_id, company_id=company_id, dry_run=dry_run, last_interaction_id=real.last_interaction_id if real else 0
+    )
+
+
+def run_replay(
+    session: Session,
+    job_id: str,
+    company_id: Optional[int] = None,
+    chunk_size: int = 5_000,
+    batch_size: int = 500,
+    workers: int = 1,
+    dry_run: bool = False,
+) -> ReplayCheckpoint:
+    """Recompute rewards for every interaction and pay or claw back the difference.
+
+    Interactions are scanned by id in chunks; the diff of each chunk is computed
+    in a process pool while the next chunks are read. Corrections are applied
+    in chunk order and the checkpoint is advanced after each chunk, so a job
+    restarted with the same ``job_id`` resumes where it stopped. Re-running a
+    chunk is harmless: corrections are linked to their interaction and count
+    as paid on the next pass. Interactions whose reward predates transfer
+    linking are counted in ``unlinked`` and not corrected (see
+    ``unlinked_before``). ``workers`` above 1 diffs in that many spawned
+    processes. A dry run keeps its own checkpoint and moves no tokens.
+    """
+    state = checkpoint(session, company_id, job_id, dry_run) or _new_checkpoint(session, company_id, job_id, dry_run)
+    if state.finished:
+        return state
+    state.error = None
+
+    rules_query = select(RewardRule).where(RewardRule.is_active == True)  # noqa: E712
+    if company_id is not None:
+        rules_query = rules_query.where(RewardRule.company_id == company_id)
+    table = compile_rules(session.exec(rules_query).all())
+    unlinked_until = unlinked_before(session, company_id)
+
+    # spawn, not fork: the server process runs background threads whose held locks a fork would copy
+    pool: Optional[Executor] = (
+        ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) if workers > 1 else None
+    )
+    pending: Deque[Tuple[int, int, int, Future | List[Correction]]] = deque()
+
+    def settle() -> None:
+        last_id, scanned, unlinked, result = pending.popleft()
+        corrections = result.result() if isinstance(result, Future) else result
+        if not dry_run:
+            for start in range(0, len(corrections), batch_size):
+                applied, total, skipped = _emit(session, job_id, corrections[start:start + batch_size])
+                state.corrections += applied
+                state.delta_total += total
+                state.skipped += skipped
+        else:
+            state.corrections += len(corrections)
+            state.delta_total += sum(c[4] for c in corrections)
+        state.last_interaction_id = last_id
+        state.scanned += scanned
+        state.unlinked += unlinked
+        state.updated_at = datetime.utcnow()
+        state.lease_until = state.updated_at + LEASE
+        session.add(state)
+        session.commit()
+
+    try:
+        for last_id, scanned, chunk in _read_chunks(
+            session, company_id, state.last_interaction_id, chunk_size, unlinked_until
+        ):
+            result = pool.submit(_diff_chunk, table, chunk) if pool else _diff_chunk(table, chunk)
+            pending.append((last_id, scanned, scanned - len(chunk[0]), result))
+            if len(pending) > 2 * workers:
+                settle()
+        while pending:
+            settle()
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+    state.finished = True
+    state.updated_at = datetime.utcnow()
+    state.lease_until = None
+    session.add(state)
+    session.commit()
+    session.refresh(state)
+    return state
+
+
+def _run_job(open_session: Callable[[], Session], job_id: str, company_id: Optional[int], dry_run: bool, **options) -> None:
+    with open_session() as session:
+        try:
+            run_replay(session, job_id, company_id=company_id, dry_run=dry_run, **options)
+        except Exception as exc:
+            log.exception("replay job %r of company %s failed", job_id, company_id)
+            session.rollback()
+            state = checkpoint(session, company_id, job_id, dry_run)
+            if state is not None:
+                state.error = str(exc) or type(exc).__name__
+                state.lease_until = None
+                session.add(state)
+                session.commit()
+
+
+def start_replay(
+    session: Session,
+    open_session: Callable[[], Session],
+    job_id: str,
+    company_id: Optional[int],
+    dry_run: bool = False,
+    **options,
+) -> Tuple[ReplayCheckpoint, Optional[threading.Thread]]:
+    """Start (or resume) a job in a background thread unless it is finished or already running.
+
+    The job is claimed by taking its lease in one UPDATE, so two requests (or
+    workers) never run it at once. The thread works in its own session from
+    ``open_session``. Re-posting a finished dry run starts a fresh preview.
+    Returns the checkpoint and the thread, if one was started.
+    """
+    state = checkpoint(session, company_id, job_id, dry_run)
+    if state is None:
+        session.add(_new_checkpoint(session, company_id, job_id, dry_run))
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()  # created by a concurrent request
+        state = checkpoint(session, company_id, job_id, dry_run)
+    if state.finished and dry_run:
+        fresh = _new_checkpoint(session, company_id, job_id, dry_run)
+        for field in ("last_interaction_id", "scanned", "corrections", "delta_total", "skipped", "unlinked", "finished", "error"):
+            setattr(state, field, getattr(fresh, field))
+        session.add(state)
+        session.commit()
+    if state.finished:
+        return state, None
+
+    now = datetime.utcnow()
+    claimed = session.execute(
+        update(ReplayCheckpoint)
+        .where(
+            ReplayCheckpoint.id == state.id,
+            ReplayCheckpoint.finished == False,  # noqa: E712
+            or_(ReplayCheckpoint.lease_until.is_(None), ReplayCheckpoint.lease_until < now),
+        )
+        .values(lease_until=now + LEASE, error=None)
+    ).rowcount
+    session.commit()
+    session.refresh(state)
+    if not claimed:
+        return state, None  # running elsewhere
+    thread = threading.Thread(
+        target=_run_job,
+        args=(open_session, job_id, company_id, dry_run),
+        kwargs=options,
+        name=f"replay-{company_id}-{job_id}",
+        daemon=True,
+    )
+    thread.start()
+    return state, thread
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+from app.models import RewardRule
+
+PER_AMOUNT_UNIT = 10_000.0
+
+Tiers = Tuple[Tuple[float, ...], Tuple[float, ...]]
+
+
+@lru_cache(maxsize=4096)
+def compile_tiers(tiers: Optional[str]) -> Tiers:
+    """Parse a rule's ``tiers`` JSON into (sorted breakpoints, rates) for bisect lookup."""
+    if not tiers:
+        return (), ()
+    bands = sorted((float(t["min_amount"]), float(t["rate"])) for t in json.loads(tiers))
+    return tuple(b for b, _ in bands), tuple(r for _, r in bands)
+
+
+def dump_tiers(bands: Optional[Iterable[Tuple[float, float]]]) -> Optional[str]:
+    """Serialize (min_amount, rate) bands sorted by threshold; raises ValueError on duplicates."""
+    if not bands:
+        return None
+    ordered = sorted((float(m), float(r)) for m, r in bands)
+    if len({m for m, _ in ordered}) != len(ordered):
+        raise ValueError("tier min_amount values must be unique")
+    return json.dumps([{"min_amount": m, "rate": r} for m, r in ordered])
+
+
+def rule_rate(rule: RewardRule, amount: float) -> float:
+    breakpoints, rates = compile_tiers(rule.tiers)
+    k = bisect_right(breakpoints, amount) - 1
+    return rates[k] if k >= 0 else rule.rate
+
+
+def rule_reward(rule: RewardRule, amount: Optional[float]) -> float:
+    """Reward a single rule grants for one event.
+
+    ``min_amount`` gates the rule, the highest tier whose ``min_amount`` the
+    amount reaches replaces ``rate``, and ``max_reward`` caps the result.
+    """
+    amt = amount or 0.0
+    if rule.min_amount is not None and amt < rule.min_amount:
+        return 0.0
+    rate = rule_rate(rule, amt)
+    if rule.mode == "per_amount":
+        reward = (amount / PER_AMOUNT_UNIT) * rate if amount and amount > 0 else 0.0
+    else:
+        reward = rate
+    if rule.max_reward is not None:
+        reward = min(reward, rule.max_reward)
+    return reward
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional, Tuple
+
+from app.config import RISK_MAX_KEYS, RISK_THRESHOLD
+from app.models import Interaction
+
+# Streaming velocity features for live risk scoring. Every interaction (API or
+# contract event) is added to per-user and per-device sliding windows kept in
+# fixed-size ring buffers; the score is a noisy-OR of how far the current event
+# pushes each feature past its limit. State is per process and bounded to
+# RISK_MAX_KEYS users/devices (least recently seen are evicted), so a restart
+# or another worker starts from empty windows.
+
+SLOTS = 60  # buckets per window
+
+
+@dataclass(frozen=True)
+class Signal:
+    weight: float  # probability contributed at (or beyond) the limit
+    limit: float
+
+
+# With RISK_THRESHOLD at 0.8, user velocity alone flags once both of its windows
+# are at their limit (1 - 0.3 * 0.6 = 0.82); one window alone, or any single
+# other signal, only raises the score.
+SIGNALS: Dict[str, Signal] = {
+    "user_per_minute": Signal(weight=0.7, limit=10),
+    "user_per_hour": Signal(weight=0.4, limit=120),
+    "device_per_minute": Signal(weight=0.6, limit=20),
+    "amount_spike": Signal(weight=0.5, limit=10),  # amount vs. the user's mean over the last hour
+}
+
+
+class RingWindow:
+    """Event count and amount sum over the last ``span`` seconds, in SLOTS buckets."""
+
+    __slots__ = ("width", "stamps", "counts", "sums")
+
+    def __init__(self, span: float) -> None:
+        self.width = span / SLOTS
+        self.stamps = [-1] * SLOTS
+        self.counts = [0] * SLOTS
+        self.sums = [0.0] * SLOTS
+
+    def add(self, now: float, amount: float) -> None:
+        tick = int(now // self.width)
+        pos = tick % SLOTS
+        if self.stamps[pos] != tick:
+            self.stamps[pos] = tick
+            self.counts[pos] = 0
+            self.sums[pos] = 0.0
+        self.counts[pos] += 1
+        self.sums[pos] += amount
+
+    def totals(self, now: float) -> Tuple[int, float]:
+        oldest = int(now // self.width) - SLOTS
+        count, total = 0, 0.0
+        for stamp, c, s in zip(self.stamps, self.counts, self.sums):
+            if stamp > oldest:
+                count += c
+                total += s
+        return count, total
+
+
+class Velocity:
+    __slots__ = ("minute", "hour")
+
+    def __init__(self) -> None:
+        self.minute = RingWindow(60)
+        self.hour = RingWindow(3600)
+
+    def add(self, now: float, amount: float) -> None:
+        self.minute.add(now, amount)
+        self.hour.add(now, amount)
+
+
+@dataclass
+class Assessment:
+    score: float
+    flagged: bool
+    features: Dict[str, float]
+
+
+class FeatureStore:
+    def __init__(self, max_keys: int = RISK_MAX_KEYS) -> None:
+        self.max_keys = max_keys
+        self._keys: "OrderedDict[Hashable, Velocity]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _velocity(self, key: Hashable) -> Velocity:
+        v = self._keys.get(key)
+        if v is None:
+            v = self._keys[key] = Velocity()
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(key)
+        return v
+
+    def assess(
+        self,
+        company_id: int,
+        user_id: int,
+        amount: Optional[float],
+        device_id: Optional[str] = None,
+        now: Optional[float] = None,
+    ) -> Assessment:
+        """Add the event to its windows and score it, the event itself included."""
+        now = time.time() if now is None else now
+        amount = amount or 0.0
+        with self._lock:
+            user = self._velocity(("user", company_id, user_id))
+            prior_count, prior_sum = user.hour.totals(now)
+            user.add(now, amount)
+            features = {
+                "user_per_minute": float(user.minute.totals(now)[0]),
+                "user_per_hour": float(prior_count + 1),
+                "amount_spike": amount * prior_count / prior_sum if prior_count >= 3 and prior_sum > 0 else 0.0,
+            }
+            if device_id:
+                device = self._velocity(("device", device_id))
+                device.add(now, amount)
+                features["device_per_minute"] = float(device.minute.totals(now)[0])
+        return score(features)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._keys.clear()
+
+
+def score(features: Dict[str, float]) -> Assessment:
+    clean = 1.0
+    for name, value in features.items():
+        signal = SIGNALS[name]
+        clean *= 1.0 - signal.weight * min(1.0, value / signal.limit)
+    risk = round(1.0 - clean, 4)
+    return Assessment(score=risk, flagged=risk >= RISK_THRESHOLD, features=features)
+
+
+FEATURES = FeatureStore()
+
+
+def score_interaction(it: Interaction, device_id: Optional[str] = None) -> Assessment:
+    """Set ``risk_score`` and ``fraud_detected`` on a new interaction before it is written."""
+    assessment = FEATURES.assess(it.company_id, it.user_id, it.amount, device_id)
+    it.risk_score = assessment.score
+    it.fraud_detected = assessment.flagged
+    return assessment
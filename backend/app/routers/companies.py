@@ -1,16 +1,22 @@
 from __future__ import annotations
 
+import json
 import secrets
+from datetime import date
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 
 from app.auth import AuthedCompany, require_company
-from app.db import get_session
+from app.db import get_read_session, get_session, session_for_company
 from app.models import Company, Wallet, User, Interaction, RewardRule, SmartContract, TokenTransfer
+from app.partitions import purge_company_archives
+from app.responses import FastJSONResponse
 from app.schemas import CompanySignupIn, CompanySignupOut, CompanyOut, CompanyUpdateIn, WalletOut
 from app.services import create_master_wallet_with_funds
-from app.mock_data import SOVICO_COMPANIES
+from app.sketches import default_range, percentiles, unique_users
 from app.blockchain import CHAIN
 
 router = APIRouter()
@@ -18,7 +24,6 @@ router = APIRouter()
 
 @router.post("/signup", response_model=CompanySignupOut)
 def company_signup(payload: CompanySignupIn, session: Session = Depends(get_session)) -> CompanySignupOut:
-    import json
     from datetime import datetime
     
     api_key = "sk_" + secrets.token_urlsafe(24)
@@ -48,7 +53,9 @@ def company_signup(payload: CompanySignupIn, session: Session = Depends(get_sess
     session.commit()
     session.refresh(company)
 
-    create_master_wallet_with_funds(session, company)
+    # the wallet belongs in the new company's shard when sharding is on
+    with session_for_company(company.id) as shard:
+        create_master_wallet_with_funds(shard, company)
     return CompanySignupOut(company_id=company.id, api_key=api_key)
 
 
@@ -72,6 +79,9 @@ def delete_company(company_id: int, auth: AuthedCompany = Depends(require_compan
     company = session.get(Company, company_id)
     if not company:
         raise HTTPException(404, "Company not found")
+
+    # Archived interactions first, before this session takes the write lock
+    purge_company_archives(session.get_bind(Interaction), company_id)
     
     # Get all wallets for this company
     company_wallets = session.exec(
@@ -137,18 +147,64 @@ def delete_company(company_id: int, auth: AuthedCompany = Depends(require_compan
     return {"message": f"Company '{company.name}' and all associated data deleted successfully"}
 
 
+# company id -> (raw supported_actions, raw service_categories, decoded lists);
+# an entry is reused only while the stored JSON is unchanged, so an update
+# (from any worker) invalidates it implicitly.
+_DECODED_LISTS: Dict[int, Tuple[Optional[str], Optional[str], Optional[List[str]], Optional[List[str]]]] = {}
+
+
+def _decoded_lists(company: Company) -> Tuple[Optional[List[str]], Optional[List[str]]]:
+    cached = _DECODED_LISTS.get(company.id)
+    if cached and cached[0] == company.supported_actions and cached[1] == company.service_categories:
+        return cached[2], cached[3]
+    supported_actions = json.loads(company.supported_actions) if company.supported_actions else None
+    service_categories = json.loads(company.service_categories) if company.service_categories else None
+    _DECODED_LISTS[company.id] = (company.supported_actions, company.service_categories, supported_actions, service_categories)
+    return supported_actions, service_categories
+
+
+def _company_payload(company: Company) -> dict:
+    """CompanyOut-shaped dict, ready for FastJSONResponse."""
+    supported_actions, service_categories = _decoded_lists(company)
+    return {
+        "id": company.id,
+        "name": company.name,
+        "description": company.description,
+        "sector": company.sector,
+        "website": company.website,
+        "phone": company.phone,
+        "email": company.email,
+        "address": company.address,
+        "business_license": company.business_license,
+        "tax_code": company.tax_code,
+        "supported_actions": supported_actions,
+        "service_categories": service_categories,
+        "is_active": company.is_active,
+        "tier": company.tier,
+        "created_at": company.created_at,
+        "updated_at": company.updated_at,
+    }
+
+
+@lru_cache(maxsize=None)
+def _mock_rules(company_name: str) -> Dict[str, Dict[str, Any]]:
+    """Rule notes/units from mock_data, imported on first use only."""
+    from app.mock_data import SOVICO_COMPANIES
+
+    mock_company = next((c for c in SOVICO_COMPANIES if c["name"] == company_name), None)
+    return {r["action"]: r for r in (mock_company["rules"] if mock_company else [])}
+
+
 def _build_company_services(session: Session, company: Company):
-    import json
     # Parse supported actions from company profile
-    supported_actions = json.loads(company.supported_actions) if company.supported_actions else []
+    supported_actions = _decoded_lists(company)[0] or []
 
     # Load reward rules and smart contracts as service definitions
     rules = session.exec(select(RewardRule).where(RewardRule.company_id == company.id, RewardRule.is_active == True)).all()
     contracts = session.exec(select(SmartContract).where(SmartContract.company_id == company.id, SmartContract.is_active == True)).all()
 
     # Try to enrich with mock_data rule notes/units
-    mock_company = next((c for c in SOVICO_COMPANIES if c["name"] == company.name), None)
-    mock_rules = {r["action"]: r for r in (mock_company["rules"] if mock_company else [])}
+    mock_rules = _mock_rules(company.name)
 
     services = []
     for r in rules:
@@ -158,6 +214,9 @@ def _build_company_services(session: Session, company: Company):
             "action": r.action,
             "mode": r.mode,
             "rate": r.rate,
+            "min_amount": r.min_amount,
+            "max_reward": r.max_reward,
+            "tiers": json.loads(r.tiers) if r.tiers else None,
             "unit": extra.get("unit"),
             "notes": extra.get("notes"),
             "is_active": r.is_active,
@@ -184,60 +243,73 @@ def _build_company_services(session: Session, company: Company):
     }
 
 
-@router.get("/services")
-def list_my_services(auth: AuthedCompany = Depends(require_company), session: Session = Depends(get_session)):
+@router.get("/services", response_class=FastJSONResponse)
+def list_my_services(auth: AuthedCompany = Depends(require_company), session: Session = Depends(get_read_session)):
     company = session.get(Company, auth.id)
     if not company:
         raise HTTPException(404, "Company not found")
-    return _build_company_services(session, company)
+    return FastJSONResponse(_build_company_services(session, company))
 
 
-@router.get("/{company_id}/services")
-def list_company_services(company_id: int, session: Session = Depends(get_session)):
+@router.get("/{company_id}/services", response_class=FastJSONResponse)
+def list_company_services(company_id: int, session: Session = Depends(get_read_session)):
     company = session.get(Company, company_id)
     if not company:
         raise HTTPException(404, "Company not found")
-    return _build_company_services(session, company)
+    return FastJSONResponse(_build_company_services(session, company))
 
 
-@router.get("/profile", response_model=CompanyOut)
-def get_company_profile(auth: AuthedCompany = Depends(require_company), session: Session = Depends(get_session)) -> CompanyOut:
+@router.get("/audience", response_class=FastJSONResponse)
+def get_company_audience(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    action: Optional[str] = None,
+    by: Optional[str] = None,
+    auth: AuthedCompany = Depends(require_company),
+    session: Session = Depends(get_read_session),
+):
+    """Approximate distinct users over [start, end] (default: the last 30 days); by=day|action adds a breakdown"""
+    start, end = default_range(start, end)
+    return FastJSONResponse(unique_users([session], [auth.id], start, end, action, by))
+
+
+@router.get("/percentiles", response_class=FastJSONResponse)
+def get_company_percentiles(
+    metric: str = "amount",
+    q: str = "0.5,0.9,0.99",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    action: Optional[str] = None,
+    auth: AuthedCompany = Depends(require_company),
+    session: Session = Depends(get_read_session),
+):
+    """Percentiles of interaction amount or reward size over [start, end] (default: the last 30 days)"""
+    if metric not in ("amount", "reward"):
+        raise HTTPException(400, "metric must be amount or reward")
+    try:
+        qs = [float(x) for x in q.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(400, "q must be comma-separated fractions, e.g. 0.5,0.9,0.99")
+    if not qs or any(not 0 <= x <= 1 for x in qs):
+        raise HTTPException(400, "q must be comma-separated fractions, e.g. 0.5,0.9,0.99")
+    start, end = default_range(start, end)
+    return FastJSONResponse(percentiles(session, auth.id, metric, start, end, qs, action))
+
+
+@router.get("/profile", response_model=CompanyOut, response_class=FastJSONResponse)
+def get_company_profile(auth: AuthedCompany = Depends(require_company), session: Session = Depends(get_read_session)):
     company = session.get(Company, auth.id)
     if not company:
         raise HTTPException(404, "Company not found")
-    
-    # Parse JSON strings back to lists
-    import json
-    supported_actions = json.loads(company.supported_actions) if company.supported_actions else None
-    service_categories = json.loads(company.service_categories) if company.service_categories else None
-    
-    return CompanyOut(
-        id=company.id,
-        name=company.name,
-        description=company.description,
-        sector=company.sector,
-        website=company.website,
-        phone=company.phone,
-        email=company.email,
-        address=company.address,
-        business_license=company.business_license,
-        tax_code=company.tax_code,
-        supported_actions=supported_actions,
-        service_categories=service_categories,
-        is_active=company.is_active,
-        tier=company.tier,
-        created_at=company.created_at,
-        updated_at=company.updated_at
-    )
+    return FastJSONResponse(_company_payload(company))
 
 
-@router.put("/profile", response_model=CompanyOut)
+@router.put("/profile", response_model=CompanyOut, response_class=FastJSONResponse)
 def update_company_profile(
     payload: CompanyUpdateIn, 
     auth: AuthedCompany = Depends(require_company), 
     session: Session = Depends(get_session)
-) -> CompanyOut:
-    import json
+):
     from datetime import datetime
     
     company = session.get(Company, auth.id)
@@ -277,26 +349,6 @@ def update_company_profile(
     session.add(company)
     session.commit()
     session.refresh(company)
-    
-    # Parse JSON strings back to lists for response
-    supported_actions = json.loads(company.supported_actions) if company.supported_actions else None
-    service_categories = json.loads(company.service_categories) if company.service_categories else None
-    
-    return CompanyOut(
-        id=company.id,
-        name=company.name,
-        description=company.description,
-        sector=company.sector,
-        website=company.website,
-        phone=company.phone,
-        email=company.email,
-        address=company.address,
-        business_license=company.business_license,
-        tax_code=company.tax_code,
-        supported_actions=supported_actions,
-        service_categories=service_categories,
-        is_active=company.is_active,
-        tier=company.tier,
-        created_at=company.created_at,
-        updated_at=company.updated_at
-    )
+    _DECODED_LISTS.pop(company.id, None)
+
+    return FastJSONResponse(_company_payload(company))
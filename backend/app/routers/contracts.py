@@ -7,8 +7,11 @@ from fastapi import APIRouter, Depends, Header, HTTPException
 from sqlmodel import Session, select
 
 from app.auth import AuthedCompany, require_company
+from app.config import RISK_HOLD
 from app.db import get_session
 from app.models import Interaction, RewardRule, SmartContract
+from app.outbox import enqueue
+from app.risk import score_interaction
 from app.schemas import ContractCreateIn, ContractEventIn, ContractOut, InteractionOut
 from app.services import apply_reward, user_check_company
 
@@ -80,12 +83,18 @@ def fire_contract_event(
         amount=payload.amount,
         meta=payload.meta,
     )
+    assessment = score_interaction(it, payload.device_id)
     session.add(it)
+    if assessment.flagged and RISK_HOLD:
+        session.flush()
+        enqueue(session, it, "held")
+        session.commit()
+        return InteractionOut(id=it.id, reward_status="held", risk_score=assessment.score)
     session.commit()
     session.refresh(it)
 
-    reward = apply_reward(session, auth.id, user.id, c.action, payload.amount)
-    return InteractionOut(id=it.id, reward_tokens=reward)
+    reward = apply_reward(session, auth.id, user.id, c.action, payload.amount, interaction_id=it.id)
+    return InteractionOut(id=it.id, reward_tokens=reward, risk_score=assessment.score)
 
 
 @router.post("/{cid}/toggle")
@@ -1,17 +1,31 @@
 from __future__ import annotations
 
 import json
+import os
+from contextlib import ExitStack
 import secrets
 import random
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from sqlalchemy import text
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, func, select
 
 from app.blockchain import CHAIN
-from app.db import get_session
-from app.models import Company, RewardRule, TokenTransfer, User, Wallet, Interaction
+from app.db import all_engines, engine, get_read_session, get_session, reader_for
+from app.events import BUS, transfer_event
+from app.migrations import migrate, schema_version
+from app.models import Block, Company, ReconcileState, RewardOutbox, RewardRule, TokenTransfer, User, Wallet, Interaction
+from app.partitions import archive_closed_months, archive_path, archive_root, archived_months, drop_archives, scan
+from app.responses import FastJSONResponse, dumps
+from app.reconcile import divergent_wallets, reset_reconcile, run_reconcile
+from app.rewards import rule_reward
+from app.network import graph_for, reset_network
+from app.risk import FEATURES
+from app.sketches import default_range, fold_sketches, reset_sketches, unique_users
+from app.services import company_name_map, mint_recorded
+from app.timeline import user_timeline
 from app.mock_data import (
     SOVICO_COMPANIES,
     CUSTOMER_DATA,
@@ -40,7 +54,7 @@ def dev_seed(session: Session = Depends(get_session)):
     mw = Wallet(owner_type="company", owner_id=c.id, address=f"w_{secrets.token_hex(8)}")
     session.add(mw)
     session.commit()
-    CHAIN.mint(mw.address, 500_000)
+    mint_recorded(session, mw.address, 500_000, "mint:master_funding")
 
     r = RewardRule(company_id=c.id, action="purchase", rate=2.0, mode="per_amount")
     session.add(r)
@@ -61,13 +75,12 @@ def dev_seed(session: Session = Depends(get_session)):
 @router.post("/reset")
 def reset_all_data(session: Session = Depends(get_session)):
     """Reset all data - delete all companies, users, wallets, transactions, and rules"""
-    # Ensure schema is up to date to avoid errors when selecting newer columns
-    migrate_schema(session)
-    
     # Delete all data in correct order to avoid foreign key constraints
     # First get all records to delete
     transfers = session.exec(select(TokenTransfer)).all()
+    blocks = session.exec(select(Block)).all()
     interactions = session.exec(select(Interaction)).all()
+    outbox = session.exec(select(RewardOutbox)).all()
     rules = session.exec(select(RewardRule)).all()
     wallets = session.exec(select(Wallet)).all()
     users = session.exec(select(User)).all()
@@ -76,8 +89,15 @@ def reset_all_data(session: Session = Depends(get_session)):
     # Delete all records
     for transfer in transfers:
         session.delete(transfer)
+    for block in blocks:
+        session.delete(block)
+    reset_reconcile(session)
+    reset_sketches(session)
+    reset_network(session)
     for interaction in interactions:
         session.delete(interaction)
+    for row in outbox:
+        session.delete(row)
     for rule in rules:
         session.delete(rule)
     for wallet in wallets:
@@ -89,74 +109,88 @@ def reset_all_data(session: Session = Depends(get_session)):
     
     # Clear blockchain state
     CHAIN.reset()
+    FEATURES.reset()
     
     session.commit()
+    drop_archives(archive_root(engine))
     
     return {"message": "All data reset successfully"}
 
 
 @router.post("/migrate")
-def migrate_schema(session: Session = Depends(get_session)):
-    """Add missing columns to existing SQLite tables to match current models."""
-    added: dict[str, list[str]] = {"company": [], "interaction": []}
-
-    # COMPANY TABLE MIGRATION
-    company_cols = {row[1] for row in session.exec(text("PRAGMA table_info('company')")).all()}
-    company_required = {
-        "description": "TEXT",
-        "sector": "TEXT",
-        "website": "TEXT",
-        "phone": "TEXT",
-        "email": "TEXT",
-        "address": "TEXT",
-        "business_license": "TEXT",
-        "tax_code": "TEXT",
-        "supported_actions": "TEXT",
-        "service_categories": "TEXT",
-        "is_active": "INTEGER DEFAULT 1",
-        "tier": "TEXT",
-        "updated_at": "DATETIME",
-    }
-    for col, type_clause in company_required.items():
-        if col not in company_cols:
-            session.exec(text(f"ALTER TABLE company ADD COLUMN {col} {type_clause}"))
-            added["company"].append(col)
-
-    # INTERACTION TABLE MIGRATION
-    try:
-        interaction_cols = {row[1] for row in session.exec(text("PRAGMA table_info('interaction')")).all()}
-    except Exception:
-        interaction_cols = set()
-    interaction_required = {
-        "transaction_type": "TEXT",
-        "status": "TEXT",
-        "location": "TEXT",
-        "device_type": "TEXT",
-        "payment_method": "TEXT",
-        "currency": "TEXT",
-        "exchange_rate": "REAL",
-        "discount_applied": "REAL",
-        "tax_amount": "REAL",
-        "commission_rate": "REAL",
-        "risk_score": "REAL",
-        "fraud_detected": "INTEGER",
-        "updated_at": "DATETIME",
+def migrate_schema():
+    """Apply any pending versioned migrations (normally done once at startup)."""
+    applied = migrate(engine)
+    return {"message": "Migration completed", "applied": applied, "schema_version": schema_version(engine)}
+
+
+@router.get("/partitions")
+def list_partitions(session: Session = Depends(get_read_session)):
+    """Hot interaction rows by month and the archived months on disk"""
+    hot = session.exec(
+        select(func.strftime("%Y-%m", Interaction.created_at), func.count()).group_by(
+            func.strftime("%Y-%m", Interaction.created_at)
+        )
+    ).all()
+    root = archive_root(engine)
+    return {
+        "hot": [{"month": month, "rows": rows} for month, rows in hot],
+        "archives": [
+            {"month": f"{y:04d}-{m:02d}", "path": archive_path((y, m), root), "bytes": os.path.getsize(archive_path((y, m), root))}
+            for y, m in archived_months(root)
+        ],
     }
-    for col, type_clause in interaction_required.items():
-        if col not in interaction_cols:
-            session.exec(text(f"ALTER TABLE interaction ADD COLUMN {col} {type_clause}"))
-            added["interaction"].append(col)
 
-    session.commit()
-    return {"message": "Migration completed", "added_columns": added}
+
+@router.post("/partitions/archive")
+def archive_partitions():
+    """Move closed months out of the hot interaction table (also runs at startup)"""
+    return {"archived": archive_closed_months(engine)}
+
+
+@router.post("/reconcile")
+def reconcile_ledger(full: bool = False, session: Session = Depends(get_session)):
+    """Fold new TokenTransfer rows into per-wallet sums and report wallets whose chain balance differs"""
+    return FastJSONResponse(run_reconcile(session, full=full))
+
+
+@router.get("/reconcile")
+def reconcile_status(session: Session = Depends(get_read_session)):
+    """Wallets that diverged at the last reconciliation run"""
+    state = session.get(ReconcileState, 1)
+    return FastJSONResponse({
+        "last_transfer_id": state.last_transfer_id if state else 0,
+        "runs": state.runs if state else 0,
+        "updated_at": state.updated_at if state else None,
+        "divergent": divergent_wallets(session),
+    })
+
+
+@router.post("/sketches")
+def fold_interaction_sketches(session: Session = Depends(get_session)):
+    """Fold new interactions into the per-company/action/day sketches now (also runs in the background)"""
+    return fold_sketches(session)
+
+
+@router.get("/audience", response_class=FastJSONResponse)
+def ecosystem_audience(
+    company_ids: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    action: Optional[str] = None,
+    by: Optional[str] = None,
+):
+    """Approximate distinct users across companies (comma-separated ids, default all); customers are matched by email"""
+    ids = [int(x) for x in company_ids.split(",") if x.strip()] if company_ids else None
+    start, end = default_range(start, end)
+    with ExitStack() as stack:
+        sessions = [stack.enter_context(Session(reader_for(target))) for target in all_engines()]
+        return FastJSONResponse(unique_users(sessions, ids, start, end, action, by))
 
 
 @router.post("/seed_sovico")
 def seed_sovico_data(session: Session = Depends(get_session)):
     """Generate comprehensive Sovico ecosystem mock data with 4 companies, 20 customers, and full transaction history"""
-    # Ensure DB schema is up to date before seeding
-    migrate_schema(session)
-    
     # Clear existing data
     session.exec(select(TokenTransfer)).all()
     session.exec(select(Interaction)).all()
@@ -213,7 +247,7 @@ def seed_sovico_data(session: Session = Depends(get_session)):
         )
         session.add(master_wallet)
         session.commit()
-        CHAIN.mint(master_wallet.address, random.randint(1000000, 5000000))
+        mint_recorded(session, master_wallet.address, random.randint(1000000, 5000000), "mint:master_funding")
         all_wallets.append(master_wallet)
         
         # Create reward rules
@@ -223,6 +257,8 @@ def seed_sovico_data(session: Session = Depends(get_session)):
                 action=rule_data["action"],
                 rate=rule_data["rate"],
                 mode=rule_data["mode"],
+                min_amount=rule_data.get("min_amount"),
+                max_reward=rule_data.get("max_reward"),
                 is_active=True,
                 created_at=random_date_in_range(60)
             )
@@ -257,7 +293,7 @@ def seed_sovico_data(session: Session = Depends(get_session)):
         
         # Give user some initial SOV tokens
         initial_balance = random.randint(10000, 100000)
-        CHAIN.mint(user_wallet.address, initial_balance)
+        mint_recorded(session, user_wallet.address, initial_balance, "mint:welcome_balance")
         all_wallets.append(user_wallet)
     
     # Generate transaction history (last 30 days)
@@ -318,12 +354,7 @@ def seed_sovico_data(session: Session = Depends(get_session)):
         interactions.append(interaction)
         
         # Calculate reward
-        reward = 0
-        if rule:
-            if rule.mode == "per_amount":
-                reward = (amount / 10000.0) * rule.rate
-            else:  # flat
-                reward = rule.rate
+        reward = rule_reward(rule, amount) if rule else 0
         
         # Create transfer if there's a reward
         if reward > 0:
@@ -335,6 +366,7 @@ def seed_sovico_data(session: Session = Depends(get_session)):
                     to_wallet=user_wallet.address,
                     amount=reward,
                     memo=build_transfer_memo("reward", {"company": company.name, "action": rule.action if rule else None, "amount_sov": reward}),
+                    interaction_id=interaction.id,
                     created_at=interaction.created_at
                 )
                 session.add(transfer)
@@ -342,7 +374,7 @@ def seed_sovico_data(session: Session = Depends(get_session)):
                 transfers.append(transfer)
             except Exception:
                 # If transfer fails, mint more to master wallet
-                CHAIN.mint(master_wallet.address, reward)
+                mint_recorded(session, master_wallet.address, reward, "mint:reward_topup")
                 tx_hash = CHAIN.transfer(master_wallet.address, user_wallet.address, reward)
                 transfer = TokenTransfer(
                     tx_hash=tx_hash,
@@ -350,6 +382,7 @@ def seed_sovico_data(session: Session = Depends(get_session)):
                     to_wallet=user_wallet.address,
                     amount=reward,
                     memo=build_transfer_memo("reward", {"company": company.name, "action": rule.action if rule else None, "amount_sov": reward}),
+                    interaction_id=interaction.id,
                     created_at=interaction.created_at
                 )
                 session.add(transfer)
@@ -418,7 +451,7 @@ def seed_sovico_data(session: Session = Depends(get_session)):
             transfers.append(transfer)
         except Exception:
             # If user doesn't have enough, mint some tokens
-            CHAIN.mint(user_wallet.address, payment_amount)
+            mint_recorded(session, user_wallet.address, payment_amount, "mint:payment_topup")
             tx_hash = CHAIN.transfer(user_wallet.address, master_wallet.address, payment_amount)
             transfer = TokenTransfer(
                 tx_hash=tx_hash,
@@ -450,43 +483,124 @@ def seed_sovico_data(session: Session = Depends(get_session)):
     }
 
 
-@router.get("/companies")
-def dev_list_companies(session: Session = Depends(get_session)):
-    try:
-        rows = session.exec(select(Company)).all()
-    except Exception as exc:  # auto-migrate on schema mismatch, then retry once
-        msg = str(exc)
-        if "no such column" in msg and "company." in msg:
-            migrate_schema(session)
-            rows = session.exec(select(Company)).all()
-        else:
-            raise
-    return [ {"id": c.id, "name": c.name, "api_key": c.api_key, "created_at": c.created_at} for c in rows ]
-
-
-@router.get("/wallets")
-def dev_list_wallets(session: Session = Depends(get_session)):
-    rows = session.exec(select(Wallet)).all()
-    return [ {"id": w.id, "owner_type": w.owner_type, "owner_id": w.owner_id, "address": w.address, "balance": CHAIN.balance_of(w.address)} for w in rows ]
-
-
-@router.get("/transfers")
-def dev_list_transfers(limit: int = 50, session: Session = Depends(get_session)):
-    rows = session.exec(select(TokenTransfer).order_by(TokenTransfer.created_at.desc())).all()
-    rows = rows[:limit]
-    return [ {"id": t.id, "tx_hash": t.tx_hash, "from_wallet": t.from_wallet, "to_wallet": t.to_wallet, "amount": t.amount, "memo": t.memo, "created_at": t.created_at} for t in rows ]
-
-
-@router.get("/users/{user_id}/transactions")
-def get_user_transactions(user_id: int, limit: int = 20, session: Session = Depends(get_session)):
+@router.get("/companies", response_class=FastJSONResponse)
+def dev_list_companies(session: Session = Depends(get_read_session)):
+    rows = session.exec(select(Company)).all()
+    return FastJSONResponse([ {"id": c.id, "name": c.name, "api_key": c.api_key, "created_at": c.created_at} for c in rows ])
+
+
+@router.get("/wallets", response_class=FastJSONResponse)
+def dev_list_wallets(session: Session = Depends(get_read_session)):
+    rows = session.exec(select(Wallet.id, Wallet.owner_type, Wallet.owner_id, Wallet.address)).all()
+    return FastJSONResponse([ {"id": i, "owner_type": t, "owner_id": o, "address": a, "balance": CHAIN.balance_of(a)} for i, t, o, a in rows ])
+
+
+def _ranked_wallets(session: Session, holders: list, first_rank: int) -> list:
+    owners = {
+        w.address: w
+        for w in session.exec(select(Wallet).where(Wallet.address.in_([a for a, _ in holders]))).all()
+    } if holders else {}
+    return [
+        {
+            "rank": first_rank + i,
+            "address": addr,
+            "balance": balance,
+            "owner_type": owners[addr].owner_type if addr in owners else None,
+            "owner_id": owners[addr].owner_id if addr in owners else None,
+        }
+        for i, (addr, balance) in enumerate(holders)
+    ]
+
+
+@router.get("/wallets/top", response_class=FastJSONResponse)
+def dev_top_wallets(limit: int = 20, offset: int = 0, session: Session = Depends(get_read_session)):
+    """Richest wallets first, served from the chain's balance index."""
+    limit = max(1, min(limit, 1000))
+    offset = max(0, offset)
+    holders = CHAIN.top(limit, offset)
+    return FastJSONResponse({
+        "total": CHAIN.holder_count(),
+        "offset": offset,
+        "wallets": _ranked_wallets(session, holders, offset + 1),
+    })
+
+
+@router.get("/wallets/{address}/rank", response_class=FastJSONResponse)
+def dev_wallet_rank(address: str, session: Session = Depends(get_read_session)):
+    rank = CHAIN.rank_of(address)
+    if rank is None:
+        raise HTTPException(404, "Wallet not found on chain")
+    return FastJSONResponse({
+        "total": CHAIN.holder_count(),
+        **_ranked_wallets(session, [(address, CHAIN.balance_of(address))], rank)[0],
+    })
+
+
+@router.get("/network", response_class=FastJSONResponse)
+def dev_network(top_k: Optional[int] = None, weight: str = "interactions", session: Session = Depends(get_read_session)):
+    """Company-user graph with interaction and token weights; top_k keeps each company's heaviest edges"""
+    if weight not in ("interactions", "tokens"):
+        raise HTTPException(400, "weight must be interactions or tokens")
+    return FastJSONResponse(graph_for(session).view(session, max(1, top_k) if top_k else None, weight))
+
+
+@router.get("/transfers", response_class=FastJSONResponse)
+def dev_list_transfers(limit: int = 50, session: Session = Depends(get_read_session)):
+    rows = session.exec(select(TokenTransfer).order_by(TokenTransfer.created_at.desc()).limit(limit)).all()
+    return FastJSONResponse([ {"id": t.id, "tx_hash": t.tx_hash, "from_wallet": t.from_wallet, "to_wallet": t.to_wallet, "amount": t.amount, "memo": t.memo, "created_at": t.created_at} for t in rows ])
+
+
+@router.get("/stream/transfers")
+async def dev_stream_transfers(request: Request, heartbeat: float = 15.0):
+    """Server-sent events: one `transfer` event per TokenTransfer with the new balances of both wallets.
+
+    A client that falls more than ATHENA_STREAM_BUFFER events behind gets a
+    `lagged` event with the number of dropped events and should reload
+    /dev/wallets and /dev/transfers once.
+    """
+    sub = BUS.subscribe()
+
+    async def events():
+        try:
+            yield b"retry: 2000\n\n"
+            while not await request.is_disconnected():
+                batch, dropped = await sub.drain(heartbeat)
+                if not batch:
+                    yield b": keep-alive\n\n"
+                    continue
+                if dropped:
+                    yield b"event: lagged\ndata: " + dumps({"dropped": dropped}) + b"\n\n"
+                for event in batch:
+                    yield b"event: " + event["type"].encode() + b"\ndata: " + dumps(event) + b"\n\n"
+        finally:
+            BUS.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/users/{user_id}/timeline", response_class=FastJSONResponse)
+def dev_user_timeline(user_id: int, limit: int = 20, cursor: Optional[str] = None, session: Session = Depends(get_read_session)):
+    """Interactions and transfers merged newest first; pass next_cursor back for the next page"""
+    return FastJSONResponse(user_timeline(session, user_id, max(1, min(limit, 200)), cursor))
+
+
+@router.get("/users/{user_id}/transactions", response_class=FastJSONResponse)
+def get_user_transactions(user_id: int, limit: int = 20, session: Session = Depends(get_read_session)):
     """Get detailed transaction history for a specific user"""
     # Get user's interactions with enhanced details
-    interactions = session.exec(
-        select(Interaction)
-        .where(Interaction.user_id == user_id)
-        .order_by(Interaction.created_at.desc())
-        .limit(limit)
-    ).all()
+    interactions = list(
+        scan(
+            session,
+            select(Interaction).where(Interaction.user_id == user_id).order_by(Interaction.created_at.desc()).limit(limit),
+            key=lambda it: it.created_at,
+            reverse=True,
+            limit=limit,
+        )
+    )
     
     # Get user's token transfers
     user_wallets = session.exec(
@@ -504,11 +618,10 @@ def get_user_transactions(user_id: int, limit: int = 20, session: Session = Depe
         .limit(limit)
     ).all()
     
-    # Get company names for context
-    companies = session.exec(select(Company)).all()
-    company_map = {c.id: c.name for c in companies}
+    # Names of the companies on this page only
+    company_map = company_name_map(session, {i.company_id for i in interactions})
     
-    return {
+    return FastJSONResponse({
         "user_id": user_id,
         "interactions": [
             {
@@ -543,7 +656,7 @@ def get_user_transactions(user_id: int, limit: int = 20, session: Session = Depe
                 "direction": "outgoing" if t.from_wallet in user_wallet_addresses else "incoming"
             } for t in transfers
         ]
-    }
+    })
 
 
 @router.post("/demo/purchase")
@@ -567,10 +680,10 @@ def dev_demo_purchase(company_id: int, amount: float = 200000, session: Session
     if not mw:
         mw = Wallet(owner_type="company", owner_id=company_id, address=f"w_{secrets.token_hex(8)}")
         session.add(mw); session.commit()
-        CHAIN.mint(mw.address, 500_000)
+        mint_recorded(session, mw.address, 500_000, "mint:master_funding")
     # top-up if needed
     if CHAIN.balance_of(mw.address) < 1:
-        CHAIN.mint(mw.address, 100_000)
+        mint_recorded(session, mw.address, 100_000, "mint:master_topup")
 
     # ensure an active reward rule exists
     rr = session.exec(select(RewardRule).where(RewardRule.company_id==company_id, RewardRule.action=="purchase", RewardRule.is_active==True)).first()
@@ -583,16 +696,17 @@ def dev_demo_purchase(company_id: int, amount: float = 200000, session: Session
     session.add(it); session.commit(); session.refresh(it)
 
     # compute reward and transfer
-    reward = (amount/10000.0)*rr.rate if rr.mode=="per_amount" else rr.rate
+    reward = rule_reward(rr, amount)
     txh = None
     if reward > 0:
         try:
             txh = CHAIN.transfer(mw.address, uw.address, reward)
         except Exception:
-            CHAIN.mint(mw.address, reward)
+            mint_recorded(session, mw.address, reward, "mint:reward_topup")
             txh = CHAIN.transfer(mw.address, uw.address, reward)
-        tx = TokenTransfer(tx_hash=txh, from_wallet=mw.address, to_wallet=uw.address, amount=reward, memo="demo purchase")
-        session.add(tx); session.commit()
+        tx = TokenTransfer(tx_hash=txh, from_wallet=mw.address, to_wallet=uw.address, amount=reward, memo="demo purchase", interaction_id=it.id)
+        session.add(tx); session.flush(); event = transfer_event(tx); session.commit()
+        BUS.publish(event)
 
     return {
         "interaction_id": it.id,
@@ -626,9 +740,9 @@ def dev_user_purchase(company_id: int, user_id: int, amount: float = 200000, ses
     if not mw:
         mw = Wallet(owner_type="company", owner_id=company_id, address=f"w_{secrets.token_hex(8)}")
         session.add(mw); session.commit()
-        CHAIN.mint(mw.address, 500_000)
+        mint_recorded(session, mw.address, 500_000, "mint:master_funding")
     if CHAIN.balance_of(mw.address) < 1:
-        CHAIN.mint(mw.address, 100_000)
+        mint_recorded(session, mw.address, 100_000, "mint:master_topup")
 
     # Ensure active reward rule
     rr = session.exec(select(RewardRule).where(RewardRule.company_id==company_id, RewardRule.action=="purchase", RewardRule.is_active==True)).first()
@@ -641,16 +755,17 @@ def dev_user_purchase(company_id: int, user_id: int, amount: float = 200000, ses
     session.add(it); session.commit(); session.refresh(it)
 
     # Compute reward and transfer
-    reward = (amount/10000.0)*rr.rate if rr.mode=="per_amount" else rr.rate
+    reward = rule_reward(rr, amount)
     txh = None
     if reward > 0:
         try:
             txh = CHAIN.transfer(mw.address, uw.address, reward)
         except Exception:
-            CHAIN.mint(mw.address, reward)
+            mint_recorded(session, mw.address, reward, "mint:reward_topup")
             txh = CHAIN.transfer(mw.address, uw.address, reward)
-        tx = TokenTransfer(tx_hash=txh, from_wallet=mw.address, to_wallet=uw.address, amount=reward, memo="demo user purchase")
-        session.add(tx); session.commit()
+        tx = TokenTransfer(tx_hash=txh, from_wallet=mw.address, to_wallet=uw.address, amount=reward, memo="demo user purchase", interaction_id=it.id)
+        session.add(tx); session.flush(); event = transfer_event(tx); session.commit()
+        BUS.publish(event)
 
     return {
         "interaction_id": it.id,
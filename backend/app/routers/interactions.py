@@ -1,14 +1,22 @@
 from __future__ import annotations
 
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
 
 from app.auth import AuthedCompany, require_company
-from app.db import get_session
+from app.config import ASYNC_REWARDS, RISK_HOLD
+from app.db import get_read_session, get_session
 from app.models import Interaction
-from app.schemas import InteractionIn, InteractionOut
+from app.meta_fields import meta_filters
+from app.outbox import WORKERS_ENABLED, enqueue, outbox_status, release, reward_status
+from app.risk import score_interaction
+from app.partitions import scan
+from app.responses import dumps
+from app.schemas import InteractionIn, InteractionOut, RewardStatusOut
 from app.services import apply_reward, user_check_company
 
 router = APIRouter()
@@ -17,9 +25,19 @@ router = APIRouter()
 @router.post("", response_model=InteractionOut)
 def create_interaction(
     payload: InteractionIn,
+    response: Response,
+    defer: bool = Query(ASYNC_REWARDS, alias="async"),
     auth: AuthedCompany = Depends(require_company),
     session: Session = Depends(get_session),
 ) -> InteractionOut:
+    """With ?async=true the reward is queued with the interaction (202); poll /interactions/{id}/reward.
+
+    ?async=true is ignored while the reward workers are off (neither
+    ATHENA_ASYNC_REWARDS nor ATHENA_RISK_HOLD set); the reward is paid inline.
+
+    The interaction is risk-scored first; with ATHENA_RISK_HOLD a flagged one
+    has its reward held until released.
+    """
     user = user_check_company(session, payload.user_id, auth.id)
     it = Interaction(
         user_id=user.id,
@@ -29,22 +47,78 @@ def create_interaction(
         amount=payload.amount,
         meta=payload.meta,
     )
+    assessment = score_interaction(it, payload.device_id)
     session.add(it)
+    hold = assessment.flagged and RISK_HOLD
+    if (defer and WORKERS_ENABLED) or hold:
+        session.flush()
+        row = enqueue(session, it, "held" if hold else "pending")
+        session.commit()
+        response.status_code = 202
+        return InteractionOut(id=it.id, reward_status=row.status, risk_score=assessment.score)
     session.commit()
     session.refresh(it)
 
-    reward = apply_reward(session, auth.id, user.id, payload.action, payload.amount)
-    return InteractionOut(id=it.id, reward_tokens=reward)
+    reward = apply_reward(session, auth.id, user.id, payload.action, payload.amount, interaction_id=it.id)
+    return InteractionOut(id=it.id, reward_tokens=reward, risk_score=assessment.score)
+
+
+@router.get("/{interaction_id}/reward", response_model=RewardStatusOut)
+def get_reward_status(
+    interaction_id: int,
+    auth: AuthedCompany = Depends(require_company),
+    session: Session = Depends(get_read_session),
+) -> RewardStatusOut:
+    status = reward_status(session, auth.id, interaction_id)
+    if status is None:
+        raise HTTPException(404, "Interaction not found")
+    return RewardStatusOut(**status)
+
+
+@router.post("/{interaction_id}/reward/release", response_model=RewardStatusOut)
+def release_reward(
+    interaction_id: int,
+    auth: AuthedCompany = Depends(require_company),
+    session: Session = Depends(get_session),
+) -> RewardStatusOut:
+    """Queue a held reward for payment by the reward workers."""
+    row = release(session, auth.id, interaction_id)
+    if row is None:
+        raise HTTPException(404, "No queued reward for this interaction")
+    return RewardStatusOut(**outbox_status(row))
 
 
 @router.get("/users/{user_id}/history", response_model=List[Interaction])
 def user_history(
     user_id: int,
+    request: Request,
     auth: AuthedCompany = Depends(require_company),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
+    """Newest first; configured meta fields filter by query parameter, e.g. ?direction=user_to_company"""
     _ = user_check_company(session, user_id, auth.id)
-    rows = session.exec(
-        select(Interaction).where(Interaction.user_id == user_id).order_by(Interaction.created_at.desc())
-    ).all()
-    return rows
+    query = (
+        select(Interaction)
+        .where(Interaction.user_id == user_id, *meta_filters(request.query_params))
+        .order_by(Interaction.created_at.desc())
+    )
+    return list(scan(session, query, key=lambda it: it.created_at, reverse=True))
+
+
+@router.get("/export")
+def export_interactions(
+    request: Request,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    action: Optional[str] = None,
+    auth: AuthedCompany = Depends(require_company),
+    session: Session = Depends(get_read_session),
+):
+    """The company's interactions in [start, end) as NDJSON, filterable like history"""
+    query = select(Interaction).where(Interaction.company_id == auth.id, *meta_filters(request.query_params))
+    if action:
+        query = query.where(Interaction.action == action)
+    rows = scan(session, query.order_by(Interaction.id), start=start, end=end, key=lambda it: it.id)
+    return StreamingResponse(
+        (dumps(it.model_dump()) + b"\n" for it in rows), media_type="application/x-ndjson"
+    )
@@ -1,30 +1,46 @@
 from __future__ import annotations
 
+from datetime import datetime
 from typing import List
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 
 from app.auth import AuthedCompany, require_company
-from app.db import get_session
-from app.models import RewardRule
+from app.db import get_read_session, get_session
+from app.models import Interaction, ReplayCheckpoint, RewardRule
+from app.partitions import scan
+from app.rewards import dump_tiers
+from app.schemas import ReplayIn, ReplayOut, RuleCreateIn, RuleWhatIfActionOut, RuleWhatIfIn, RuleWhatIfOut
 
 router = APIRouter()
 
 
-@router.post("", response_model=RewardRule)
-def create_rule(
-    payload: RewardRule,
-    auth: AuthedCompany = Depends(require_company),
-    session: Session = Depends(get_session),
-) -> RewardRule:
-    rule = RewardRule(
-        company_id=auth.id,
+def _rule_from_payload(company_id: int, payload: RuleCreateIn, **extra) -> RewardRule:
+    try:
+        tiers = dump_tiers((t.min_amount, t.rate) for t in payload.tiers or [])
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return RewardRule(
+        company_id=company_id,
         action=payload.action,
         rate=payload.rate,
         mode=payload.mode,
+        min_amount=payload.min_amount,
+        max_reward=payload.max_reward,
+        tiers=tiers,
         is_active=True,
+        **extra,
     )
+
+
+@router.post("", response_model=RewardRule)
+def create_rule(
+    payload: RuleCreateIn,
+    auth: AuthedCompany = Depends(require_company),
+    session: Session = Depends(get_session),
+) -> RewardRule:
+    rule = _rule_from_payload(auth.id, payload)
     session.add(rule)
     session.commit()
     session.refresh(rule)
@@ -40,3 +56,114 @@ def list_rules(
         select(RewardRule).where(RewardRule.company_id == auth.id, RewardRule.is_active == True)  # noqa: E712
     ).all()
     return rules
+
+
+@router.post("/whatif", response_model=RuleWhatIfOut)
+def rules_whatif(
+    payload: RuleWhatIfIn,
+    auth: AuthedCompany = Depends(require_company),
+    session: Session = Depends(get_read_session),
+) -> RuleWhatIfOut:
+    """Rescore the company's interactions in [start, end) under a proposed rule set."""
+    import numpy as np
+
+    from app.rule_engine import compile_rules, evaluate
+
+    if payload.end <= payload.start:
+        raise HTTPException(400, "end must be after start")
+
+    current = session.exec(
+        select(RewardRule).where(RewardRule.company_id == auth.id, RewardRule.is_active == True)  # noqa: E712
+    ).all()
+    replaced = {r.action for r in payload.rules}
+    proposed = [r for r in current if r.action not in replaced] + [
+        _rule_from_payload(auth.id, r, id=i)
+        for i, r in enumerate(payload.rules, start=1 + max((r.id for r in current), default=0))
+    ]
+
+    rows = list(
+        scan(
+            session,
+            select(Interaction.company_id, Interaction.action, Interaction.amount).where(Interaction.company_id == auth.id),
+            start=payload.start,
+            end=payload.end,
+        )
+    )
+    company_ids = [r[0] for r in rows]
+    actions = [r[1] for r in rows]
+    amounts = [r[2] for r in rows]
+
+    now = evaluate(compile_rules(current), company_ids, actions, amounts)
+    then = evaluate(compile_rules(proposed), company_ids, actions, amounts)
+
+    by_action: List[RuleWhatIfActionOut] = []
+    if rows:
+        names, inverse = np.unique(np.asarray(actions, dtype=str), return_inverse=True)
+        inverse = inverse.reshape(-1)
+        counts = np.bincount(inverse, minlength=len(names))
+        now_sum = np.bincount(inverse, weights=now, minlength=len(names))
+        then_sum = np.bincount(inverse, weights=then, minlength=len(names))
+        by_action = [
+            RuleWhatIfActionOut(
+                action=str(a),
+                interactions=int(counts[i]),
+                current_reward=float(now_sum[i]),
+                proposed_reward=float(then_sum[i]),
+            )
+            for i, a in enumerate(names)
+        ]
+
+    return RuleWhatIfOut(
+        start=payload.start,
+        end=payload.end,
+        interactions=len(rows),
+        current_reward=float(now.sum()),
+        proposed_reward=float(then.sum()),
+        actions=by_action,
+    )
+
+
+def _replay_out(state: ReplayCheckpoint) -> ReplayOut:
+    running = not state.finished and state.lease_until is not None and state.lease_until > datetime.utcnow()
+    return ReplayOut(running=running, **state.model_dump(include=set(ReplayOut.model_fields) - {"running"}))
+
+
+@router.post("/replay", response_model=ReplayOut, status_code=202)
+def rules_replay(
+    payload: ReplayIn,
+    auth: AuthedCompany = Depends(require_company),
+    session: Session = Depends(get_session),
+) -> ReplayOut:
+    """Start or resume re-issuing the company's rewards under the current rules in the background.
+
+    Returns at once; poll GET /rules/replay/{job_id} for progress.
+    """
+    from app.db import session_for_company
+    from app.replay import start_replay
+
+    state, _ = start_replay(
+        session,
+        lambda: session_for_company(auth.id),
+        payload.job_id,
+        company_id=auth.id,
+        dry_run=payload.dry_run,
+        chunk_size=payload.chunk_size,
+        batch_size=payload.batch_size,
+        workers=payload.workers,
+    )
+    return _replay_out(state)
+
+
+@router.get("/replay/{job_id}", response_model=ReplayOut)
+def rules_replay_status(
+    job_id: str,
+    dry_run: bool = False,
+    auth: AuthedCompany = Depends(require_company),
+    session: Session = Depends(get_session),
+) -> ReplayOut:
+    from app.replay import checkpoint
+
+    state = checkpoint(session, auth.id, job_id, dry_run)
+    if not state:
+        raise HTTPException(404, "Replay job not found")
+    return _replay_out(state)
@@ -1,12 +1,20 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends
+import io
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlmodel import Session
 
 from app.auth import AuthedCompany, require_company
-from app.db import get_session
-from app.schemas import UserCreateIn, UserOut, UserUpdateIn
+from app.db import get_read_session, get_session, session_for_company
+from app.onboarding import bulk_create_users, csv_rows, json_rows, ndjson_rows, text_lines, upload_kind
+from app.responses import FastJSONResponse
+from app.schemas import BulkUsersOut, UserCreateIn, UserOut, UserUpdateIn
 from app.services import user_check_company, user_out, create_user_with_wallet
+from app.timeline import user_timeline
 
 router = APIRouter()
 
@@ -28,6 +36,42 @@ def create_user(
     return user_out(session, user)
 
 
+@router.post("/bulk", response_model=BulkUsersOut)
+async def create_users_bulk(
+    request: Request,
+    chunk_size: int = 1_000,
+    auth: AuthedCompany = Depends(require_company),
+) -> BulkUsersOut:
+    """Users as a JSON array, NDJSON or CSV, in the body or as multipart field "file".
+
+    Invalid rows are reported by row number and skipped; the rest are inserted
+    with their wallets in chunks of ``chunk_size``.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    try:
+        if content_type == "multipart/form-data":
+            upload = (await request.form()).get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(400, 'Upload the users as form field "file"')
+            kind = upload_kind(upload.filename, upload.content_type)
+            lines = text_lines(upload.file)
+            rows = csv_rows(lines) if kind == "csv" else ndjson_rows(lines) if kind == "ndjson" else json_rows(json.load(lines))
+        elif content_type in ("application/x-ndjson", "application/ndjson"):
+            rows = ndjson_rows((await request.body()).decode("utf-8-sig").splitlines())
+        elif content_type == "text/csv":
+            rows = csv_rows(io.StringIO((await request.body()).decode("utf-8-sig"), newline=""))
+        else:
+            rows = json_rows(json.loads(await request.body()))
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise HTTPException(400, f"Unreadable upload: {exc}")
+
+    def run() -> BulkUsersOut:
+        with session_for_company(auth.id) as session:
+            return bulk_create_users(session, auth.id, rows, max(1, min(chunk_size, 10_000)))
+
+    return await run_in_threadpool(run)
+
+
 @router.get("/{user_id}", response_model=UserOut)
 def get_user(
     user_id: int,
@@ -38,6 +82,18 @@ def get_user(
     return user_out(session, user)
 
 
+@router.get("/{user_id}/timeline", response_class=FastJSONResponse)
+def get_user_timeline(
+    user_id: int,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    auth: AuthedCompany = Depends(require_company),
+    session: Session = Depends(get_read_session),
+):
+    user_check_company(session, user_id, auth.id)
+    return FastJSONResponse(user_timeline(session, user_id, max(1, min(limit, 200)), cursor))
+
+
 @router.put("/{user_id}", response_model=UserOut)
 def update_user(
     user_id: int,
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import and_, or_
 from sqlmodel import Session, select
 
 from app.auth import AuthedCompany, require_company
 from app.blockchain import CHAIN
+from app.blocks import block_out, inclusion_proof
 from app.db import get_session
-from app.models import User, Wallet, TokenTransfer
+from app.events import BUS, transfer_event
+from app.models import Block, User, Wallet, TokenTransfer
 from app.schemas import TxOut, WalletOut
 from app.services import get_wallet, user_check_company
 
@@ -70,5 +73,51 @@ def mock_transfer(
         memo="manual transfer",
     )
     session.add(tx)
+    session.flush()
+    event = transfer_event(tx)
     session.commit()
+    BUS.publish(event)
     return TxOut(tx_hash=txh, amount=amount, from_wallet=wf.address, to_wallet=wt.address)
+
+
+@router.get("/mockchain/blocks/{height}")
+def get_block(
+    height: int,
+    auth: AuthedCompany = Depends(require_company),
+    session: Session = Depends(get_session),
+):
+    block = session.get(Block, height)
+    if not block:
+        raise HTTPException(404, "Block not found")
+    return block_out(block)
+
+
+@router.get("/mockchain/proofs/{tx_hash}")
+def get_inclusion_proof(
+    tx_hash: str,
+    response: Response,
+    auth: AuthedCompany = Depends(require_company),
+    session: Session = Depends(get_session),
+):
+    """Merkle path from the transfer's leaf to its block's root; 202 while the transfer is not sealed yet"""
+    # Only transfers touching the company's own wallets or its users' wallets
+    users = select(User.id).where(User.company_id == auth.id)
+    mine = select(Wallet.address).where(
+        or_(
+            and_(Wallet.owner_type == "company", Wallet.owner_id == auth.id),
+            and_(Wallet.owner_type == "user", Wallet.owner_id.in_(users)),
+        )
+    )
+    tx = session.exec(
+        select(TokenTransfer).where(
+            TokenTransfer.tx_hash == tx_hash,
+            or_(TokenTransfer.from_wallet.in_(mine), TokenTransfer.to_wallet.in_(mine)),
+        )
+    ).first()
+    if tx is None:
+        raise HTTPException(404, "Transfer not found")
+    proof = inclusion_proof(session, tx)
+    if proof is None:
+        response.status_code = 202
+        return {"transfer_id": tx.id, "tx_hash": tx.tx_hash, "included": False, "sealed": False}
+    return proof
@@ -84,6 +84,18 @@ class UserOut(BaseModel):
     created_at: datetime
 
 
+class BulkUserErrorOut(BaseModel):
+    row: int
+    error: str
+
+
+class BulkUsersOut(BaseModel):
+    created: int
+    failed: int
+    chunks: int
+    errors: List[BulkUserErrorOut]  # first MAX_ERRORS failures; `failed` counts all
+
+
 class UserUpdateIn(BaseModel):
     full_name: Optional[str] = None
     phone: Optional[str] = None
@@ -96,17 +108,88 @@ class InteractionIn(BaseModel):
     action: str
     amount: Optional[float] = None
     meta: Optional[str] = None
+    device_id: Optional[str] = None  # risk scoring only, not stored
 
 
 class InteractionOut(BaseModel):
     id: int
     reward_tokens: float = 0.0
+    reward_status: str = "paid"  # "pending" when paid asynchronously, "held" when flagged
+    risk_score: Optional[float] = None
+
+
+class RewardStatusOut(BaseModel):
+    interaction_id: int
+    status: str  # "pending" | "paid" | "failed" | "held"
+    reward_tokens: Optional[float] = None
+    transfer_id: Optional[int] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    processed_at: Optional[datetime] = None
+
+
+class RuleTierIn(BaseModel):
+    min_amount: float = Field(examples=[1_000_000])
+    rate: float = Field(examples=[1.5])
 
 
 class RuleCreateIn(BaseModel):
     action: str = Field(examples=["purchase"])
     rate: float = Field(examples=[1.0], description="Tokens per 10k VND or flat")
     mode: str = Field(default="per_amount", examples=["per_amount", "flat"])
+    min_amount: Optional[float] = Field(default=None, description="Events below this amount earn nothing")
+    max_reward: Optional[float] = Field(default=None, description="Per-event reward cap")
+    tiers: Optional[List[RuleTierIn]] = Field(
+        default=None, description="Rate bands; the highest band the amount reaches replaces rate"
+    )
+
+
+class RuleWhatIfIn(BaseModel):
+    start: datetime
+    end: datetime
+    rules: List[RuleCreateIn] = Field(
+        default_factory=list,
+        description="Proposed rules; replace the active rules of every action they mention",
+    )
+
+
+class RuleWhatIfActionOut(BaseModel):
+    action: str
+    interactions: int
+    current_reward: float
+    proposed_reward: float
+
+
+class RuleWhatIfOut(BaseModel):
+    start: datetime
+    end: datetime
+    interactions: int
+    current_reward: float
+    proposed_reward: float
+    actions: List[RuleWhatIfActionOut]
+
+
+class ReplayIn(BaseModel):
+    job_id: str
+    dry_run: bool = True
+    chunk_size: int = Field(default=5_000, ge=1)
+    batch_size: int = Field(default=500, ge=1)
+    workers: int = Field(default=1, ge=1, le=8)  # >1 diffs chunks in a (spawned) process pool
+
+
+class ReplayOut(BaseModel):
+    job_id: str
+    dry_run: bool
+    last_interaction_id: int
+    scanned: int
+    corrections: int
+    delta_total: float
+    skipped: int
+    unlinked: int
+    finished: bool
+    running: bool
+    error: Optional[str] = None
+    updated_at: datetime
 
 
 class TxOut(BaseModel):
@@ -136,3 +219,4 @@ class ContractEventIn(BaseModel):
     user_id: int
     amount: Optional[float] = None
     meta: Optional[str] = None
+    device_id: Optional[str] = None  # risk scoring only, not stored
@@ -1,13 +1,15 @@
 from __future__ import annotations
 
 import secrets
-from typing import Optional
+from typing import Dict, Iterable, Optional
 
 from fastapi import HTTPException
 from sqlmodel import Session, select
 
 from app.blockchain import CHAIN
+from app.events import BUS, publish_on_commit, transfer_event
 from app.models import Company, Interaction, RewardRule, TokenTransfer, User, Wallet
+from app.rewards import rule_reward
 
 
 # DB helpers
@@ -21,6 +23,15 @@ def get_wallet(session: Session, owner_type: str, owner_id: int) -> Wallet:
     return wallet
 
 
+def company_name_map(session: Session, company_ids: Iterable[int]) -> Dict[int, str]:
+    # one primary-key lookup per page; not cached, since ids are reused after a
+    # delete or /dev/reset and names change from any worker
+    wanted = set(company_ids)
+    if not wanted:
+        return {}
+    return dict(session.exec(select(Company.id, Company.name).where(Company.id.in_(wanted))).all())
+
+
 def user_check_company(session: Session, user_id: int, company_id: int) -> User:
     user = session.get(User, user_id)
     if not user or user.company_id != company_id:
@@ -44,47 +55,76 @@ def user_out(session: Session, user: User):
     )
 
 
-def apply_reward(
-    session: Session, company_id: int, user_id: int, action: str, amount: Optional[float]
-) -> float:
+def mint_recorded(session: Session, address: str, amount: float, memo: str = "mint") -> TokenTransfer:
+    """Mint on the chain and record it as a TokenTransfer without sender; the caller commits.
+
+    The stream event goes out with that commit.
+    """
+    txh = CHAIN.mint(address, amount)
+    tx = TokenTransfer(tx_hash=txh, from_wallet=None, to_wallet=address, amount=amount, memo=memo)
+    session.add(tx)
+    if BUS.subscriber_count:
+        session.flush()
+        publish_on_commit(session, transfer_event(tx))
+    return tx
+
+
+def reward_for(session: Session, company_id: int, action: str, amount: Optional[float]) -> float:
     rules = session.exec(
         select(RewardRule).where(
             RewardRule.company_id == company_id,
             RewardRule.action == action,
             RewardRule.is_active == True,  # noqa: E712
-        )
+        ).order_by(RewardRule.id)
     ).all()
-    if not rules:
-        return 0.0
-
-    total_reward = 0.0
-    for r in rules:
-        if r.mode == "per_amount":
-            if amount and amount > 0:
-                total_reward += (amount / 10_000.0) * r.rate
-        else:
-            total_reward += r.rate
-
-    if total_reward <= 0:
-        return 0.0
-
+    return sum((rule_reward(r, amount) for r in rules), 0.0)
+
+
+def pay_reward(
+    session: Session,
+    company_id: int,
+    user_id: int,
+    action: str,
+    reward: float,
+    interaction_id: Optional[int] = None,
+) -> TokenTransfer:
+    """Move ``reward`` from the company master wallet to the user and add its TokenTransfer; the caller commits."""
     master = get_wallet(session, "company", company_id)
     uw = get_wallet(session, "user", user_id)
     try:
-        txh = CHAIN.transfer(master.address, uw.address, total_reward)
+        txh = CHAIN.transfer(master.address, uw.address, reward)
     except ValueError:
-        CHAIN.mint(master.address, total_reward)
-        txh = CHAIN.transfer(master.address, uw.address, total_reward)
+        mint_recorded(session, master.address, reward, "mint:reward_topup")
+        txh = CHAIN.transfer(master.address, uw.address, reward)
 
     tx = TokenTransfer(
         tx_hash=txh,
         from_wallet=master.address,
         to_wallet=uw.address,
-        amount=total_reward,
+        amount=reward,
         memo=f"reward:{action}",
+        interaction_id=interaction_id,
     )
     session.add(tx)
+    session.flush()
+    return tx
+
+
+def apply_reward(
+    session: Session,
+    company_id: int,
+    user_id: int,
+    action: str,
+    amount: Optional[float],
+    interaction_id: Optional[int] = None,
+) -> float:
+    total_reward = reward_for(session, company_id, action, amount)
+    if total_reward <= 0:
+        return 0.0
+
+    event = transfer_event(pay_reward(session, company_id, user_id, action, total_reward, interaction_id))
     session.commit()
+    BUS.publish(event)
     return total_reward
 
 
@@ -92,8 +132,8 @@ def create_master_wallet_with_funds(session: Session, company: Company) -> Walle
     master_addr = f"w_{secrets.token_hex(8)}"
     wallet = Wallet(owner_type="company", owner_id=company.id, address=master_addr)
     session.add(wallet)
+    mint_recorded(session, master_addr, 1_000_000, "mint:master_funding")
     session.commit()
-    CHAIN.mint(master_addr, 1_000_000)
     return wallet
 
 
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import base64
+import heapq
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, true
+from sqlmodel import Session, select
+
+from app.models import Interaction, TokenTransfer, Wallet
+from app.partitions import scan
+from app.services import company_name_map
+
+# Order within one timestamp: interactions before the transfers they caused
+KIND_RANK = {"interaction": 0, "transfer_in": 1, "transfer_out": 2}
+
+Cursor = Tuple[datetime, int, int]  # (created_at, kind rank, id) of the last item served
+
+
+def encode_cursor(created_at: datetime, rank: int, item_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), rank, item_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        ts, rank, item_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(ts), int(rank), int(item_id)
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+
+
+def _after(model, rank: int, cursor: Optional[Cursor]):
+    """Keyset condition: rows of this stream that sort after ``cursor`` in (created_at desc, rank, id desc)."""
+    if cursor is None:
+        return true()
+    ts, c_rank, c_id = cursor
+    if rank > c_rank:
+        return model.created_at <= ts
+    if rank < c_rank:
+        return model.created_at < ts
+    return or_(model.created_at < ts, and_(model.created_at == ts, model.id < c_id))
+
+
+def _stream(rows: Iterable[Any], kind: str) -> Iterator[Tuple[Tuple[datetime, int, int], str, Any]]:
+    # merge key, descending along each stream: newest first, then lower kind rank, then higher id
+    rank = -KIND_RANK[kind]
+    for row in rows:
+        yield (row.created_at, rank, row.id), kind, row
+
+
+def user_timeline(session: Session, user_id: int, limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Interactions and token transfers of one user, newest first, in pages of ``limit``.
+
+    Each source is read through its (owner, created_at) index with a keyset
+    condition and LIMIT, and the sorted streams are merged lazily, so a page
+    costs the same however long the history is.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    take = limit + 1
+    addresses = session.exec(
+        select(Wallet.address).where(Wallet.owner_type == "user", Wallet.owner_id == user_id)
+    ).all()
+
+    # archived months newer than the cursor are pruned by passing it as the range end
+    interactions = scan(
+        session,
+        select(Interaction)
+        .where(Interaction.user_id == user_id, _after(Interaction, KIND_RANK["interaction"], after))
+        .order_by(Interaction.created_at.desc(), Interaction.id.desc())
+        .limit(take),
+        end=after[0] + timedelta(microseconds=1) if after else None,
+        key=lambda it: (it.created_at, it.id),
+        reverse=True,
+        limit=take,
+    )
+    streams = [_stream(interactions, "interaction")]
+    if addresses:
+        streams.append(
+            _stream(
+                session.exec(
+                    select(TokenTransfer)
+                    .where(TokenTransfer.to_wallet.in_(addresses), _after(TokenTransfer, KIND_RANK["transfer_in"], after))
+                    .order_by(TokenTransfer.created_at.desc(), TokenTransfer.id.desc())
+                    .limit(take)
+                ),
+                "transfer_in",
+            )
+        )
+        streams.append(
+            _stream(
+                session.exec(
+                    select(TokenTransfer)
+                    .where(
+                        TokenTransfer.from_wallet.in_(addresses),
+                        TokenTransfer.to_wallet.not_in(addresses),  # self-transfers are listed once, as incoming
+                        _after(TokenTransfer, KIND_RANK["transfer_out"], after),
+                    )
+                    .order_by(TokenTransfer.created_at.desc(), TokenTransfer.id.desc())
+                    .limit(take)
+                ),
+                "transfer_out",
+            )
+        )
+
+    page: List[Tuple[str, Any]] = []
+    for _, kind, row in heapq.merge(*streams, key=lambda item: item[0], reverse=True):
+        page.append((kind, row))
+        if len(page) == take:
+            break
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    names = company_name_map(session, {row.company_id for kind, row in page if kind == "interaction"})
+    items: List[Dict[str, Any]] = []
+    for kind, row in page:
+        if kind == "interaction":
+            items.append({
+                "kind": "interaction",
+                "id": row.id,
+                "created_at": row.created_at,
+                "company_id": row.company_id,
+                "company_name": names.get(row.company_id, "Unknown"),
+                "service": row.service,
+                "action": row.action,
+                "amount": row.amount,
+                "transaction_type": row.transaction_type,
+                "status": row.status,
+                "meta": row.meta,
+            })
+        else:
+            items.append({
+                "kind": "transfer",
+                "id": row.id,
+                "created_at": row.created_at,
+                "tx_hash": row.tx_hash,
+                "from_wallet": row.from_wallet,
+                "to_wallet": row.to_wallet,
+                "amount": row.amount,
+                "memo": row.memo,
+                "direction": "incoming" if kind == "transfer_in" else "outgoing",
+            })
+
+    next_cursor = None
+    if has_more and page:
+        kind, row = page[-1]
+        next_cursor = encode_cursor(row.created_at, KIND_RANK[kind], row.id)
+    return {"user_id": user_id, "items": items, "next_cursor": next_cursor}
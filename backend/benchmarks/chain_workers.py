@@ -0,0 +1,73 @@
+"""Throughput of the shared SQLite chain backend with 1..N worker processes.
+
+    python benchmarks/chain_workers.py --max-workers 8 --ops 2000
+
+Each worker performs ``--ops`` transfers between random pre-funded wallets
+(and the same number of balance reads) against one ledger file, the way
+``uvicorn --workers N`` processes would. Writes serialize on the SQLite
+write lock, so expect reads to scale with workers and writes to plateau.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.blockchain import SQLiteChain  # noqa: E402
+
+
+def _worker(args):
+    url, wallets, ops, seed = args
+    chain = SQLiteChain(url)
+    rng = random.Random(seed)
+    t0 = time.perf_counter()
+    for _ in range(ops):
+        a, b = rng.sample(wallets, 2)
+        try:
+            chain.transfer(a, b, 1.0)
+        except ValueError:
+            pass
+    t1 = time.perf_counter()
+    for _ in range(ops):
+        chain.balance_of(rng.choice(wallets))
+    t2 = time.perf_counter()
+    return t1 - t0, t2 - t1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--ops", type=int, default=2000, help="transfers and reads per worker")
+    parser.add_argument("--wallets", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'chain.db')}"
+        chain = SQLiteChain(url)
+        wallets = [f"w_{i:08x}" for i in range(args.wallets)]
+        for w in wallets:
+            chain.mint(w, 1_000_000.0)
+        expected = chain.engine.connect().exec_driver_sql("SELECT SUM(balance) FROM ledger").scalar()
+
+        print(f"{'workers':>7} {'transfers/s':>12} {'reads/s':>12}")
+        for n in range(1, args.max_workers + 1):
+            with Pool(n) as pool:
+                t0 = time.perf_counter()
+                results = pool.map(_worker, [(url, wallets, args.ops, seed) for seed in range(n)])
+                wall = time.perf_counter() - t0
+            write_s = max(r[0] for r in results)
+            read_s = max(r[1] for r in results)
+            print(f"{n:>7} {n * args.ops / write_s:>12.0f} {n * args.ops / read_s:>12.0f}   (wall {wall:.2f}s)")
+
+        total = chain.engine.connect().exec_driver_sql("SELECT SUM(balance) FROM ledger").scalar()
+        assert abs(total - expected) < 1e-6, "ledger total drifted across workers"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Micro-benchmarks of core hot functions with a regression gate against stored baselines.
+
+    python benchmarks/hot_paths.py                  # compare with baselines.json, exit 1 on regression
+    python benchmarks/hot_paths.py --update         # record the current timings as the new baselines
+    python benchmarks/hot_paths.py --sizes 1000 --tolerance 0.5 --only chain.
+
+Each size seeds a fresh in-memory SQLite database with that many users (and
+wallets, transfers and chain accounts; one company per hundred users, at
+least ten) and times every case as the best of ``--repeat`` runs of
+``--loops`` calls, reported per call. A case fails when it is more than
+``--tolerance`` (default ATHENA_BENCH_TOLERANCE, 0.25 = 25%) slower than its
+baseline. Baselines depend on the machine: record them with ``--update`` on
+the machine that runs the gate.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["ATHENA_CHAIN_BACKEND"] = "memory"
+os.environ["ATHENA_ADMISSION"] = "1"
+
+from sqlalchemy.pool import StaticPool  # noqa: E402
+from sqlmodel import Session, SQLModel, create_engine  # noqa: E402
+
+from app import admission  # noqa: E402
+from app.auth import company_for_key, require_company  # noqa: E402
+from app.blockchain import CHAIN, MockChain  # noqa: E402
+from app.mock_data import SOVICO_COMPANIES, build_interaction_meta  # noqa: E402
+from app.models import Company, RewardRule, SmartContract, TokenTransfer, User, Wallet  # noqa: E402
+from app.routers.companies import _build_company_services  # noqa: E402
+from app.services import apply_reward, create_master_wallet_with_funds, user_out  # noqa: E402
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# Companies get a tier without limits, so require_company measures lookup, admit and release instead of 429s.
+admission.TIER_LIMITS["benchmark"] = admission.TierLimits(rate=1e12, burst=1e12, concurrency=1)
+
+
+def _best(fn: Callable[[], None], loops: int, repeat: int) -> float:
+    """Best per-call time in microseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, time.perf_counter() - t0)
+    return best / loops * 1e6
+
+
+def _seed(session: Session, users: int) -> Tuple[List[Company], List[User]]:
+    companies = []
+    for i in range(max(10, users // 100)):
+        mock = SOVICO_COMPANIES[i % len(SOVICO_COMPANIES)]
+        company = Company(
+            name=mock["name"] if i < len(SOVICO_COMPANIES) else f"{mock['name']} {i}",
+            api_key=f"sk_bench_{i}",
+            sector=mock.get("sector"),
+            tier="benchmark",
+            supported_actions=json.dumps([r["action"] for r in mock["rules"]]),
+        )
+        session.add(company)
+        session.commit()
+        session.refresh(company)
+        create_master_wallet_with_funds(session, company)
+        for rule in mock["rules"]:
+            session.add(RewardRule(company_id=company.id, action=rule["action"], rate=rule["rate"], mode=rule["mode"]))
+            session.add(SmartContract(company_id=company.id, name=f"{rule['action']} contract", action=rule["action"]))
+        companies.append(company)
+    session.commit()
+
+    rows = [
+        User(
+            company_id=companies[i % len(companies)].id,
+            full_name=f"User {i}",
+            email=f"user{i}@example.com",
+            segment="premium" if i % 3 == 0 else "standard",
+        )
+        for i in range(users)
+    ]
+    session.add_all(rows)
+    session.commit()
+    for user in rows:
+        address = f"w_bench_{user.id:08x}"
+        session.add(Wallet(owner_type="user", owner_id=user.id, address=address))
+        session.add(TokenTransfer(tx_hash=f"0x{user.id:064x}", from_wallet=None, to_wallet=address, amount=1.0, memo="mint"))
+        CHAIN.mint(address, 1.0)
+    session.commit()
+    return companies, rows
+
+
+def run_size(size: int, loops: int, repeat: int, only: str) -> Dict[str, float]:
+    rng = random.Random(size)
+    results: Dict[str, float] = {}
+
+    def case(name: str, fn: Callable[[], None], n: int = loops) -> None:
+        if name.startswith(only):
+            results[name] = round(_best(fn, n, repeat), 3)
+
+    chain = MockChain()
+    addresses = [f"w_{i:016x}" for i in range(size)]
+    for address in addresses:
+        chain.mint(address, 1_000.0)
+    case("chain.transfer", lambda: chain.transfer(rng.choice(addresses), rng.choice(addresses), 0.01))
+    case("chain.mint", lambda: chain.mint(rng.choice(addresses), 0.01))
+    case("chain.balance_of", lambda: chain.balance_of(rng.choice(addresses)))
+
+    mock = SOVICO_COMPANIES[0]
+    user = {"name": "Nguyễn Văn An", "email": "an@example.com", "phone": "+84901234567", "segment": "premium"}
+    case("mock_data.build_interaction_meta", lambda: build_interaction_meta(mock, user, mock["rules"][0], 1_250_000.0))
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    CHAIN.reset()
+    try:
+        with Session(engine) as session:
+            companies, users = _seed(session, size)
+            actions = {c.id: json.loads(c.supported_actions) for c in companies}
+            keys = [c.api_key for c in companies]
+            company_ids = [c.id for c in companies]
+            user_ids = [u.id for u in users]
+            rewarded = [(u.company_id, u.id) for u in users[:1000]]
+
+        # a fresh session, so commits do not expire thousands of seeded objects
+        with Session(engine) as session:
+
+            def reward() -> None:
+                company_id, user_id = rng.choice(rewarded)
+                apply_reward(session, company_id, user_id, rng.choice(actions[company_id]), 100_000.0)
+
+            loop = asyncio.new_event_loop()
+
+            async def admitted(company: Company) -> None:
+                gen = require_company(company)
+                await gen.__anext__()
+                await gen.aclose()
+
+            def auth() -> None:
+                loop.run_until_complete(admitted(company_for_key(rng.choice(keys), session)))
+
+            def services() -> None:
+                _build_company_services(session, session.get(Company, rng.choice(company_ids)))
+
+            def profile() -> None:
+                user_out(session, session.get(User, rng.choice(user_ids)))
+
+            # DB cases do far more work per call than the in-memory ones
+            n = max(loops // 10, 1)
+            case("services.apply_reward", reward, n)
+            case("auth.require_company", auth, n)
+            case("services.user_out", profile, n)
+            case("companies._build_company_services", services, n)
+            loop.close()
+    finally:
+        CHAIN.reset()
+        engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma-separated user counts")
+    parser.add_argument("--loops", type=int, default=2000, help="calls per timing run (a tenth for database cases)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--tolerance", type=float, default=float(os.getenv("ATHENA_BENCH_TOLERANCE", "0.25")),
+        help="allowed slowdown over the baseline, as a fraction",
+    )
+    parser.add_argument("--baselines", default=BASELINES)
+    parser.add_argument("--only", default="", help="run only cases whose name starts with this")
+    parser.add_argument("--update", action="store_true", help="write the timings as the new baselines")
+    args = parser.parse_args()
+
+    baselines: Dict[str, Dict[str, float]] = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)["results"]
+
+    regressions = []
+    current: Dict[str, Dict[str, float]] = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        current[str(size)] = run_size(size, args.loops, args.repeat, args.only)
+        for name, us in current[str(size)].items():
+            base = baselines.get(str(size), {}).get(name)
+            if base is None:
+                verdict = "   (no baseline)"
+            else:
+                ratio = us / base
+                verdict = f"  {ratio:5.2f}x of {base:9.2f} us"
+                if ratio > 1 + args.tolerance:
+                    verdict += "  REGRESSION"
+                    regressions.append(f"{name} @ {size}")
+            print(f"{size:>7} {name:<36} {us:9.2f} us{verdict}")
+
+    if args.update:
+        for size, cases in current.items():
+            baselines.setdefault(size, {}).update(cases)
+        with open(args.baselines, "w", newline="\r\n") as f:
+            json.dump({"recorded_at": datetime.utcnow().isoformat(timespec="seconds"), "results": baselines}, f, indent=2)
+            f.write("\n")
+        print(f"baselines written to {args.baselines}")
+    elif regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
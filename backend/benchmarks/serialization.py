@@ -0,0 +1,85 @@
+"""Serialization cost of hot read responses: FastAPI default path vs FastJSONResponse.
+
+    python benchmarks/serialization.py --wallets 100000
+
+``/dev/wallets``: jsonable_encoder + JSONResponse (what a plain returned list
+goes through) against FastJSONResponse on the same rows.
+``/companies/profile``: json.loads of the list fields, CompanyOut construction
+and response-model validation/dump against the cached FastJSONResponse path.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.models import Company  # noqa: E402
+from app.responses import FastJSONResponse  # noqa: E402
+from app.routers.companies import _company_payload  # noqa: E402
+from app.schemas import CompanyOut  # noqa: E402
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wallets", type=int, default=100_000)
+    parser.add_argument("--profiles", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = [
+        {"id": i, "owner_type": "user", "owner_id": i, "address": f"hd_{i:024x}", "balance": i * 1.25}
+        for i in range(args.wallets)
+    ]
+    before = _best(lambda: JSONResponse(jsonable_encoder(rows)), args.repeat)
+    after = _best(lambda: FastJSONResponse(rows), args.repeat)
+    print(f"/dev/wallets x{args.wallets}: {before * 1e3:8.1f} ms -> {after * 1e3:8.1f} ms  ({before / after:.1f}x)")
+
+    company = Company(
+        id=1,
+        name="HDBank",
+        api_key="sk_x",
+        sector="Banking",
+        supported_actions=json.dumps([f"action_{i}" for i in range(50)]),
+        service_categories=json.dumps(["banking", "credit", "loans", "investment"]),
+        created_at=datetime.utcnow(),
+    )
+
+    def legacy_profile() -> None:
+        for _ in range(args.profiles):
+            out = CompanyOut(
+                **{k: getattr(company, k) for k in CompanyOut.model_fields if k not in ("supported_actions", "service_categories")},
+                supported_actions=json.loads(company.supported_actions),
+                service_categories=json.loads(company.service_categories),
+            )
+            JSONResponse(jsonable_encoder(CompanyOut.model_validate(out.model_dump())))
+
+    def fast_profile() -> None:
+        for _ in range(args.profiles):
+            FastJSONResponse(_company_payload(company))
+
+    before = _best(legacy_profile, args.repeat)
+    after = _best(fast_profile, args.repeat)
+    print(
+        f"/companies/profile x{args.profiles}: {before * 1e3:8.1f} ms -> {after * 1e3:8.1f} ms  ({before / after:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
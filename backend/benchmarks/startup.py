@@ -0,0 +1,57 @@
+"""Cold-start cost of ``import main`` per profile, measured with ``python -X importtime``.
+
+    python benchmarks/startup.py --runs 5
+
+Profiles are measured alternately; reports the best cumulative import time of
+``main`` and the peak resident memory of the process right after the import.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PROBE = "import main, resource; print('RSS_KB', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+
+
+def _measure(profile: str) -> tuple[float, int]:
+    env = dict(os.environ, ATHENA_PROFILE=profile)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=BACKEND,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = next(
+        int(m.group(1)) for m in re.finditer(r"import time:\s+\d+ \|\s+(\d+) \| main$", proc.stderr, re.M)
+    )
+    rss = int(proc.stdout.split("RSS_KB")[1])
+    return cumulative / 1000.0, rss
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    profiles = ("dev", "production")
+    samples: dict[str, list[tuple[float, int]]] = {p: [] for p in profiles}
+    for _ in range(args.runs):
+        for profile in profiles:
+            samples[profile].append(_measure(profile))
+
+    print(f"{'profile':>10} {'import ms':>10} {'rss MB':>8}")
+    for profile in profiles:
+        ms = min(s[0] for s in samples[profile])
+        rss = statistics.median(s[1] for s in samples[profile]) / 1024
+        print(f"{profile:>10} {ms:>10.1f} {rss:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,14 @@ from __future__ import annotations
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.blocks import start_block_producer
+from app.config import PROFILE, PROFILER_SAMPLE_RATE, PROFILER_SECRET
+from app.network import start_network_snapshots
+from app.outbox import start_reward_workers
+from app.reconcile import start_reconciler
+from app.sketches import start_sketcher
 from app.db import create_db_and_tables
-from app.routers import companies, users, interactions, rules, wallets, dev, contracts
+from app.routers import companies, users, interactions, rules, wallets, contracts
 
 app = FastAPI(title="ATHENA MVP Backend", version="0.1.0")
 
@@ -15,12 +21,22 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Athena-Profile-Id"],  # lets the frontend read profile ids (app/profiler.py)
 )
+if PROFILER_SECRET or PROFILER_SAMPLE_RATE:
+    from app.profiler import ProfilerMiddleware
+
+    app.add_middleware(ProfilerMiddleware)
 
 
 @app.on_event("startup")
 def on_startup() -> None:
     create_db_and_tables()
+    start_block_producer()
+    start_reconciler()
+    start_reward_workers()
+    start_sketcher()
+    start_network_snapshots()
 
 
 # Routers
@@ -30,4 +46,7 @@ app.include_router(interactions.router, prefix="/interactions", tags=["interacti
 app.include_router(rules.router, prefix="/rules", tags=["rules"])
 app.include_router(wallets.router, prefix="/wallets", tags=["wallets"])
 app.include_router(contracts.router, prefix="/contracts", tags=["contracts"])  # new
-app.include_router(dev.router, prefix="/dev", tags=["dev"])  # optional
+if PROFILE != "production":
+    from app.routers import dev
+
+    app.include_router(dev.router, prefix="/dev", tags=["dev"])  # optional
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import os
+import sys
+
+import pytest
+from sqlmodel import Session, create_engine
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+@pytest.fixture
+def session(tmp_path):
+    """A session on a fresh, migrated database file in tmp_path (archives go next to it)."""
+    from app.db import _prepare
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'athena.db'}")
+    _prepare(engine)
+    with Session(engine) as s:
+        yield s
+    engine.dispose()
+
+
+@pytest.fixture
+def client(session):
+    """A TestClient whose requests use ``session``'s database; startup jobs are not run."""
+    from fastapi.testclient import TestClient
+
+    from app.db import get_read_session, get_session
+    from main import app
+
+    def override():
+        with Session(session.get_bind()) as s:
+            yield s
+
+    app.dependency_overrides[get_session] = app.dependency_overrides[get_read_session] = override
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
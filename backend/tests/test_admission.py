@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import anyio
+import pytest
+from fastapi import HTTPException
+
+from app import admission
+from app.admission import TenantGate, TierLimits
+
+
+@pytest.fixture
+def gate(monkeypatch) -> TenantGate:
+    monkeypatch.setitem(admission.TIER_LIMITS, "test", TierLimits(rate=1.0, burst=10.0, concurrency=1))
+    monkeypatch.setattr(admission, "QUEUE_BUDGET", 0.2)
+    return TenantGate("test")
+
+
+def test_a_queued_request_gets_the_released_slot(gate: TenantGate) -> None:
+    async def main() -> None:
+        first = await gate.admit()
+        admitted = []
+
+        async def queued() -> None:
+            admitted.append(await gate.admit())
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(queued)
+            await anyio.sleep(0.01)
+            assert len(gate.waiters) == 1 and not admitted
+            gate.release(first)
+        assert admitted and gate.in_flight == 1 and not gate.waiters
+
+    anyio.run(main)
+
+
+def test_a_shed_request_gets_its_rate_token_back(gate: TenantGate) -> None:
+    async def main() -> None:
+        await gate.admit()
+        tokens = gate.bucket.tokens
+        with pytest.raises(HTTPException) as exc:
+            await gate.admit()  # waits out the queue budget
+        assert exc.value.status_code == 503
+        assert gate.bucket.tokens >= tokens
+        assert not gate.waiters and gate.in_flight == 1
+
+    anyio.run(main)
+
+
+def test_a_cancelled_waiter_leaves_the_queue(gate: TenantGate) -> None:
+    async def main() -> None:
+        await gate.admit()
+        with anyio.move_on_after(0.05):
+            await gate.admit()
+        assert not gate.waiters and gate.in_flight == 1
+
+    anyio.run(main)
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.blockchain import MockChain, SQLiteChain
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def chain(request, tmp_path):
+    if request.param == "memory":
+        return MockChain()
+    return SQLiteChain(f"sqlite:///{tmp_path / 'chain.db'}")
+
+
+def test_leaderboard_ranks_by_balance_then_address(chain) -> None:
+    for addr, amount in [("w_a", 5), ("w_b", 20), ("w_c", 5), ("w_d", 1)]:
+        chain.mint(addr, amount)
+    chain.transfer("w_b", "w_d", 10)
+
+    assert chain.top(3) == [("w_d", 11.0), ("w_b", 10.0), ("w_a", 5.0)]
+    assert chain.top(2, offset=2) == [("w_a", 5.0), ("w_c", 5.0)]
+    assert [chain.rank_of(a) for a in ("w_d", "w_b", "w_a", "w_c", "w_x")] == [1, 2, 3, 4, None]
+    assert chain.holder_count() == 4
+
+
+def test_reading_an_unknown_balance_does_not_add_a_holder(chain) -> None:
+    chain.mint("w_a", 5)
+
+    assert chain.balance_of("w_nobody") == 0.0
+    assert chain.holder_count() == 1
+    assert chain.rank_of("w_nobody") is None
+
+
+def test_sqlite_chain_is_shared_and_never_overdraws(tmp_path) -> None:
+    url = f"sqlite:///{tmp_path / 'chain.db'}"
+    workers = [SQLiteChain(url), SQLiteChain(url)]  # one per worker process, same ledger
+    workers[0].mint("w_a", 100)
+    assert workers[1].balance_of("w_a") == 100.0
+
+    def spend(chain: SQLiteChain) -> bool:
+        try:
+            chain.transfer("w_a", "w_b", 7)
+        except ValueError:
+            return False
+        return True
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        paid = sum(pool.map(spend, [workers[i % 2] for i in range(30)]))
+
+    assert paid == 14
+    assert workers[0].balance_of("w_a") == 2.0 and workers[1].balance_of("w_b") == 98.0
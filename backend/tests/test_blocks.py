@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from typing import List
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.blocks import inclusion_proof, leaf_hash, seal_blocks, verify_proof
+from app.models import Company, TokenTransfer, Wallet
+from app.services import create_master_wallet_with_funds, create_user_with_wallet, mint_recorded
+
+
+def _company(session: Session, name: str) -> TokenTransfer:
+    """A company with a funded master wallet; returns the funding mint."""
+    company = Company(name=name, api_key=f"sk_{name.lower()}")
+    session.add(company)
+    session.commit()
+    wallet = create_master_wallet_with_funds(session, company)
+    return session.exec(select(TokenTransfer).where(TokenTransfer.to_wallet == wallet.address)).one()
+
+
+def test_proofs_verify_against_the_block_root(session: Session) -> None:
+    txs = [mint_recorded(session, f"w_{i}", i + 1) for i in range(7)]
+    session.commit()
+    seal_blocks(session, force=True)
+
+    for tx in txs:
+        proof = inclusion_proof(session, tx)
+        assert proof["included"]
+        assert verify_proof(leaf_hash(tx), proof["proof"], bytes.fromhex(proof["block"]["merkle_root"]))
+    assert not verify_proof(leaf_hash(txs[0]), proof["proof"], bytes.fromhex(proof["block"]["merkle_root"]))
+
+
+def test_proof_of_an_unsealed_transfer_is_pending_and_never_writes(session: Session, client) -> None:
+    mint = _company(session, "HDBank")
+    statements: List[str] = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    response = client.get(f"/wallets/mockchain/proofs/{mint.tx_hash}", headers={"X-API-Key": "sk_hdbank"})
+
+    assert response.status_code == 202
+    assert response.json()["sealed"] is False
+    assert all(s.lstrip().upper().startswith("SELECT") for s in statements)
+
+
+def test_proofs_are_limited_to_the_callers_wallets(session: Session, client) -> None:
+    mine, theirs = _company(session, "HDBank"), _company(session, "Vietjet")
+    user = create_user_with_wallet(session, 1, "An", "an@example.com", None, None)
+    wallet = session.exec(select(Wallet).where(Wallet.owner_type == "user", Wallet.owner_id == user.id)).one()
+    bonus = mint_recorded(session, wallet.address, 5)
+    session.commit()
+    seal_blocks(session, force=True)
+
+    def status(tx: TokenTransfer) -> int:
+        return client.get(f"/wallets/mockchain/proofs/{tx.tx_hash}", headers={"X-API-Key": "sk_hdbank"}).status_code
+
+    assert status(mine) == 200
+    assert status(bonus) == 200
+    assert status(theirs) == 404
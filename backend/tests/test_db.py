@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, create_engine, select
+
+from app import db
+from app.models import Company, Interaction
+
+
+def _bind(dependency, api_key: str):
+    """Engine that ``dependency`` binds Interaction to for a request with ``api_key``."""
+    sessions = dependency(api_key)
+    try:
+        return next(sessions).get_bind(Interaction)
+    finally:
+        sessions.close()
+
+
+def test_sharded_sessions_keep_tenant_rows_in_the_company_shard(session: Session, tmp_path, monkeypatch) -> None:
+    main = session.get_bind()
+    monkeypatch.setattr(db, "engine", main)
+    monkeypatch.setattr(db, "SHARDING", True)
+    monkeypatch.setattr(db, "SHARD_DIR", str(tmp_path / "shards"))
+    monkeypatch.setattr(db, "_SHARDS", {})
+    monkeypatch.setattr(db, "_KEY_TO_COMPANY", {})
+    company = Company(name="HDBank", api_key="sk_hdbank")
+    session.add(company)
+    session.commit()
+
+    with db.session_for_company(company.id) as shard_session:
+        assert shard_session.get(Company, company.id).name == "HDBank"  # Company stays in the main database
+        shard_session.add(Interaction(user_id=1, company_id=company.id, service="s", action="a"))
+        shard_session.commit()
+
+    assert session.exec(select(Interaction)).all() == []
+    shard_file = tmp_path / "shards" / f"company_{company.id}.db"
+    with Session(create_engine(f"sqlite:///{shard_file}")) as direct:
+        assert [i.company_id for i in direct.exec(select(Interaction)).all()] == [company.id]
+
+    assert _bind(db.get_session, "sk_hdbank") is db.shard_engine(company.id)
+    assert _bind(db.get_session, "sk_unknown") is main
+    assert [os.path.basename(e.url.database) for e in db.all_engines()[1:]] == [shard_file.name]
+
+
+def test_read_sessions_cannot_write(session: Session, monkeypatch) -> None:
+    main = session.get_bind()
+    monkeypatch.setattr(db, "engine", main)
+    monkeypatch.setattr(db, "_READERS", {})
+    session.add(Company(name="HDBank", api_key="sk_hdbank"))
+    session.commit()
+
+    assert _bind(db.get_read_session, "sk_hdbank") is db.reader_for(main)
+    with Session(db.reader_for(main)) as reader:
+        assert reader.exec(select(Company.name)).all() == ["HDBank"]
+        reader.add(Company(name="Vietjet", api_key="sk_vietjet"))
+        with pytest.raises(OperationalError, match="readonly"):
+            reader.commit()
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from typing import List
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app.models import Company, Interaction
+from app.services import create_user_with_wallet
+
+
+def test_user_transactions_only_look_up_the_companies_on_the_page(session: Session, client) -> None:
+    companies = [Company(name=f"Company {i}", api_key=f"sk_{i}") for i in range(5)]
+    session.add_all(companies)
+    session.commit()
+    user = create_user_with_wallet(session, companies[0].id, "An", "an@example.com", None, None)
+    session.add(Interaction(user_id=user.id, company_id=companies[2].id, service="s", action="a"))
+    session.commit()
+    statements: List[str] = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    body = client.get(f"/dev/users/{user.id}/transactions").json()
+
+    assert [i["company_name"] for i in body["interactions"]] == ["Company 2"]
+    company_reads = [s for s in statements if "FROM company" in s]
+    assert company_reads and all("WHERE company.id IN" in s for s in company_reads)
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import asyncio
+
+from sqlmodel import Session
+
+from app.events import BUS, transfer_event
+from app.models import TokenTransfer
+from app.services import mint_recorded
+
+
+def _tx() -> TokenTransfer:
+    return TokenTransfer(id=1, tx_hash="0x1", from_wallet="w_a", to_wallet="w_b", amount=1.0, memo="m")
+
+
+def test_no_event_is_built_without_subscribers(monkeypatch) -> None:
+    from app import events
+
+    def balance_of(_address):
+        raise AssertionError("balance looked up with nobody streaming")
+
+    monkeypatch.setattr(events.CHAIN, "balance_of", balance_of)
+    assert transfer_event(_tx()) is None
+    BUS.publish(None)
+
+
+def test_subscribers_get_the_event_with_balances() -> None:
+    async def main() -> None:
+        sub = BUS.subscribe()
+        try:
+            BUS.publish(transfer_event(_tx()))
+            events, dropped = await sub.drain(1.0)
+        finally:
+            BUS.unsubscribe(sub)
+        assert [e["tx_hash"] for e in events] == ["0x1"] and dropped == 0
+        assert set(events[0]["balances"]) == {"w_a", "w_b"}
+
+    asyncio.run(main())
+
+
+def test_mints_are_streamed_when_their_session_commits(session: Session) -> None:
+    async def main() -> None:
+        sub = BUS.subscribe()
+        try:
+            mint_recorded(session, "w_gone", 1.0, "mint:rolled_back")
+            session.rollback()
+            mint = mint_recorded(session, "w_a", 5.0, "mint:master_funding")
+            assert (await sub.drain(0.05))[0] == []
+            session.commit()
+            events, _ = await sub.drain(1.0)
+        finally:
+            BUS.unsubscribe(sub)
+        assert [(e["tx_hash"], e["from_wallet"], e["memo"]) for e in events] == [(mint.tx_hash, None, "mint:master_funding")]
+        assert events[0]["balances"]["w_a"] >= 5.0
+
+    asyncio.run(main())
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from app import meta_fields
+from app.meta_fields import meta_filters, parse_fields, sync_meta_columns
+from app.models import Interaction
+
+
+def test_parse_fields_rejects_anything_but_names_and_paths() -> None:
+    assert parse_fields(" direction=$.direction, channel=$.ctx.channel ,") == {
+        "direction": "$.direction",
+        "channel": "$.ctx.channel",
+    }
+    for bad in ("Direction=$.d", "d=$.x'); DROP TABLE interaction; --", "d=direction"):
+        with pytest.raises(ValueError):
+            parse_fields(bad)
+
+
+def test_configured_fields_filter_through_an_index(session: Session, monkeypatch) -> None:
+    engine = session.get_bind()
+    configured = dict(meta_fields.META_FIELDS)
+    monkeypatch.setattr(meta_fields, "META_FIELDS", {**configured, "channel": "$.ctx.channel"})
+    assert sync_meta_columns(engine) == ["meta_channel"]
+    assert sync_meta_columns(engine) == []
+    for meta in ('{"ctx": {"channel": "app"}}', '{"ctx": {"channel": "web"}}', "demo", None):
+        session.add(Interaction(user_id=1, company_id=1, service="s", action="a", meta=meta))
+    session.commit()
+
+    query = select(Interaction.meta).where(*meta_filters({"channel": "app", "other": "x"}))
+    assert session.exec(query).all() == ['{"ctx": {"channel": "app"}}']
+    plan = session.exec(text("EXPLAIN QUERY PLAN SELECT id FROM interaction WHERE meta_channel = 'x'")).all()
+    assert "ix_interaction_meta_channel" in str(plan)
+
+    monkeypatch.setattr(meta_fields, "META_FIELDS", configured)
+    assert sync_meta_columns(engine) == ["meta_channel"]
+    assert meta_filters({"channel": "app"}) == []
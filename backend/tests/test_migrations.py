@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlmodel import SQLModel, create_engine
+
+import app.models  # noqa: F401  (registers the tables)
+from app.migrations import LATEST, MIGRATIONS, migrate, schema_version
+
+
+def test_steps_run_once_even_with_concurrent_workers(tmp_path) -> None:
+    url = f"sqlite:///{tmp_path / 'athena.db'}"
+    engines = [create_engine(url, connect_args={"timeout": 30}) for _ in range(4)]
+    SQLModel.metadata.create_all(engines[0])  # an unversioned database, as before migrations existed
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        applied = list(pool.map(migrate, engines))
+
+    assert sorted(len(steps) for steps in applied) == [0, 0, 0, len(MIGRATIONS)]
+    assert schema_version(engines[0]) == LATEST
+    assert migrate(engines[1]) == []
+
+
+def test_prepared_database_is_current(session) -> None:
+    assert schema_version(session.get_bind()) == LATEST
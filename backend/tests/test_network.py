@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from sqlmodel import Session
+
+from app import network
+from app.blockchain import CHAIN
+from app.models import Company, Interaction, TokenTransfer
+from app.network import graph_for, save_snapshot
+from app.services import create_master_wallet_with_funds, create_user_with_wallet, get_wallet, pay_reward
+
+
+def _seed(session: Session) -> tuple:
+    company = Company(name="HDBank", api_key="sk_hdbank")
+    session.add(company)
+    session.commit()
+    create_master_wallet_with_funds(session, company)
+    an = create_user_with_wallet(session, company.id, "An", "an@example.com", None, None)
+    binh = create_user_with_wallet(session, company.id, "Binh", "binh@example.com", None, None)
+    for user in (an, an, binh):
+        session.add(Interaction(user_id=user.id, company_id=company.id, service="s", action="purchase"))
+    pay_reward(session, company.id, an.id, "purchase", 4)
+    session.commit()
+    return company.id, an.id, binh.id
+
+
+def test_graph_folds_new_rows_and_survives_a_restart(session: Session, monkeypatch) -> None:
+    monkeypatch.setattr(network, "_GRAPHS", {})
+    company, an, binh = _seed(session)
+
+    view = graph_for(session).view(session)
+    assert view["companies"] == [[company, "HDBank"]]
+    assert sorted(view["edges"]) == [[company, an, 2, 4.0, 0.0], [company, binh, 1, 0.0, 0.0]]
+
+    # the user pays back part of it: one new row, folded on the next read
+    master, wallet = get_wallet(session, "company", company), get_wallet(session, "user", an)
+    txh = CHAIN.transfer(wallet.address, master.address, 1.5)
+    session.add(TokenTransfer(tx_hash=txh, from_wallet=wallet.address, to_wallet=master.address, amount=1.5))
+    session.commit()
+    assert graph_for(session).fold(session) == 0  # graph_for already folded it
+    assert [company, an, 2, 4.0, 1.5] in graph_for(session).view(session)["edges"]
+    assert graph_for(session).view(session, top_k=1)["pruned_edges"] == 1
+
+    assert save_snapshot(session)["edges"] == 2
+    assert save_snapshot(session) is None  # nothing moved
+    monkeypatch.setattr(network, "_GRAPHS", {})  # a restarted process
+    restarted = network._graph(session)
+    assert restarted.saved_at == (restarted.last_interaction_id, restarted.last_transfer_id) != (0, 0)
+    assert restarted.fold(session) == 0
+    assert sorted(restarted.view(session)["edges"]) == [[company, an, 2, 4.0, 1.5], [company, binh, 1, 0.0, 0.0]]
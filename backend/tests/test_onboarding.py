@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import csv
+import io
+
+from sqlmodel import Session, select
+
+from app.models import Company, User
+from app.onboarding import bulk_create_users, csv_rows, ndjson_rows, text_lines
+
+
+def _company(session: Session) -> int:
+    company = Company(name="HDBank", api_key="sk_test")
+    session.add(company)
+    session.commit()
+    return company.id
+
+
+def test_bad_bytes_in_an_upload_fail_the_row_instead_of_the_request(session: Session) -> None:
+    company_id = _company(session)
+    upload = io.BytesIO(b'{"full_name": "An", "email": "an@example.com"}\n{"full_name": "B\xff"}\n')
+    result = bulk_create_users(session, company_id, ndjson_rows(text_lines(upload)))
+    assert result.failed == 1
+    assert "unreadable upload" in result.errors[0].error
+
+
+def test_broken_csv_stops_the_import_after_the_rows_before_it(session: Session) -> None:
+    company_id = _company(session)
+    huge = "x" * (csv.field_size_limit() + 1)
+    body = f"full_name,email\nAn,an@example.com\n{huge},b@example.com\n"
+    result = bulk_create_users(session, company_id, csv_rows(io.StringIO(body, newline="")), chunk_size=1)
+    assert (result.created, result.failed) == (1, 1)
+    assert result.errors[0].row == 2
+    assert "unreadable upload" in result.errors[0].error
+    assert session.exec(select(User.email)).all() == ["an@example.com"]
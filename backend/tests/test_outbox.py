@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import event, update
+from sqlmodel import Session, select
+
+from app.models import Company, Interaction, RewardOutbox, RewardRule, TokenTransfer
+from app.outbox import claim, drain_outbox, enqueue, release
+from app.services import create_master_wallet_with_funds, create_user_with_wallet
+
+
+def _statements(session: Session) -> List[str]:
+    seen: List[str] = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: seen.append(args[2].lstrip().split()[0].upper()))
+    return seen
+
+
+def test_idle_polling_never_writes(session: Session) -> None:
+    later = datetime.utcnow() + timedelta(minutes=5)
+    session.add(RewardOutbox(interaction_id=1, company_id=1, user_id=1, action="a", status="held"))
+    session.add(RewardOutbox(interaction_id=2, company_id=1, user_id=1, action="a", available_at=later))
+    session.commit()
+    seen = _statements(session)
+    assert claim(session, 10) == []
+    assert seen == ["SELECT"]
+
+
+def test_due_rows_are_leased(session: Session) -> None:
+    session.add(RewardOutbox(interaction_id=1, company_id=1, user_id=1, action="a"))
+    session.commit()
+    seen = _statements(session)
+    rows = claim(session, 10)
+    assert [r.interaction_id for r in rows] == [1] and rows[0].attempts == 1
+    assert "UPDATE" in seen
+    assert claim(session, 10) == []  # leased, so not due again
+
+
+def _enqueued(session: Session) -> RewardOutbox:
+    """One pending outbox row for a 5-token flat reward."""
+    company = Company(name="HDBank", api_key="sk_hdbank")
+    session.add(company)
+    session.commit()
+    create_master_wallet_with_funds(session, company)
+    user = create_user_with_wallet(session, company.id, "An", "an@example.com", None, None)
+    session.add(RewardRule(company_id=company.id, action="purchase", rate=5, mode="flat"))
+    it = Interaction(user_id=user.id, company_id=company.id, service="s", action="purchase")
+    session.add(it)
+    session.flush()
+    row = enqueue(session, it)
+    session.commit()
+    return row
+
+
+def _rewards(session: Session) -> List[float]:
+    return list(session.exec(select(TokenTransfer.amount).where(TokenTransfer.interaction_id != None)))  # noqa: E711
+
+
+def test_a_reclaimed_row_is_settled_without_paying_twice(session: Session) -> None:
+    row = _enqueued(session)
+    assert drain_outbox(session) == {"paid": 1, "retried": 0}
+
+    # a worker paid the row, then died before the status reached other workers
+    session.exec(update(RewardOutbox).values(status="pending", available_at=datetime.utcnow()))
+    session.commit()
+    assert drain_outbox(session) == {"paid": 1, "retried": 0}
+
+    session.refresh(row)
+    assert (row.status, row.reward_tokens) == ("paid", 5.0)
+    assert _rewards(session) == [5.0]
+
+
+def test_failing_rows_back_off_then_fail(session: Session, monkeypatch) -> None:
+    from app import outbox
+
+    row = _enqueued(session)
+
+    def broken(*_args):
+        raise RuntimeError("chain unavailable")
+
+    monkeypatch.setattr(outbox, "reward_for", broken)
+    for attempt in range(1, outbox.REWARD_MAX_ATTEMPTS + 1):
+        assert drain_outbox(session) == {"paid": 0, "retried": 1}
+        session.refresh(row)
+        assert row.attempts == attempt and row.error == "chain unavailable"
+        row.available_at = datetime.utcnow()  # skip the backoff
+        session.add(row)
+        session.commit()
+
+    assert row.status == "failed"
+    assert drain_outbox(session) == {"paid": 0, "retried": 0}
+    assert _rewards(session) == []
+
+
+def test_held_rows_wait_for_their_company_to_release_them(session: Session) -> None:
+    row = _enqueued(session)
+    row.status = "held"
+    session.add(row)
+    session.commit()
+    assert drain_outbox(session) == {"paid": 0, "retried": 0}
+
+    assert release(session, row.company_id + 1, row.interaction_id) is None
+    assert release(session, row.company_id, row.interaction_id).status == "pending"
+    assert drain_outbox(session) == {"paid": 1, "retried": 0}
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime
+
+from sqlmodel import Session, select
+
+from app.models import Company, Interaction
+from app.partitions import archive_closed_months, archive_root, archived_months, purge_company_archives, scan
+
+
+def _company(session: Session, name: str) -> Company:
+    company = Company(name=name, api_key=f"sk_{name.lower()}")
+    session.add(company)
+    session.commit()
+    return company
+
+
+def test_archives_live_next_to_the_database(session: Session) -> None:
+    engine = session.get_bind(Interaction)
+    assert archive_root(engine) == os.path.splitext(engine.url.database)[0] + "_archive"
+
+
+def test_deleting_a_company_purges_its_archived_rows(session: Session) -> None:
+    engine = session.get_bind(Interaction)
+    kept, gone = _company(session, "HDBank"), _company(session, "Vietjet")
+    old = datetime(2025, 1, 15)
+    for company in (kept, gone, gone):
+        session.add(Interaction(user_id=1, company_id=company.id, service="s", action="a", created_at=old))
+    only_gone = datetime(2025, 2, 15)
+    session.add(Interaction(user_id=1, company_id=gone.id, service="s", action="a", created_at=only_gone))
+    session.commit()
+
+    archived = archive_closed_months(engine, now=datetime(2025, 4, 1))
+    assert [a["month"] for a in archived] == ["2025-01", "2025-02"]
+
+    assert purge_company_archives(engine, gone.id) == 2
+    assert archived_months(archive_root(engine)) == [(2025, 1)]  # February held only the deleted company
+    rows = list(scan(session, select(Interaction.company_id), start=datetime(2025, 1, 1), end=datetime(2025, 3, 1)))
+    assert rows == [kept.id]
+    assert purge_company_archives(engine, gone.id) == 0
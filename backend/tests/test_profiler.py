@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import profiler
+from app.profiler import ProfilerMiddleware, save, sign, verify
+
+
+def test_signatures_are_bound_to_method_path_and_expiry(monkeypatch) -> None:
+    monkeypatch.setattr(profiler, "PROFILER_SECRET", "s3cret")
+    value = sign("get", "/companies/profile")
+
+    assert verify(value, "GET", "/companies/profile")
+    assert not verify(value, "POST", "/companies/profile")
+    assert not verify(value, "GET", "/companies/audience")
+    assert not verify(value[:-1] + ("0" if value[-1] != "0" else "1"), "GET", "/companies/profile")
+    assert not verify(sign("GET", "/companies/profile", ttl=-1), "GET", "/companies/profile")
+    expires = int(time.time()) + 300
+    assert not verify(f"{expires}.{'0' * 64}", "GET", "/companies/profile")
+
+    monkeypatch.setattr(profiler, "PROFILER_SECRET", "")
+    assert not verify(value, "GET", "/companies/profile")
+
+
+def test_only_signed_requests_are_profiled(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(profiler, "PROFILER_SECRET", "s3cret")
+    monkeypatch.chdir(tmp_path)  # profiles go to the relative PROFILER_DIR
+    app = FastAPI()
+
+    @app.get("/slow")
+    def slow() -> dict:
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return {"ok": True}
+
+    app.add_middleware(ProfilerMiddleware)
+    client = TestClient(app)
+
+    assert "x-athena-profile-id" not in client.get("/slow").headers
+    assert "x-athena-profile-id" not in client.get("/slow", headers={"X-Athena-Profile": "1.bad"}).headers
+    profile_id = client.get("/slow", headers={"X-Athena-Profile": sign("GET", "/slow")}).headers["x-athena-profile-id"]
+
+    with open(os.path.join(profiler.PROFILER_DIR, f"{profile_id}.speedscope.json")) as f:
+        profile = json.load(f)
+    assert profile["name"].startswith("GET /slow -> 200")
+    assert profile["profiles"] and profile["shared"]["frames"]
+    assert os.listdir(profiler.PROFILER_DIR) == [f"{profile_id}.speedscope.json"]
+
+
+def test_save_keeps_the_newest_profiles(tmp_path) -> None:
+    for i in range(4):
+        path = save(f"p{i}", {"name": str(i)}, directory=str(tmp_path), keep=2)
+        os.utime(path, (i, i))
+    assert sorted(os.listdir(tmp_path)) == ["p2.speedscope.json", "p3.speedscope.json"]
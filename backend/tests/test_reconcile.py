@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from sqlmodel import Session
+
+from app import reconcile
+from app.blockchain import MockChain
+from app.models import TokenTransfer
+from app.reconcile import divergent_wallets, run_reconcile
+
+
+def _record(session: Session, chain: MockChain, from_w, to_w: str, amount: float) -> None:
+    txh = chain.transfer(from_w, to_w, amount) if from_w else chain.mint(to_w, amount)
+    session.add(TokenTransfer(tx_hash=txh, from_wallet=from_w, to_wallet=to_w, amount=amount))
+    session.commit()
+
+
+def test_reconcile_checks_new_rows_incrementally_and_flags_drift(session: Session, monkeypatch) -> None:
+    chain = MockChain()
+    monkeypatch.setattr(reconcile, "CHAIN", chain)
+    _record(session, chain, None, "w_a", 100)
+    for _ in range(5):
+        _record(session, chain, "w_a", "w_b", 3)
+
+    first = run_reconcile(session, chunk_size=2)
+    assert (first["from_transfer_id"], first["last_transfer_id"], first["checked"], first["divergent"]) == (0, 6, 2, [])
+    assert run_reconcile(session)["checked"] == 0
+
+    chain.mint("w_b", 10)  # on the chain, never recorded
+    assert run_reconcile(session)["divergent"] == []  # w_b saw no new rows
+    assert [d["address"] for d in run_reconcile(session, full=True)["divergent"]] == ["w_b"]
+    assert divergent_wallets(session)[0]["difference"] == 10
+
+    session.add(TokenTransfer(tx_hash="late", from_wallet=None, to_wallet="w_b", amount=10))
+    session.commit()
+    assert run_reconcile(session)["divergent"] == []
+    assert divergent_wallets(session) == []
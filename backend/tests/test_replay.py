@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, select
+
+from app.blockchain import CHAIN
+from app.models import Company, Interaction, ReplayCheckpoint, RewardRule, TokenTransfer
+from app.replay import checkpoint, run_replay, start_replay
+from app.services import apply_reward, create_master_wallet_with_funds, create_user_with_wallet, get_wallet
+
+
+def test_replay_leaves_rewards_paid_before_linking_alone(session: Session) -> None:
+    company = Company(name="HDBank", api_key="sk_test")
+    session.add(company)
+    session.commit()
+    master = create_master_wallet_with_funds(session, company)
+    user = create_user_with_wallet(session, company.id, "An", "an@example.com", None, None)
+    session.add(RewardRule(company_id=company.id, action="deposit", rate=1.0, mode="flat"))
+    session.commit()
+    user_wallet = get_wallet(session, "user", user.id).address
+    then = datetime.utcnow() - timedelta(days=1)
+
+    # paid before tokentransfer.interaction_id existed: no link
+    legacy = Interaction(user_id=user.id, company_id=company.id, service="banking", action="deposit", created_at=then)
+    session.add(legacy)
+    txh = CHAIN.transfer(master.address, user_wallet, 1.0)
+    session.add(TokenTransfer(tx_hash=txh, from_wallet=master.address, to_wallet=user_wallet, amount=1.0,
+                              memo="reward:deposit", created_at=then))
+    session.commit()
+    # paid and linked
+    linked = Interaction(user_id=user.id, company_id=company.id, service="banking", action="deposit")
+    session.add(linked)
+    session.commit()
+    apply_reward(session, company.id, user.id, "deposit", None, linked.id)
+    # never paid
+    session.add(Interaction(user_id=user.id, company_id=company.id, service="banking", action="deposit"))
+    session.commit()
+
+    state = run_replay(session, "job", company_id=company.id)
+
+    assert (state.scanned, state.unlinked, state.corrections, state.delta_total) == (3, 1, 1, 1.0)
+    assert CHAIN.balance_of(user_wallet) == 3.0
+
+
+def test_job_ids_are_scoped_per_company(session: Session) -> None:
+    for name in ("HDBank", "Vietjet"):
+        company = Company(name=name, api_key=f"sk_{name}")
+        session.add(company)
+        session.commit()
+        create_master_wallet_with_funds(session, company)
+        state = run_replay(session, "nightly", company_id=company.id, dry_run=False)
+        assert state.company_id == company.id and state.finished
+
+
+def _unpaid(session: Session, rows: int = 3) -> Company:
+    company = Company(name="HDBank", api_key="sk_test")
+    session.add(company)
+    session.commit()
+    create_master_wallet_with_funds(session, company)
+    user = create_user_with_wallet(session, company.id, "An", "an@example.com", None, None)
+    session.add(RewardRule(company_id=company.id, action="deposit", rate=1.0, mode="flat"))
+    session.add_all(
+        Interaction(user_id=user.id, company_id=company.id, service="banking", action="deposit") for _ in range(rows)
+    )
+    session.commit()
+    return company
+
+
+def test_replay_runs_in_the_background_once(session: Session) -> None:
+    company = _unpaid(session)
+    open_session = lambda: Session(session.get_bind())  # noqa: E731
+
+    state, thread = start_replay(session, open_session, "job", company.id, chunk_size=2)
+    assert thread is not None and state.lease_until is not None
+    thread.join(10)
+
+    session.expire_all()
+    done = checkpoint(session, company.id, "job")
+    assert (done.finished, done.scanned, done.corrections, done.lease_until) == (True, 3, 3, None)
+    assert start_replay(session, open_session, "job", company.id)[1] is None  # finished: nothing to start
+
+
+def test_a_leased_job_is_not_started_twice(session: Session) -> None:
+    company = _unpaid(session)
+    session.add(ReplayCheckpoint(job_id="job", company_id=company.id, lease_until=datetime.utcnow() + timedelta(minutes=1)))
+    session.commit()
+
+    state, thread = start_replay(session, lambda: Session(session.get_bind()), "job", company.id)
+
+    assert thread is None and state.scanned == 0
+
+
+def test_dry_run_previews_from_its_own_checkpoint_in_spawned_workers(session: Session) -> None:
+    company = _unpaid(session, rows=4)
+
+    state = run_replay(session, "job", company_id=company.id, dry_run=True, chunk_size=1, workers=2)
+
+    assert (state.dry_run, state.scanned, state.corrections, state.delta_total) == (True, 4, 4, 4.0)
+    assert checkpoint(session, company.id, "job") is None  # the job itself has not run
+    assert session.exec(select(TokenTransfer).where(TokenTransfer.memo.startswith("replay:"))).all() == []
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime
+
+from app import responses
+from app.models import Company
+from app.responses import dumps
+from app.routers.companies import _company_payload, _decoded_lists
+from app.schemas import CompanyOut
+
+
+def test_orjson_and_the_stdlib_fallback_agree(monkeypatch) -> None:
+    content = {"at": datetime(2025, 1, 15, 9, 30, 5, 120000), "names": ["Sài Gòn", None], "n": 1.5}
+    fast = dumps(content)
+    monkeypatch.setattr(responses, "orjson", None)
+
+    assert json.loads(fast) == json.loads(dumps(content))
+
+
+def test_company_payload_matches_the_response_model() -> None:
+    company = Company(id=7, name="HDBank", api_key="sk_x", supported_actions='["deposit"]', created_at=datetime(2025, 1, 1))
+    payload = _company_payload(company)
+
+    assert json.loads(dumps(payload)) == json.loads(CompanyOut.model_validate(payload).model_dump_json())
+
+
+def test_decoded_lists_follow_the_stored_json() -> None:
+    company = Company(id=8, name="Vietjet", api_key="sk_y", supported_actions='["deposit"]')
+    assert _decoded_lists(company) == (["deposit"], None)
+
+    company.supported_actions = '["deposit", "purchase"]'  # e.g. updated by another worker
+    assert _decoded_lists(company) == (["deposit", "purchase"], None)
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from app.config import RISK_THRESHOLD
+from app.risk import FeatureStore
+
+
+def _burst(store: FeatureStore, events: int, seconds: float, device_id=None):
+    assessment = None
+    for i in range(events):
+        assessment = store.assess(1, 1, 100.0, device_id, now=1_000_000.0 + i * seconds / events)
+    return assessment
+
+
+def test_user_velocity_alone_can_flag() -> None:
+    assessment = _burst(FeatureStore(), 500, 60)  # constant amounts, no device_id
+    assert assessment.features["amount_spike"] == 1.0
+    assert assessment.score >= RISK_THRESHOLD
+    assert assessment.flagged
+
+
+def test_a_busy_minute_alone_does_not_flag() -> None:
+    assessment = _burst(FeatureStore(), 12, 60)
+    assert assessment.score < RISK_THRESHOLD
+    assert not assessment.flagged
+
+
+def test_ordinary_traffic_scores_low() -> None:
+    assessment = _burst(FeatureStore(), 3, 600, device_id="d1")
+    assert assessment.score < 0.5
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import random
+
+import numpy as np
+
+from app.models import RewardRule
+from app.rewards import dump_tiers, rule_reward
+from app.rule_engine import compile_rules, evaluate
+
+
+def test_evaluate_matches_rule_reward_with_tiered_rules() -> None:
+    rng = random.Random(7)
+    rules = []
+    for company_id in range(1, 21):
+        for action in ("deposit", "purchase"):
+            for _ in range(rng.randint(1, 3)):
+                tiers = dump_tiers([(0, 1.0), (500, 2.0), (5_000, 3.5)]) if rng.random() < 0.5 else None
+                rules.append(RewardRule(
+                    id=len(rules) + 1, company_id=company_id, action=action, rate=rng.choice([0.5, 1.0, 5.0]),
+                    mode=rng.choice(["flat", "per_amount"]), tiers=tiers,
+                    min_amount=rng.choice([None, 100.0]), max_reward=rng.choice([None, 50.0]),
+                ))
+    table = compile_rules(rules)
+
+    rows = [
+        (rng.randint(1, 22), rng.choice(["deposit", "purchase", "refund"]), rng.choice([None, 50.0, 700.0, 9_000.0]))
+        for _ in range(2_000)
+    ]
+    got = evaluate(table, [c for c, _, _ in rows], [a for _, a, _ in rows], [m for _, _, m in rows])
+    want = [
+        max(sum((rule_reward(r, amount) for r in rules if r.company_id == c and r.action == a), 0.0), 0.0)
+        for c, a, amount in rows
+    ]
+    np.testing.assert_allclose(got, want)
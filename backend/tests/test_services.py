@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from sqlmodel import Session
+
+from app.models import Company
+from app.services import company_name_map
+
+
+def test_company_names_follow_a_reused_id(session: Session) -> None:
+    old = Company(name="HDBank", api_key="sk_old")
+    session.add(old)
+    session.commit()
+    assert company_name_map(session, [old.id]) == {old.id: "HDBank"}
+
+    company_id = old.id
+    session.delete(old)
+    session.commit()
+    new = Company(name="Vietjet", api_key="sk_new")
+    session.add(new)
+    session.commit()
+    assert new.id == company_id
+    assert company_name_map(session, [company_id]) == {company_id: "Vietjet"}
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from sqlmodel import Session
+
+from app.models import Company, Interaction, RewardRule, SketchState, TokenTransfer, User
+from app.services import apply_reward, create_master_wallet_with_funds, create_user_with_wallet, get_wallet
+from app.sketches import HLL_ERROR, HyperLogLog, default_range, fold_sketches, percentiles, unique_users
+
+
+def _seed(session: Session) -> Company:
+    company = Company(name="HDBank", api_key="sk_test")
+    session.add(company)
+    session.commit()
+    users = [User(company_id=company.id, full_name=f"User {i}", email=f"user{i}@example.com") for i in range(20)]
+    session.add_all(users)
+    session.commit()
+    session.add_all(
+        Interaction(user_id=u.id, company_id=company.id, service="banking", action="deposit", amount=100.0 * (i + 1))
+        for i, u in enumerate(users)
+    )
+    session.commit()
+    return company
+
+
+def test_fold_sketches_feeds_audience_and_percentiles(session: Session) -> None:
+    company = _seed(session)
+
+    folded = fold_sketches(session)
+
+    assert folded["interactions"] == 20
+    assert session.get(SketchState, 1).updated_at is not None
+    start, end = default_range(None, None)
+    assert abs(unique_users([session], [company.id], start, end)["unique_users"] - 20) <= 1  # HLL estimate
+    result = percentiles(session, company.id, "amount", start, end, [0.5])
+    assert result["count"] == 20
+    assert 900.0 <= result["quantiles"]["p50"] <= 1100.0
+
+
+def test_fold_sketches_is_incremental(session: Session) -> None:
+    company = _seed(session)
+    fold_sketches(session)
+    session.add(Interaction(user_id=1, company_id=company.id, service="banking", action="deposit", amount=5.0))
+    session.commit()
+
+    folded = fold_sketches(session)
+
+    assert folded["interactions"] == 1
+    assert fold_sketches(session)["interactions"] == 0
+
+
+def test_hyperloglog_estimates_and_unions_within_its_error() -> None:
+    days = [HyperLogLog() for _ in range(3)]
+    for i in range(30_000):
+        days[i % 3].add(f"user{i % 20_000}")  # 20,000 distinct users spread over overlapping days
+    union = HyperLogLog.union(HyperLogLog.from_bytes(day.to_bytes()) for day in days)
+    assert abs(union.estimate() - 20_000) <= 3 * HLL_ERROR * 20_000
+    assert HyperLogLog.union([]).estimate() == 0.0
+
+
+def test_reward_sketch_leaves_out_replay_corrections(session: Session) -> None:
+    company = Company(name="HDBank", api_key="sk_test")
+    session.add(company)
+    session.commit()
+    master = create_master_wallet_with_funds(session, company)
+    user = create_user_with_wallet(session, company.id, "An", "an@example.com", None, None)
+    session.add(RewardRule(company_id=company.id, action="deposit", rate=10.0, mode="flat"))
+    session.commit()
+    it = Interaction(user_id=user.id, company_id=company.id, service="banking", action="deposit")
+    session.add(it)
+    session.commit()
+    apply_reward(session, company.id, user.id, "deposit", None, it.id)
+    user_wallet = get_wallet(session, "user", user.id).address
+    for source, target, amount in ((user_wallet, master.address, 4.0), (master.address, user_wallet, 1.0)):
+        session.add(TokenTransfer(tx_hash=f"0x{amount}", from_wallet=source, to_wallet=target, amount=amount,
+                                  memo="replay:fix:deposit", interaction_id=it.id))
+    session.commit()
+
+    fold_sketches(session)
+
+    start, end = default_range(None, None)
+    result = percentiles(session, company.id, "reward", start, end, [0.5])
+    assert result["count"] == 1
+    assert result["quantiles"]["p50"] == 10.0
+
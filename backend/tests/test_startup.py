@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PROBE = (
+    "import sys, main; "
+    "print(sorted(m for m in ('app.routers.dev', 'app.rule_engine', 'numpy') if m in sys.modules)); "
+    "print(any(p.startswith('/dev/') for p in main.app.openapi()['paths']))"
+)
+
+
+def _import_main(profile: str, cwd) -> list:
+    env = dict(os.environ, ATHENA_PROFILE=profile, PYTHONPATH=BACKEND)
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    return out.stdout.split()
+
+
+def test_production_profile_leaves_out_the_dev_router_and_numpy(tmp_path) -> None:
+    assert _import_main("production", tmp_path) == ["[]", "False"]
+    assert _import_main("dev", tmp_path)[-1] == "True"
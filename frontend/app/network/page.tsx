@@ -5,7 +5,7 @@ import { motion, AnimatePresence } from 'framer-motion';
 import { useSpring, animated, to } from 'react-spring';
 import { useDrag, useWheel } from 'react-use-gesture';
 import { Card, CardBody, CardHeader } from '@/components/ui/Card';
-import { api, DevCompany, DevTransfer, DevWallet, demoPurchase, demoUserPurchase } from '@/lib/api';
+import { api, DevCompany, DevNetwork, DevTransfer, DevWallet, demoPurchase, demoUserPurchase, getNetwork, streamTransfers } from '@/lib/api';
 
 function useInterval(callback: () => void, delay: number) {
   const saved = useRef(callback);
@@ -23,11 +23,16 @@ function seeded(id: number, min: number, max: number) {
   return min + frac * (max - min);
 }
 
+// edges drawn per company; the server prunes the rest
+const NETWORK_TOP_K = 50;
+
 export default function Network() {
   const [companies, setCompanies] = useState<DevCompany[]>([]);
   const [wallets, setWallets] = useState<DevWallet[]>([]);
   const [transfers, setTransfers] = useState<DevTransfer[]>([]);
+  const [network, setNetwork] = useState<DevNetwork | null>(null);
   const [loading, setLoading] = useState(false);
+  const [live, setLive] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [pulseCompany, setPulseCompany] = useState<number | null>(null);
   const [hoveredNode, setHoveredNode] = useState<number | null>(null);
@@ -71,12 +76,13 @@ export default function Network() {
     setLoading(true);
     setError(null);
     try {
-      const [cs, ws, ts] = await Promise.all([
+      const [cs, ws, ts, net] = await Promise.all([
         api<DevCompany[]>(`/dev/companies`),
         api<DevWallet[]>(`/dev/wallets`),
         api<DevTransfer[]>(`/dev/transfers?limit=50`),
+        getNetwork(NETWORK_TOP_K),
       ]);
-      setCompanies(cs); setWallets(ws); setTransfers(ts);
+      setCompanies(cs); setWallets(ws); setTransfers(ts); setNetwork(net);
     } catch (e: any) {
       setError(e.message || 'Failed to load data');
     } finally { 
@@ -144,10 +150,29 @@ export default function Network() {
   };
 
   useEffect(() => { load(); }, []);
-  
-  // Only load new data when there are no visible transfers animating
+
+  // Live feed: apply each pushed transfer and its balance changes without re-querying
+  const walletsRef = useRef<DevWallet[]>([]);
+  useEffect(() => { walletsRef.current = wallets; }, [wallets]);
+  useEffect(() => {
+    return streamTransfers({
+      onStatus: setLive,
+      onLagged: () => { load(); },
+      onTransfer: (t) => {
+        setTransfers(prev => prev.some(p => p.id === t.id) ? prev : [t, ...prev].slice(0, 50));
+        // a wallet we have never seen (new user): reload once instead of guessing its owner
+        if (Object.keys(t.balances).some(addr => !walletsRef.current.some(w => w.address === addr))) {
+          load();
+          return;
+        }
+        setWallets(prev => prev.map(w => t.balances[w.address] !== undefined ? { ...w, balance: t.balances[w.address] } : w));
+      },
+    });
+  }, []);
+
+  // Fall back to polling while the live stream is unavailable
   useInterval(() => {
-    if (visibleTransfers.length === 0) {
+    if (!live && visibleTransfers.length === 0) {
       load();
     }
   }, 2000);
@@ -217,6 +242,12 @@ export default function Network() {
     });
   }, [companies]);
 
+  // user id -> company name, from the graph's edges
+  const userCompany = useMemo(() => {
+    const names = new Map<number, string | null>(network?.companies || []);
+    return new Map((network?.edges || []).map(([cid, uid]) => [uid, names.get(cid) || null] as const));
+  }, [network]);
+
   const userNodes = useMemo(() => {
     const users = wallets.filter(w => w.owner_type === 'user');
     const sorted = [...users].sort((a,b)=>a.owner_id-b.owner_id);
@@ -224,17 +255,28 @@ export default function Network() {
     return sorted.map((w, i) => {
       const y = topY + (i + 0.5) * ((bottomY - topY) / count) + seeded(w.id, -60, 60);
       const x = leftX + seeded(w.id, -80, 80);
-      const company = companies.find(c => c.id === w.owner_id);
-      return { ...w, x, y, company_name: company?.name || 'Unknown' };
+      return { ...w, x, y, company_name: userCompany.get(w.owner_id) || 'Unknown' };
+    });
+  }, [wallets, userCompany]);
+
+  // Company-user relationships from the server graph, stroke width by interaction count
+  const graphEdges = useMemo(() => {
+    if (!network) return [];
+    const companyById = new Map(companyNodes.map(n => [n.id, n] as const));
+    const userById = new Map(userNodes.map(n => [n.owner_id, n] as const));
+    const most = Math.max(1, ...network.edges.map(e => e[2]));
+    return network.edges.flatMap(([cid, uid, interactions, toUser, toCompany]) => {
+      const c = companyById.get(cid);
+      const u = userById.get(uid);
+      if (!c || !u) return [];
+      return [{ key: `${cid}-${uid}`, x1: c.x, y1: c.y, x2: u.x, y2: u.y, width: 1 + 5 * interactions / most, interactions, tokens: toUser + toCompany }];
     });
-  }, [wallets, companies]);
+  }, [network, companyNodes, userNodes]);
 
   // Get users for a specific company
   const getUsersForCompany = (companyId: number) => {
-    return userNodes.filter(u => {
-      const company = companies.find(c => c.id === companyId);
-      return company && u.owner_id === companyId;
-    });
+    const ids = new Set((network?.edges || []).filter(e => e[0] === companyId).map(e => e[1]));
+    return userNodes.filter(u => ids.has(u.owner_id));
   };
 
   const walletByAddress = useMemo(() => Object.fromEntries(wallets.map(w => [w.address, w])), [wallets]);
@@ -358,6 +400,7 @@ export default function Network() {
           <div className="flex items-center justify-between">
             <div className="text-sm text-neutral-500">
               All companies and wallets (demo) • Drag to pan • Scroll to zoom
+              {network && network.pruned_edges > 0 && <span className="ml-2">• top {NETWORK_TOP_K} edges per company ({network.pruned_edges} hidden)</span>}
               {loading && <span className="ml-2 text-blue-600">Loading...</span>}
               {error && <span className="ml-2 text-red-600">Error: {error}</span>}
             </div>
@@ -374,6 +417,13 @@ export default function Network() {
           <div ref={wrapperRef} className="mt-6 relative overflow-hidden rounded-xl border border-neutral-200/60 dark:border-neutral-800/60">
             <svg ref={svgRef} width="100%" height="600" viewBox={`0 0 ${canvas.width} ${canvas.height}`} className="block bg-neutral-50 dark:bg-neutral-900 cursor-grab active:cursor-grabbing" style={{ minHeight: '600px' }} {...bindDrag()} {...bindWheel()}>
               <animated.g transform={gTransform}>
+                <g>
+                  {graphEdges.map(e => (
+                    <line key={e.key} x1={e.x1} y1={e.y1} x2={e.x2} y2={e.y2} stroke="#94a3b8" strokeOpacity={0.35} strokeWidth={e.width}>
+                      <title>{`${e.interactions} interactions · ${e.tokens.toFixed(2)} SOV`}</title>
+                    </line>
+                  ))}
+                </g>
                 <AnimatePresence>
                   {companyNodes.map((n, i) => (
                     <motion.g key={`company-${n.id}`} initial={{ opacity: 0, scale: 0.9 }} animate={{ opacity: 1, scale: pulseCompany===n.id ? 1.1 : 1 }} transition={{ delay: i * 0.05, type: 'spring', stiffness: 260, damping: 20 }} onMouseEnter={() => setHoveredNode(n.id)} onMouseLeave={() => setHoveredNode(null)}>
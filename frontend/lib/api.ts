@@ -1,4 +1,4 @@
-const API_BASE = process.env.NEXT_PUBLIC_API_BASE || 'http://localhost:3000';
+export const API_BASE = process.env.NEXT_PUBLIC_API_BASE || 'http://localhost:3000';
 
 export async function api<T>(path: string, opts: RequestInit & { apiKey?: string } = {}): Promise<T> {
   const headers = new Headers(opts.headers);
@@ -34,6 +34,39 @@ export type ContractOut = { id: number; name: string; action: string; mode: stri
 export type DevCompany = { id: number; name: string; api_key: string; created_at: string };
 export type DevWallet = { id: number; owner_type: 'company'|'user'; owner_id: number; address: string; balance: number };
 export type DevTransfer = { id: number; tx_hash: string; from_wallet: string|null; to_wallet: string|null; amount: number; memo: string|null; created_at: string };
+export type DevTransferEvent = DevTransfer & { interaction_id: number|null; balances: Record<string, number> };
+// edges: [company_id, user_id, interactions, tokens_to_user, tokens_to_company]
+export type NetworkEdge = [number, number, number, number, number];
+export type DevNetwork = {
+  companies: [number, string | null][];
+  users: number[];
+  edges: NetworkEdge[];
+  total_edges: number;
+  pruned_edges: number;
+  last_interaction_id: number;
+  last_transfer_id: number;
+};
+
+// Company-user graph kept up to date on the server; topK keeps each company's heaviest edges
+export async function getNetwork(topK?: number, weight: 'interactions'|'tokens' = 'interactions') {
+  const params = new URLSearchParams({ weight });
+  if (topK) params.set('top_k', String(topK));
+  return api<DevNetwork>(`/dev/network?${params}`);
+}
+
+// Live TokenTransfer feed (server-sent events). Returns a function that closes the stream.
+export function streamTransfers(handlers: {
+  onTransfer: (t: DevTransferEvent) => void;
+  onLagged?: () => void;
+  onStatus?: (live: boolean) => void;
+}): () => void {
+  const es = new EventSource(`${API_BASE}/dev/stream/transfers`);
+  es.onopen = () => handlers.onStatus?.(true);
+  es.onerror = () => handlers.onStatus?.(false);
+  es.addEventListener('transfer', (e) => handlers.onTransfer(JSON.parse((e as MessageEvent).data)));
+  es.addEventListener('lagged', () => handlers.onLagged?.());
+  return () => es.close();
+}
 
 export async function demoPurchase(companyId: number, amount: number = 200000) {
   return api<{ interaction_id: number; user_id: number; reward: number }>(`/dev/demo/purchase?company_id=${companyId}&amount=${amount}`, { method: 'POST' });